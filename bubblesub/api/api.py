@@ -26,6 +26,7 @@ import bubblesub.api.cmd
 from bubblesub.api.audio import AudioApi
 from bubblesub.api.audio_view import AudioViewApi
 from bubblesub.api.gui import GuiApi
+from bubblesub.api.journal import JournalApi
 from bubblesub.api.log import LogApi
 from bubblesub.api.playback import PlaybackApi
 from bubblesub.api.subs import SubtitlesApi
@@ -48,10 +49,10 @@ class Api:
 
         self.cfg = Config()
         self.log = LogApi(self.cfg)
-        self.subs = SubtitlesApi(self.cfg)
-        self.undo = UndoApi(self.cfg, self.subs)
-
         self.threading = ThreadingApi(self.log)
+        self.subs = SubtitlesApi(self.cfg, self.threading)
+        self.undo = UndoApi(self.cfg, self.subs)
+        self.journal = JournalApi(self.log, self.subs, self.undo)
 
         self.video = VideoApi(self.threading, self.log, self.subs)
         self.audio = AudioApi(self.threading, self.log)
@@ -68,6 +69,8 @@ class Api:
         self.gui.terminated.connect(self.audio.unload_all_streams)
         self.gui.terminated.connect(self.video.unload_all_streams)
         self.gui.terminated.connect(self.cmd.unload)
+        self.gui.terminated.connect(self.subs.wait_for_save)
+        self.gui.terminated.connect(self.journal.close)
         self.subs.loaded.connect(self._on_subs_load)
 
     def _on_subs_load(self) -> None:
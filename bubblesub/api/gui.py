@@ -16,6 +16,7 @@
 
 """GUI API."""
 
+import asyncio
 import contextlib
 import typing as T
 from pathlib import Path
@@ -23,7 +24,12 @@ from pathlib import Path
 from PyQt5 import QtCore, QtWidgets
 
 import bubblesub.api  # pylint: disable=unused-import
-from bubblesub.ui.util import SUBS_FILE_FILTER, async_dialog_exec, save_dialog
+from bubblesub.ui.util import (
+    SUBS_FILE_FILTER,
+    async_dialog_exec,
+    save_dialog,
+    show_error,
+)
 
 
 class GuiApi(QtCore.QObject):
@@ -77,6 +83,27 @@ class GuiApi(QtCore.QObject):
         """Exit the application."""
         self.request_quit.emit()
 
+    async def save_subs(self, path: Path) -> bool:
+        """Save the subtitles and wait until they're written to the disk.
+
+        The outcome is logged.
+
+        :param path: path to save the subtitles to
+        :return: whether the subtitles were saved
+        """
+        future: "asyncio.Future[T.Optional[Exception]]" = (
+            asyncio.get_event_loop().create_future()
+        )
+        self._api.subs.save_ass(
+            path, remember_path=True, complete_callback=future.set_result
+        )
+        error = await future
+        if error is not None:
+            self._api.log.error(f"error saving subtitles to {path}: {error}")
+            return False
+        self._api.log.info(f"saved subtitles to {path}")
+        return True
+
     async def confirm_unsaved_changes(self) -> bool:
         """Ask user to continue if there are unsaved changes to the subtitles.
 
@@ -107,13 +134,43 @@ class GuiApi(QtCore.QObject):
                 )
                 if not doc_path:
                     return False
-            self._api.subs.save_ass(doc_path, remember_path=True)
-            return True
+            if await self.save_subs(doc_path):
+                return True
+            await show_error(
+                f'Could not save "{doc_path.name}", see the log for details.',
+                self._main_window,
+            )
+            return False
         if response == box.Discard:
             return True
         assert response in {box.Cancel, box.NoButton}
         return False
 
+    async def offer_journal_recovery(self) -> None:
+        """Ask user to recover changes left behind by a crashed session."""
+        paths = self._api.journal.get_stale_journals()
+        if not paths:
+            return
+        path = paths[0]
+
+        box = QtWidgets.QMessageBox(self._main_window)
+        box.setWindowTitle("Question")
+        box.setText(
+            "bubblesub wasn't closed properly. "
+            "Do you wish to recover unsaved changes?"
+        )
+        box.setIcon(QtWidgets.QMessageBox.Question)
+        box.addButton(box.Yes)
+        box.addButton(box.No)
+        box.setDefaultButton(box.Yes)
+
+        response = await async_dialog_exec(box)
+        if response == box.Yes:
+            with self._api.log.exception_guard():
+                self._api.journal.recover(path)
+        if path.exists():
+            path.unlink()
+
     def get_dialog_dir(self) -> T.Optional[Path]:
         """Retrieve default dialog path.
 
@@ -0,0 +1,383 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Crash recovery journal API."""
+
+import ctypes
+import io
+import os
+import pickle
+import typing as T
+from pathlib import Path
+
+from PyQt5 import QtCore
+
+from bubblesub.api.log import LogApi
+from bubblesub.api.subs import SubtitlesApi
+from bubblesub.api.undo import UndoApi
+from bubblesub.cache import get_cache_dir
+from bubblesub.fmt.ass.file import AssFile
+from bubblesub.fmt.ass.reader import load_ass
+from bubblesub.fmt.ass.writer import write_ass
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_THRESHOLD = 10_000
+JOURNAL_SYNC_INTERVAL = 100
+
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_STILL_ACTIVE = 259
+_ERROR_ACCESS_DENIED = 5
+
+
+def get_journal_dir() -> Path:
+    """Return path to journal files.
+
+    :return: path to journal files
+    """
+    return get_cache_dir() / "journal"
+
+
+def _is_process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return _is_windows_process_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_windows_process_alive(pid: int) -> bool:
+    kernel32 = ctypes.WinDLL(  # type: ignore
+        "kernel32", use_last_error=True
+    )
+    kernel32.OpenProcess.restype = ctypes.c_void_p
+    handle = kernel32.OpenProcess(
+        _PROCESS_QUERY_LIMITED_INFORMATION, False, pid
+    )
+    if not handle:
+        # only processes that exist can deny access
+        return ctypes.get_last_error() == _ERROR_ACCESS_DENIED  # type: ignore
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(
+            ctypes.c_void_p(handle), ctypes.byref(exit_code)
+        ):
+            return True
+        return exit_code.value == _STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+
+def read_journal(path: Path) -> T.Tuple[T.Optional[Path], AssFile]:
+    """Replay journal records into a new ASS file.
+
+    Reading stops at the first incomplete record, which is what a crash
+    usually leaves at the end of the journal.
+
+    :param path: path to the journal
+    :return: path to the journaled document and its contents
+    """
+    doc_path: T.Optional[Path] = None
+    ass_file = AssFile()
+
+    with path.open("rb") as handle:
+        while True:
+            try:
+                record = pickle.load(handle)
+            except Exception:  # pylint: disable=broad-except
+                break
+
+            kind, *args = record
+            if kind == "snapshot":
+                doc_path = Path(args[0]) if args[0] else None
+                load_ass(io.StringIO(args[1]), ass_file)
+            elif kind == "insert":
+                ass_file.events.insert(args[0], *args[1])
+            elif kind == "remove":
+                ass_file.events.remove(args[0], args[1])
+            elif kind == "move":
+                ass_file.events.move(args[0], args[1], args[2])
+            elif kind == "modify":
+                ass_file.events[args[0]] = args[1]
+            elif kind == "styles":
+                ass_file.styles.replace(args[0])
+            elif kind == "meta":
+                ass_file.meta.clear()
+                ass_file.meta.update(args[0])
+
+    return doc_path, ass_file
+
+
+class JournalApi:
+    """API for the crash recovery journal.
+
+    Every change to the subtitles is appended to a journal file in the cache
+    directory as a compact record, starting with a snapshot of the document.
+    The journal is deleted when the document is loaded, saved or closed
+    normally, so a journal left by another process that is no longer running
+    means that process crashed with unsaved changes.
+    """
+
+    def __init__(
+        self, log_api: LogApi, subs_api: SubtitlesApi, undo_api: UndoApi
+    ) -> None:
+        """Initialize self.
+
+        :param log_api: logging API
+        :param subs_api: subtitles API
+        :param undo_api: undo API
+        """
+        self._log_api = log_api
+        self._subs_api = subs_api
+        self._undo_api = undo_api
+
+        self._path = get_journal_dir() / f"{os.getpid()}{JOURNAL_SUFFIX}"
+        self._handle: T.Optional[T.BinaryIO] = None
+        self._start_pending = False
+        self._record_count = 0
+        self._unsynced_count = 0
+        self._modified_indexes: T.Set[int] = set()
+        self._styles_dirty = False
+        self._meta_dirty = False
+        self._flush_scheduled = False
+        self._changed_since_save = False
+
+        events = self._subs_api.events
+        events.items_about_to_be_inserted.connect(self._on_about_to_change)
+        events.items_about_to_be_removed.connect(self._on_about_to_change)
+        events.items_about_to_be_moved.connect(self._on_about_to_change)
+        events.items_inserted.connect(self._on_events_inserted)
+        events.items_removed.connect(self._on_events_removed)
+        events.items_moved.connect(self._on_events_moved)
+        events.item_modified.connect(self._on_event_modified)
+
+        styles = self._subs_api.styles
+        styles.items_about_to_be_inserted.connect(self._on_about_to_change)
+        styles.items_about_to_be_removed.connect(self._on_about_to_change)
+        styles.items_about_to_be_moved.connect(self._on_about_to_change)
+        styles.items_inserted.connect(self._on_styles_change)
+        styles.items_removed.connect(self._on_styles_change)
+        styles.items_moved.connect(self._on_styles_change)
+        styles.item_modified.connect(self._on_styles_change)
+
+        self._subs_api.meta_changed.connect(self._on_meta_change)
+        self._subs_api.loaded.connect(self.close)
+        self._subs_api.about_to_save.connect(self._on_subtitles_about_to_save)
+        self._subs_api.saved.connect(self._on_subtitles_save)
+
+    @property
+    def path(self) -> Path:
+        """Return path to the journal of this process.
+
+        :return: path to the journal
+        """
+        return self._path
+
+    def get_stale_journals(self) -> T.List[Path]:
+        """Return journals left behind by crashed processes.
+
+        :return: paths to the journals, most recent first
+        """
+        journal_dir = get_journal_dir()
+        if not journal_dir.exists():
+            return []
+        paths = []
+        for path in journal_dir.iterdir():
+            if path.suffix != JOURNAL_SUFFIX or path == self._path:
+                continue
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if not _is_process_alive(pid):
+                paths.append(path)
+        return sorted(paths, key=lambda path: -path.stat().st_mtime)
+
+    def recover(self, path: Path) -> None:
+        """Load the document recorded in the specified journal.
+
+        The document is loaded from the disk first and the journaled content
+        is applied on top of it as an undoable change, so that it's treated
+        as unsaved.
+
+        :param path: path to the journal
+        """
+        doc_path, ass_file = read_journal(path)
+        if doc_path and doc_path.exists():
+            self._subs_api.load_ass(doc_path)
+        else:
+            if doc_path:
+                self._log_api.warn(f"{doc_path} no longer exists")
+            self._subs_api.unload()
+
+        styles = list(ass_file.styles)
+        events = list(ass_file.events)
+        ass_file.styles.clear()
+        ass_file.events.clear()
+        with self._undo_api.capture():
+            self._subs_api.meta.clear()
+            self._subs_api.meta.update(dict(ass_file.meta.items()))
+            self._subs_api.styles.replace(styles)
+            self._subs_api.events.replace(events)
+
+        path.unlink()
+        self._log_api.info(f"recovered unsaved changes from {path}")
+
+    def flush(self) -> None:
+        """Write pending records to the journal."""
+        self._flush_scheduled = False
+        if self._handle is None:
+            if self._start_pending:
+                self._start()
+            return
+        self._dump_pending()
+        if self._record_count > JOURNAL_COMPACT_THRESHOLD:
+            self._compact()
+        elif self._unsynced_count >= JOURNAL_SYNC_INTERVAL:
+            self._sync()
+        else:
+            self._handle.flush()
+
+    def close(self) -> None:
+        """Stop journaling the current document and delete the journal."""
+        self._start_pending = False
+        self._modified_indexes.clear()
+        self._styles_dirty = False
+        self._meta_dirty = False
+        self._changed_since_save = False
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self._path.exists():
+            self._path.unlink()
+
+    def _start(self) -> None:
+        self._start_pending = False
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = T.cast(T.BinaryIO, self._path.open("wb"))
+        self._write_snapshot()
+        self._sync()
+
+    def _compact(self) -> None:
+        assert self._handle is not None
+        self._handle.close()
+        tmp_path = self._path.with_suffix(".tmp")
+        self._handle = T.cast(T.BinaryIO, tmp_path.open("wb"))
+        self._write_snapshot()
+        # the old journal must not be replaced by a file that isn't on the
+        # disk yet
+        self._sync()
+        self._handle.close()
+        os.replace(tmp_path, self._path)
+        self._handle = T.cast(T.BinaryIO, self._path.open("ab"))
+
+    def _sync(self) -> None:
+        # flushing only hands the data to the OS, which loses it if the
+        # whole system crashes
+        assert self._handle is not None
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._unsynced_count = 0
+
+    def _write_snapshot(self) -> None:
+        handle = io.StringIO()
+        write_ass(self._subs_api.ass_file, handle)
+        path = self._subs_api.path
+        self._record_count = 0
+        self._write(
+            ("snapshot", str(path) if path else None, handle.getvalue())
+        )
+
+    def _write(self, record: T.Tuple[T.Any, ...]) -> None:
+        assert self._handle is not None
+        pickle.dump(record, self._handle)
+        self._record_count += 1
+        self._unsynced_count += 1
+
+    def _dump_pending(self) -> None:
+        for idx in sorted(self._modified_indexes):
+            self._write(("modify", idx, self._subs_api.events[idx]))
+        self._modified_indexes.clear()
+        if self._styles_dirty:
+            self._write(("styles", list(self._subs_api.styles)))
+            self._styles_dirty = False
+        if self._meta_dirty:
+            self._write(("meta", dict(self._subs_api.meta.items())))
+            self._meta_dirty = False
+
+    def _schedule_flush(self) -> None:
+        # coalesce all changes made within one event loop iteration
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            QtCore.QTimer.singleShot(0, self.flush)
+
+    def _mark_changed(self) -> bool:
+        """Note that the document changed.
+
+        Until the journal is started, nothing is recorded right away - the
+        snapshot taken on the next flush includes all the changes. This way
+        changes that are immediately followed by loading a new document,
+        such as the ones made by the loading itself, never hit the disk.
+
+        :return: whether the change should be recorded
+        """
+        self._changed_since_save = True
+        self._schedule_flush()
+        if self._handle is None:
+            self._start_pending = True
+            return False
+        return True
+
+    def _on_about_to_change(self, *_args: T.Any) -> None:
+        if self._mark_changed():
+            # pending modifications refer to indexes from before the change
+            self._dump_pending()
+
+    def _on_events_inserted(self, idx: int, count: int) -> None:
+        if self._mark_changed():
+            self._write(
+                ("insert", idx, self._subs_api.events[idx : idx + count])
+            )
+
+    def _on_events_removed(self, idx: int, count: int) -> None:
+        if self._mark_changed():
+            self._write(("remove", idx, count))
+
+    def _on_events_moved(self, idx: int, count: int, new_idx: int) -> None:
+        if self._mark_changed():
+            self._write(("move", idx, count, new_idx))
+
+    def _on_event_modified(self, idx: int) -> None:
+        if self._mark_changed():
+            self._modified_indexes.add(idx)
+
+    def _on_styles_change(self, *_args: T.Any) -> None:
+        if self._mark_changed():
+            self._styles_dirty = True
+
+    def _on_meta_change(self) -> None:
+        if self._mark_changed():
+            self._meta_dirty = True
+
+    def _on_subtitles_about_to_save(self) -> None:
+        self._changed_since_save = False
+
+    def _on_subtitles_save(self) -> None:
+        if not self._changed_since_save:
+            self.close()
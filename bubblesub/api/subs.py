@@ -16,19 +16,38 @@
 
 """Subtitles API."""
 
+import functools
+import io
+import threading
 import typing as T
 from pathlib import Path
 
 from PyQt5 import QtCore
 
+from bubblesub.api.threading import ThreadingApi
 from bubblesub.cfg import Config
 from bubblesub.fmt.ass.event import AssEvent, AssEventList
 from bubblesub.fmt.ass.file import AssFile
 from bubblesub.fmt.ass.meta import AssMeta
 from bubblesub.fmt.ass.reader import load_ass
 from bubblesub.fmt.ass.style import AssStyle, AssStyleList
-from bubblesub.fmt.ass.writer import write_ass
-from bubblesub.util import first
+from bubblesub.fmt.ass.writer import (
+    AssSnapshot,
+    snapshot_ass,
+    write_ass_snapshot,
+)
+from bubblesub.fmt.sidecar import read_sidecar, write_sidecar
+from bubblesub.model import RangeSet
+from bubblesub.util import first, write_file_atomically
+
+TIMING_PROPERTIES = frozenset({"start", "end", "duration"})
+
+_SaveCallback = T.Callable[[T.Optional[Exception]], T.Any]
+
+
+class _SaveResult(T.NamedTuple):
+    superseded: bool
+    error: T.Optional[Exception]
 
 
 class SubtitlesApi(QtCore.QObject):
@@ -38,24 +57,49 @@ class SubtitlesApi(QtCore.QObject):
     """
 
     loaded = QtCore.pyqtSignal()
+    about_to_save = QtCore.pyqtSignal()
     saved = QtCore.pyqtSignal()
     selection_changed = QtCore.pyqtSignal(list, bool)
 
-    def __init__(self, cfg: Config) -> None:
+    def __init__(self, cfg: Config, threading_api: ThreadingApi) -> None:
         """Initialize self.
 
         :param cfg: program configuration
+        :param threading_api: threading API
         """
         super().__init__()
         self._cfg = cfg
-        self._selected_indexes: T.List[int] = []
+        self._threading_api = threading_api
+        self._selection = RangeSet()
         self._path: T.Optional[Path] = None
+        self._loading = False
+
+        self._timing_version = 0
+        self._text_version = 0
+        self._style_version = 0
+
+        self._save_lock = threading.Lock()
+        self._save_cond = threading.Condition()
+        self._pending_saves = 0
+        self._save_generations: T.Dict[Path, int] = {}
+        self._save_callbacks: T.Dict[
+            Path, T.List[T.Tuple[int, _SaveCallback]]
+        ] = {}
 
         self.ass_file = AssFile()
 
         self.meta_changed = self.ass_file.meta.changed
         self.events.items_removed.connect(self._on_items_removed)
 
+        self.events.item_modified.connect(self._on_event_modified)
+        self.events.items_inserted.connect(self._on_events_structure_change)
+        self.events.items_removed.connect(self._on_events_structure_change)
+        self.events.items_moved.connect(self._on_events_structure_change)
+        self.styles.item_modified.connect(self._on_styles_change)
+        self.styles.items_inserted.connect(self._on_styles_change)
+        self.styles.items_removed.connect(self._on_styles_change)
+        self.styles.items_moved.connect(self._on_styles_change)
+
     @property
     def events(self) -> AssEventList:
         """Return list of ASS events.
@@ -155,13 +199,71 @@ class SubtitlesApi(QtCore.QObject):
         """
         return self._path
 
+    @property
+    def is_loading(self) -> bool:
+        """Return whether the subtitles are being replaced by a new file.
+
+        Changes made to the lists in the meantime are followed by `loaded`,
+        so listeners can skip them.
+
+        :return: whether loading is in progress
+        """
+        return self._loading
+
+    @property
+    def timing_version(self) -> int:
+        """Return counter bumped whenever event timing changes.
+
+        Inserting, removing and moving events bumps it as well.
+
+        :return: monotonically increasing counter
+        """
+        return self._timing_version
+
+    @property
+    def text_version(self) -> int:
+        """Return counter bumped whenever event content other than timing
+        changes.
+
+        Inserting, removing and moving events bumps it as well.
+
+        :return: monotonically increasing counter
+        """
+        return self._text_version
+
+    @property
+    def style_version(self) -> int:
+        """Return counter bumped whenever any of the styles changes.
+
+        :return: monotonically increasing counter
+        """
+        return self._style_version
+
     @property
     def has_selection(self) -> bool:
         """Return whether there are any selected events.
 
         :return: whether there are any selected events
         """
-        return len(self.selected_indexes) > 0
+        return len(self._selection) > 0
+
+    @property
+    def selection(self) -> RangeSet:
+        """Return indexes of the selected events as an immutable set.
+
+        Cheaper to keep than .selected_indexes, since it isn't copied.
+
+        :return: indexes of the selected events
+        """
+        return self._selection
+
+    @selection.setter
+    def selection(self, new_selection: RangeSet) -> None:
+        """Update event selection.
+
+        :param new_selection: new set of selected indexes
+        """
+        self._set_selection(new_selection)
 
     @property
     def selected_indexes(self) -> T.List[int]:
@@ -169,7 +271,7 @@ class SubtitlesApi(QtCore.QObject):
 
         :return: indexes of the selected events
         """
-        return self._selected_indexes
+        return self._selection.to_list()
 
     @selected_indexes.setter
     def selected_indexes(self, new_selection: T.List[int]) -> None:
@@ -177,10 +279,15 @@ class SubtitlesApi(QtCore.QObject):
 
         :param new_selection: new list of selected indexes
         """
-        new_selection = list(sorted(new_selection))
-        changed = new_selection != self._selected_indexes
-        self._selected_indexes = new_selection
-        self.selection_changed.emit(new_selection, changed)
+        self._set_selection(RangeSet(new_selection))
+
+    def is_selected(self, idx: int) -> bool:
+        """Return whether the event at given position is selected.
+
+        :param idx: event position
+        :return: whether the event is selected
+        """
+        return idx in self._selection
 
     @property
     def selected_events(self) -> T.List[AssEvent]:
@@ -205,24 +312,39 @@ class SubtitlesApi(QtCore.QObject):
         """Load empty ASS file."""
         self._path = None
         self.selected_indexes = []
-        self.ass_file.meta.clear()
-        self.ass_file.events.clear()
-        self.ass_file.styles.clear()
-        self.ass_file.styles.append(AssStyle(name=self.default_style_name))
-        self.ass_file.meta.update(
-            {"Language": self._cfg.opt["gui"]["spell_check"]}
-        )
+        self._loading = True
+        try:
+            self.ass_file.meta.clear()
+            self.ass_file.events.clear()
+            self.ass_file.styles.clear()
+            self.ass_file.styles.append(AssStyle(name=self.default_style_name))
+            self.ass_file.meta.update(
+                {"Language": self._cfg.opt["gui"]["spell_check"]}
+            )
+        finally:
+            self._loading = False
         self.loaded.emit()
 
     def load_ass(self, path: T.Union[str, Path]) -> None:
         """Load specified ASS file.
 
+        If enabled and up to date, the project sidecar is loaded
+        instead, along with the selection it recorded.
+
         :param path: path to load the file from
         """
         assert path
         path = Path(path)
-        with path.open("r") as handle:
-            load_ass(handle, self.ass_file)
+        sidecar = None
+        self._loading = True
+        try:
+            if self._cfg.opt["subs"]["project_sidecar"]:
+                sidecar = read_sidecar(path, self.ass_file)
+            if sidecar is None:
+                with path.open("r") as handle:
+                    load_ass(handle, self.ass_file)
+        finally:
+            self._loading = False
 
         self._cfg.opt.add_recent_file(path)
 
@@ -230,29 +352,139 @@ class SubtitlesApi(QtCore.QObject):
         self._path = path
         self.loaded.emit()
 
+        if sidecar is not None and isinstance(sidecar.get("selection"), list):
+            self.selected_indexes = [
+                idx
+                for idx in sidecar["selection"]
+                if isinstance(idx, int) and 0 <= idx < len(self.events)
+            ]
+
     def save_ass(
-        self, path: T.Union[str, Path], remember_path: bool = False
+        self,
+        path: T.Union[str, Path],
+        remember_path: bool = False,
+        complete_callback: T.Optional[_SaveCallback] = None,
     ) -> None:
         """Save current state to the specified file.
 
+        The state is captured right away, but serialized and written to the
+        disk in the background. The file is replaced atomically, so a crash
+        never leaves it truncated. If `remember_path` is set, `saved` is
+        emitted once the file is written. If enabled, a project sidecar is
+        written alongside to speed up loading the file later.
+
+        The callback receives None once the file is written, or the error
+        that prevented writing it. If another save of the same file is
+        requested in the meantime, it receives the outcome of that save.
+
         :param path: path to save the state to
         :param remember_path:
             whether to update `self.path` with the specified `path`
+        :param complete_callback: optional callback receiving the outcome
+            (executed in the qt thread)
         """
         assert path
         path = Path(path)
         if remember_path:
             self._path = path
-        with path.open("w") as handle:
-            write_ass(self.ass_file, handle)
-        if remember_path:
+            self.about_to_save.emit()
+
+        snapshot = snapshot_ass(self.ass_file)
+
+        sidecar = None
+        if self._cfg.opt["subs"]["project_sidecar"]:
+            sidecar = {"selection": self.selected_indexes}
+
+        generation = self._save_generations.get(path, 0) + 1
+        self._save_generations[path] = generation
+        if complete_callback is not None:
+            self._save_callbacks.setdefault(path, []).append(
+                (generation, complete_callback)
+            )
+        with self._save_cond:
+            self._pending_saves += 1
+        self._threading_api.schedule_write_task(
+            functools.partial(
+                self._write_ass, path, snapshot, sidecar, generation
+            ),
+            functools.partial(
+                self._on_ass_written, path, generation, remember_path
+            ),
+        )
+
+    def wait_for_save(self) -> None:
+        """Block until all scheduled saves are written to the disk."""
+        with self._save_cond:
+            self._save_cond.wait_for(lambda: not self._pending_saves)
+
+    def _write_ass(
+        self,
+        path: Path,
+        snapshot: AssSnapshot,
+        sidecar: T.Optional[T.Dict[str, T.Any]],
+        generation: int,
+    ) -> _SaveResult:
+        try:
+            with self._save_lock:
+                # a newer save of the same file was scheduled in the meantime
+                if self._save_generations[path] != generation:
+                    return _SaveResult(superseded=True, error=None)
+                handle = io.StringIO()
+                write_ass_snapshot(snapshot, handle)
+                write_file_atomically(path, handle.getvalue())
+                if sidecar is not None:
+                    write_sidecar(path, snapshot, sidecar)
+                return _SaveResult(superseded=False, error=None)
+        except Exception as ex:  # pylint: disable=broad-except
+            return _SaveResult(superseded=False, error=ex)
+        finally:
+            with self._save_cond:
+                self._pending_saves -= 1
+                self._save_cond.notify_all()
+
+    def _on_ass_written(
+        self,
+        path: Path,
+        generation: int,
+        remember_path: bool,
+        result: _SaveResult,
+    ) -> None:
+        if result.superseded:
+            return
+        if (
+            result.error is None
+            and remember_path
+            and self._save_generations[path] == generation
+        ):
             self.saved.emit()
             self._cfg.opt.add_recent_file(path)
+        # saves superseded by this one are finished too, newer ones aren't
+        callbacks = self._save_callbacks.pop(path, [])
+        for callback_generation, callback in callbacks:
+            if callback_generation <= generation:
+                callback(result.error)
+        pending = [item for item in callbacks if item[0] > generation]
+        if pending:
+            self._save_callbacks[path] = pending
+
+    def _set_selection(self, new_selection: RangeSet) -> None:
+        changed = new_selection != self._selection
+        self._selection = new_selection
+        self.selection_changed.emit(new_selection.to_list(), changed)
 
     def _on_items_removed(self, idx: int, count: int) -> None:
-        new_indexes = list(sorted(self.selected_indexes))
-        for i in reversed(range(idx, idx + count)):
-            new_indexes = [
-                j - 1 if j > i else j for j in new_indexes if j != i
-            ]
-        self.selected_indexes = new_indexes
+        self._set_selection(self._selection.remove_and_shift(idx, count))
+
+    def _on_event_modified(self, idx: int) -> None:
+        changed_props = self.events[idx].changed_properties
+        if changed_props & TIMING_PROPERTIES:
+            self._timing_version += 1
+        if changed_props - TIMING_PROPERTIES:
+            self._text_version += 1
+
+    def _on_events_structure_change(self) -> None:
+        self._timing_version += 1
+        self._text_version += 1
+
+    def _on_styles_change(self) -> None:
+        self._style_version += 1
@@ -159,6 +159,55 @@ class OneShotWorker(QtCore.QRunnable):
             self.signals.finished.emit(result)
 
 
+class TaskHandle(QtCore.QObject):
+    """Progress and cancellation of a background task.
+
+    The task is expected to check .is_canceled every now and then and to
+    report its progress with .report_progress(). The progress signal is
+    delivered to the qt thread.
+    """
+
+    progressed = QtCore.pyqtSignal(int, int)
+
+    def __init__(self) -> None:
+        """Initialize self."""
+        super().__init__()
+        self._canceled = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def is_canceled(self) -> bool:
+        """Return whether the task was asked to stop.
+
+        :return: whether the task was canceled
+        """
+        return self._canceled.is_set()
+
+    @property
+    def is_finished(self) -> bool:
+        """Return whether the task has stopped running.
+
+        :return: whether the task has finished
+        """
+        return self._finished.is_set()
+
+    def cancel(self) -> None:
+        """Ask the task to stop."""
+        self._canceled.set()
+
+    def report_progress(self, done: int, total: int) -> None:
+        """Report task progress.
+
+        :param done: number of processed items
+        :param total: number of all items
+        """
+        self.progressed.emit(done, total)
+
+    def finish(self) -> None:
+        """Mark the task as finished."""
+        self._finished.set()
+
+
 class ThreadingApi:
     """API for scheduling background tasks."""
 
@@ -169,6 +218,10 @@ class ThreadingApi:
         """
         self._log_api = log_api
         self._thread_pool = QtCore.QThreadPool()
+        # long-lived workers can occupy the whole shared pool
+        self._writer_pool = QtCore.QThreadPool()
+        self._writer_pool.setMaxThreadCount(1)
+        self._task_handles: T.List[TaskHandle] = []
 
     def schedule_task(
         self,
@@ -186,6 +239,66 @@ class ThreadingApi:
         worker.signals.finished.connect(complete_callback)
         self._thread_pool.start(worker)
 
+    def schedule_write_task(
+        self,
+        function: T.Callable[..., T.Any],
+        complete_callback: T.Callable[..., T.Any],
+    ) -> None:
+        """Schedule a task to run on the dedicated writer thread.
+
+        Writer tasks run one at a time, in the order they were scheduled,
+        and never wait for the workers of the shared thread pool.
+
+        :param function: function to run
+        :param complete_callback:
+            callback to execute when the function finishes
+            (executed in the qt thread)
+        """
+        worker = OneShotWorker(self._log_api, function)
+        worker.signals.finished.connect(complete_callback)
+        self._writer_pool.start(worker)
+
+    def schedule_cancelable_task(
+        self,
+        function: T.Callable[[TaskHandle], T.Any],
+        complete_callback: T.Callable[..., T.Any],
+    ) -> TaskHandle:
+        """Schedule a task that reports progress and can be canceled.
+
+        :param function: function to run, receives the task handle
+        :param complete_callback:
+            callback to execute when the function finishes
+            (executed in the qt thread)
+        :return: handle of the scheduled task
+        """
+        handle = TaskHandle()
+        self._task_handles = [
+            other for other in self._task_handles if not other.is_finished
+        ]
+        self._task_handles.append(handle)
+
+        def _run() -> T.Any:
+            try:
+                return function(handle)
+            finally:
+                handle.finish()
+
+        self.schedule_task(_run, complete_callback)
+        return handle
+
+    def cancel_tasks(self) -> int:
+        """Cancel all running cancelable tasks.
+
+        :return: number of canceled tasks
+        """
+        handles = [
+            handle for handle in self._task_handles if not handle.is_finished
+        ]
+        for handle in handles:
+            handle.cancel()
+        self._task_handles.clear()
+        return len(handles)
+
     def schedule_runnable(self, runnable: QtCore.QRunnable) -> None:
         """Schedule a QRunnable to run in the background thread pool.
 
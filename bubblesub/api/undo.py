@@ -17,113 +17,580 @@
 """Undo API."""
 
 import contextlib
+import functools
+import hashlib
+import operator
+import os
 import pickle
+import tempfile
 import typing as T
-import zlib
 
 from bubblesub.api.subs import SubtitlesApi
+from bubblesub.cache import get_cache_dir
 from bubblesub.cfg import Config
-from bubblesub.fmt.ass.event import AssEventList
-from bubblesub.fmt.ass.meta import AssMeta
-from bubblesub.fmt.ass.style import AssStyleList
+from bubblesub.fmt.ass.event import EVENT_FIELDS, AssEvent
+from bubblesub.fmt.ass.style import STYLE_FIELDS, AssStyle
+from bubblesub.model import ObservableList, RangeSet
 
+_LIST_FIELDS = {"events": EVENT_FIELDS, "styles": STYLE_FIELDS}
+_LIST_ITEM_TYPES = {"events": AssEvent, "styles": AssStyle}
+_LIST_ROW_GETTERS = {
+    list_name: operator.attrgetter(*fields)
+    for list_name, fields in _LIST_FIELDS.items()
+}
 
-class UndoState:
-    """Simplified application state."""
+TRow = T.Tuple[T.Any, ...]
 
+
+class UndoStats(T.NamedTuple):
+    """Undo stack statistics."""
+
+    entries: int
+    ram_size: int
+    disk_size: int
+    disk_file_size: int
+
+
+class UndoBlobPool:
+    """Content-addressed storage of serialized list items.
+
+    Items are stored under the hash of their serialized field values, so
+    identical items recorded by several changes, such as the ones removed
+    and inserted back by sorting, take memory only once. Blobs are reference
+    counted and freed when the last change using them is discarded.
+
+    Blobs that don't fit in the memory budget are spilled to a temporary
+    file in the cache directory, oldest first, and read back from there
+    when needed. Once most of the file is taken by released blobs, the
+    live ones are rewritten to a new file.
+    """
+
+    def __init__(self) -> None:
+        """Initialize self."""
+        self._blobs: T.Dict[bytes, bytes] = {}
+        self._spilled: T.Dict[bytes, T.Tuple[int, int]] = {}
+        self._refcounts: T.Dict[bytes, int] = {}
+        self._ram_size = 0
+        self._disk_size = 0
+        self._spill_end = 0
+        self._spill_file: T.Optional[T.BinaryIO] = None
+
+    def __len__(self) -> int:
+        """Return how many distinct blobs the pool contains.
+
+        :return: number of blobs
+        """
+        return len(self._refcounts)
+
+    @property
+    def ram_size(self) -> int:
+        """Return total size of the blobs kept in memory.
+
+        :return: size in bytes
+        """
+        return self._ram_size
+
+    @property
+    def disk_size(self) -> int:
+        """Return total size of the blobs spilled to the disk.
+
+        :return: size in bytes
+        """
+        return self._disk_size
+
+    @property
+    def disk_file_size(self) -> int:
+        """Return size of the spill file, including released blobs.
+
+        :return: size in bytes
+        """
+        if self._spill_file is None:
+            return 0
+        self._spill_file.flush()
+        return os.fstat(self._spill_file.fileno()).st_size
+
+    def add(self, row: TRow) -> bytes:
+        """Store item field values, or take a reference to existing copy.
+
+        :param row: field values of the item
+        :return: key to retrieve the values with
+        """
+        blob = pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL)
+        key = hashlib.sha1(blob).digest()
+        if key in self._refcounts:
+            self._refcounts[key] += 1
+            if key in self._blobs:
+                # keep recently used blobs last in the spilling order
+                self._blobs[key] = self._blobs.pop(key)
+        else:
+            self._blobs[key] = blob
+            self._refcounts[key] = 1
+            self._ram_size += len(blob)
+        return key
+
+    def get(self, key: bytes) -> TRow:
+        """Retrieve stored item field values.
+
+        :param key: key returned by .add()
+        :return: field values of the item
+        """
+        blob = self._blobs.get(key)
+        if blob is None:
+            assert self._spill_file is not None
+            offset, length = self._spilled[key]
+            self._spill_file.seek(offset)
+            blob = self._spill_file.read(length)
+        return T.cast(TRow, pickle.loads(blob))
+
+    def release(self, key: bytes) -> None:
+        """Drop a reference to stored item field values.
+
+        :param key: key returned by .add()
+        """
+        self._refcounts[key] -= 1
+        if self._refcounts[key]:
+            return
+        del self._refcounts[key]
+        if key in self._blobs:
+            self._ram_size -= len(self._blobs.pop(key))
+        else:
+            self._disk_size -= self._spilled.pop(key)[1]
+            if not self._spilled:
+                self.close()
+            elif self._disk_size * 2 < self._spill_end:
+                self._compact()
+
+    def spill(self, max_ram_size: int) -> None:
+        """Move the oldest blobs to the disk until the rest fits in memory.
+
+        :param max_ram_size: memory budget in bytes
+        """
+        if self._ram_size <= max_ram_size:
+            return
+        if self._spill_file is None:
+            self._spill_file = self._open_spill_file()
+        offset = self._spill_file.seek(self._spill_end)
+        chunks = []
+        while self._ram_size > max_ram_size:
+            key = next(iter(self._blobs))
+            blob = self._blobs.pop(key)
+            chunks.append(blob)
+            self._spilled[key] = (offset, len(blob))
+            offset += len(blob)
+            self._ram_size -= len(blob)
+            self._disk_size += len(blob)
+        self._spill_file.write(b"".join(chunks))
+        self._spill_end = offset
+
+    def close(self) -> None:
+        """Delete the spill file, if there is one.
+
+        Meant to be called once the pool is no longer in use, or when there
+        are no spilled blobs left.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self._spill_end = 0
+
+    def _open_spill_file(self) -> T.BinaryIO:
+        get_cache_dir().mkdir(parents=True, exist_ok=True)
+        return T.cast(T.BinaryIO, tempfile.TemporaryFile(dir=get_cache_dir()))
+
+    def _compact(self) -> None:
+        assert self._spill_file is not None
+        new_file = self._open_spill_file()
+        offset = 0
+        for key, (old_offset, length) in sorted(
+            self._spilled.items(), key=lambda item: item[1][0]
+        ):
+            self._spill_file.seek(old_offset)
+            new_file.write(self._spill_file.read(length))
+            self._spilled[key] = (offset, length)
+            offset += length
+        self._spill_file.close()
+        self._spill_file = new_file
+        self._spill_end = offset
+
+
+class UndoChange:
+    """Reversible change to the subtitles."""
+
+    def store(self, pool: UndoBlobPool) -> None:
+        """Move the data needed to replay the change to the blob pool.
+
+        Called once the change is pushed onto the undo stack.
+
+        :param pool: pool to store the data in
+        """
+
+    def release(self, pool: UndoBlobPool) -> None:
+        """Drop the data stored in the blob pool.
+
+        Called once the change is discarded from the undo stack.
+
+        :param pool: pool the data was stored in
+        """
+
+    def apply(self, subs_api: SubtitlesApi) -> None:
+        """Make the change.
+
+        :param subs_api: subtitles API
+        """
+        raise NotImplementedError("not implemented")
+
+    def revert(self, subs_api: SubtitlesApi) -> None:
+        """Undo the change.
+
+        :param subs_api: subtitles API
+        """
+        raise NotImplementedError("not implemented")
+
+
+class _ItemsInsertion(UndoChange):
+    def __init__(self, list_name: str, idx: int, rows: T.List[TRow]) -> None:
+        """Initialize self.
+
+        :param list_name: name of the changed list
+        :param idx: where the items were inserted
+        :param rows: field values of the inserted items
+        """
+        self.list_name = list_name
+        self.idx = idx
+        self.count = len(rows)
+        self.rows: T.Optional[T.List[TRow]] = rows
+        self.keys: T.List[bytes] = []
+        self._pool: T.Optional[UndoBlobPool] = None
+
+    def store(self, pool: UndoBlobPool) -> None:
+        """Move the data needed to replay the change to the blob pool.
+
+        :param pool: pool to store the data in
+        """
+        assert self.rows is not None
+        self.keys = [pool.add(row) for row in self.rows]
+        self.rows = None
+        self._pool = pool
+
+    def release(self, pool: UndoBlobPool) -> None:
+        """Drop the data stored in the blob pool.
+
+        :param pool: pool the data was stored in
+        """
+        for key in self.keys:
+            pool.release(key)
+        self.keys = []
+
+    def apply(self, subs_api: SubtitlesApi) -> None:
+        """Make the change.
+
+        :param subs_api: subtitles API
+        """
+        if self._pool is not None:
+            rows = [self._pool.get(key) for key in self.keys]
+        else:
+            assert self.rows is not None
+            rows = self.rows
+        item_type = _LIST_ITEM_TYPES[self.list_name]
+        _get_list(subs_api, self.list_name).insert(
+            self.idx, *[item_type(*row) for row in rows]
+        )
+
+    def revert(self, subs_api: SubtitlesApi) -> None:
+        """Undo the change.
+
+        :param subs_api: subtitles API
+        """
+        _get_list(subs_api, self.list_name).remove(self.idx, self.count)
+
+
+class _ItemsRemoval(_ItemsInsertion):
+    def apply(self, subs_api: SubtitlesApi) -> None:
+        """Make the change.
+
+        :param subs_api: subtitles API
+        """
+        super().revert(subs_api)
+
+    def revert(self, subs_api: SubtitlesApi) -> None:
+        """Undo the change.
+
+        :param subs_api: subtitles API
+        """
+        super().apply(subs_api)
+
+
+class _ItemsMove(UndoChange):
+    def __init__(
+        self, list_name: str, idx: int, count: int, new_idx: int
+    ) -> None:
+        """Initialize self.
+
+        :param list_name: name of the changed list
+        :param idx: source position
+        :param count: how many items were moved
+        :param new_idx: target position
+        """
+        self.list_name = list_name
+        self.idx = idx
+        self.count = count
+        self.new_idx = new_idx
+
+    def apply(self, subs_api: SubtitlesApi) -> None:
+        """Make the change.
+
+        :param subs_api: subtitles API
+        """
+        _get_list(subs_api, self.list_name).move(
+            self.idx, self.count, self.new_idx
+        )
+
+    def revert(self, subs_api: SubtitlesApi) -> None:
+        """Undo the change.
+
+        :param subs_api: subtitles API
+        """
+        _get_list(subs_api, self.list_name).move(
+            self.new_idx, self.count, self.idx
+        )
+
+
+class _ItemModification(UndoChange):
     def __init__(
         self,
-        events: AssEventList,
-        styles: AssStyleList,
-        meta: AssMeta,
-        selected_indexes: T.List[int],
+        list_name: str,
+        idx: int,
+        old_values: T.Dict[int, T.Any],
+        new_values: T.Dict[int, T.Any],
     ) -> None:
         """Initialize self.
 
-        :param events: list of events for the currently loaded ASS file
-        :param styles: list of styles for the currently loaded ASS file
-        :param meta: meta dict for the currently loaded ASS file
-        :param selected_indexes: current selection on the subtitle grid
+        :param list_name: name of the changed list
+        :param idx: position of the modified item
+        :param old_values: changed fields before the change, by field number
+        :param new_values: changed fields after the change, by field number
         """
-        self._events = _pickle(events)
-        self._styles = _pickle(styles)
-        self._meta = _pickle(dict(meta.items()))
-        self.selected_indexes = selected_indexes
+        self.list_name = list_name
+        self.idx = idx
+        self.old_values: T.Optional[T.Dict[int, T.Any]] = old_values
+        self.new_values: T.Optional[T.Dict[int, T.Any]] = new_values
+        self.keys: T.List[bytes] = []
+        self._pool: T.Optional[UndoBlobPool] = None
 
-    @property
-    def events(self) -> AssEventList:
-        """Return list of remembered events.
+    def store(self, pool: UndoBlobPool) -> None:
+        """Move the data needed to replay the change to the blob pool.
 
-        :return: list of remembered events
+        :param pool: pool to store the data in
+        """
+        assert self.old_values is not None
+        assert self.new_values is not None
+        self.keys = [
+            pool.add(tuple(self.old_values.items())),
+            pool.add(tuple(self.new_values.items())),
+        ]
+        self.old_values = None
+        self.new_values = None
+        self._pool = pool
+
+    def release(self, pool: UndoBlobPool) -> None:
+        """Drop the data stored in the blob pool.
+
+        :param pool: pool the data was stored in
         """
-        return T.cast(AssEventList, _unpickle(self._events))
+        for key in self.keys:
+            pool.release(key)
+        self.keys = []
 
-    @property
-    def styles(self) -> AssStyleList:
-        """Return list of remembered styles.
+    def apply(self, subs_api: SubtitlesApi) -> None:
+        """Make the change.
 
-        :return: list of remembered styles
+        :param subs_api: subtitles API
         """
-        return T.cast(AssStyleList, _unpickle(self._styles))
+        if self._pool is not None:
+            values = dict(self._pool.get(self.keys[1]))
+        else:
+            assert self.new_values is not None
+            values = self.new_values
+        self._set_values(subs_api, values)
 
-    @property
-    def meta(self) -> T.Dict[str, str]:
-        """Return remembered meta dict.
+    def revert(self, subs_api: SubtitlesApi) -> None:
+        """Undo the change.
 
-        :return: meta dict
+        :param subs_api: subtitles API
         """
-        return T.cast(T.Dict[str, str], _unpickle(self._meta))
+        if self._pool is not None:
+            values = dict(self._pool.get(self.keys[0]))
+        else:
+            assert self.old_values is not None
+            values = self.old_values
+        self._set_values(subs_api, values)
+
+    def _set_values(
+        self, subs_api: SubtitlesApi, values: T.Dict[int, T.Any]
+    ) -> None:
+        fields = _LIST_FIELDS[self.list_name]
+        item = _get_list(subs_api, self.list_name)[self.idx]
+        item.begin_update()
+        for field_num, value in values.items():
+            setattr(item, fields[field_num], value)
+        item.end_update()
 
-    def __eq__(self, other: T.Any) -> T.Any:
-        """Whether two UndoStates are equivalent.
 
-        Needed to tell if nothing has changed when deciding whether to push
-        onto the undo stack.
+class _MetaChange(UndoChange):
+    def __init__(
+        self, old_meta: T.Dict[str, str], new_meta: T.Dict[str, str]
+    ) -> None:
+        """Initialize self.
 
-        :param other: object to compare self with
-        :return: bool or NotImplemented to fall back to default implementation
+        :param old_meta: meta before the change
+        :param new_meta: meta after the change
         """
-        if isinstance(other, UndoState):
-            return (
-                self._events == other._events
-                and self._styles == other._styles
-                and self._meta == other._meta
-            )
-        return NotImplemented
+        self.old_meta: T.Optional[T.Dict[str, str]] = old_meta
+        self.new_meta: T.Optional[T.Dict[str, str]] = new_meta
+        self.keys: T.List[bytes] = []
+        self._pool: T.Optional[UndoBlobPool] = None
 
-    def __ne__(self, other: T.Any) -> T.Any:
-        """Opposite of __eq__.
+    def store(self, pool: UndoBlobPool) -> None:
+        """Move the data needed to replay the change to the blob pool.
 
-        :param other: object to compare self with
-        :return: bool or NotImplemented to fall back to default implementation
+        :param pool: pool to store the data in
+        """
+        assert self.old_meta is not None
+        assert self.new_meta is not None
+        self.keys = [
+            pool.add(tuple(self.old_meta.items())),
+            pool.add(tuple(self.new_meta.items())),
+        ]
+        self.old_meta = None
+        self.new_meta = None
+        self._pool = pool
+
+    def release(self, pool: UndoBlobPool) -> None:
+        """Drop the data stored in the blob pool.
+
+        :param pool: pool the data was stored in
         """
-        result = self.__eq__(other)
-        if result is NotImplemented:
-            return result
-        return not result
+        for key in self.keys:
+            pool.release(key)
+        self.keys = []
 
+    def apply(self, subs_api: SubtitlesApi) -> None:
+        """Make the change.
 
-def _pickle(data: T.Any) -> bytes:
-    """Serialize data and use compression to save memory usage.
+        :param subs_api: subtitles API
+        """
+        if self._pool is not None:
+            meta = dict(self._pool.get(self.keys[1]))
+        else:
+            assert self.new_meta is not None
+            meta = self.new_meta
+        subs_api.meta.clear()
+        subs_api.meta.update(meta)
 
-    :param data: object to serialize
-    :return: serialized data
-    """
-    return zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    def revert(self, subs_api: SubtitlesApi) -> None:
+        """Undo the change.
+
+        :param subs_api: subtitles API
+        """
+        if self._pool is not None:
+            meta = dict(self._pool.get(self.keys[0]))
+        else:
+            assert self.old_meta is not None
+            meta = self.old_meta
+        subs_api.meta.clear()
+        subs_api.meta.update(meta)
+
+
+def _get_list(subs_api: SubtitlesApi, list_name: str) -> ObservableList[T.Any]:
+    return T.cast(ObservableList[T.Any], getattr(subs_api, list_name))
+
+
+def _has_net_change(changes: T.List[UndoChange]) -> bool:
+    # only modifications are checked, as they are what usually gets undone
+    # by hand, e.g. by typing some text and erasing it again
+    old_values: T.Dict[T.Tuple[str, int], T.Dict[int, T.Any]] = {}
+    new_values: T.Dict[T.Tuple[str, int], T.Dict[int, T.Any]] = {}
+    old_meta: T.Optional[T.Dict[str, str]] = None
+    new_meta: T.Optional[T.Dict[str, str]] = None
+    for change in changes:
+        if isinstance(change, _ItemModification):
+            assert change.old_values is not None
+            assert change.new_values is not None
+            key = (change.list_name, change.idx)
+            for field_num, value in change.old_values.items():
+                old_values.setdefault(key, {}).setdefault(field_num, value)
+            new_values.setdefault(key, {}).update(change.new_values)
+        elif isinstance(change, _MetaChange):
+            if old_meta is None:
+                old_meta = change.old_meta
+            new_meta = change.new_meta
+        else:
+            return True
+    return old_values != new_values or old_meta != new_meta
+
+
+class UndoEntry:
+    """Changes made by a single user operation."""
+
+    def __init__(
+        self, changes: T.List[UndoChange], selection: RangeSet, version: int,
+    ) -> None:
+        """Initialize self.
 
+        :param changes: changes in the order they were made
+        :param selection: selection on the subtitle grid after the changes
+        :param version: document version after the changes
+        """
+        self.changes = changes
+        self.version = version
+        self._selection: T.Optional[RangeSet] = selection
+        self._selection_key: T.Optional[bytes] = None
+        self._pool: T.Optional[UndoBlobPool] = None
 
-def _unpickle(data: bytes) -> T.Any:
-    """Deserialize data.
+    @property
+    def selection(self) -> RangeSet:
+        """Return selection on the subtitle grid after the changes.
 
-    :param data: serialized data
-    :return: deserialized object
-    """
-    return pickle.loads(zlib.decompress(data))
+        :return: indexes of the selected events
+        """
+        if self._pool is not None:
+            assert self._selection_key is not None
+            return T.cast(RangeSet, self._pool.get(self._selection_key)[0])
+        assert self._selection is not None
+        return self._selection
+
+    def store(self, pool: UndoBlobPool) -> None:
+        """Move the changes and the selection to the blob pool.
+
+        :param pool: pool to store the data in
+        """
+        assert self._selection is not None
+        for change in self.changes:
+            change.store(pool)
+        # stored as ranges rather than every single index
+        self._selection_key = pool.add((self._selection,))
+        self._selection = None
+        self._pool = pool
+
+    def release(self, pool: UndoBlobPool) -> None:
+        """Drop the data stored in the blob pool.
+
+        :param pool: pool the data was stored in
+        """
+        for change in self.changes:
+            change.release(pool)
+        if self._selection_key is not None:
+            pool.release(self._selection_key)
+            self._selection_key = None
 
 
 class UndoApi:
     """API for manipulation of undo and redo data for subtitles styles, events
     and metadata.
+
+    Rather than snapshots of the whole document, the undo stack holds the
+    changes reported by the subtitle lists and the metadata, so undoing and
+    redoing touches only what was actually changed.
     """
 
     def __init__(self, cfg: Config, subs_api: SubtitlesApi) -> None:
@@ -134,21 +601,47 @@ class UndoApi:
         """
         self._cfg = cfg
         self._subs_api = subs_api
-        self._stack: T.List[UndoState] = []
-        self._stack_pos = -1
-        self._saved_state: T.Optional[UndoState] = None
+        self._stack: T.List[UndoEntry] = [UndoEntry([], RangeSet(), 0)]
+        self._stack_pos = 0
+        self._pool = UndoBlobPool()
+        self._pending: T.List[UndoChange] = []
+        self._old_rows: T.Dict[T.Tuple[str, int], TRow] = {}
+        self._meta = dict(self._subs_api.meta.items())
+        self._last_version = 0
+        self._version = 0
+        self._saved_version = 0
+        self._saving_version: T.Optional[int] = None
         self._ignore = False
 
+        for list_name in _LIST_FIELDS:
+            self._connect_list(list_name)
+        self._subs_api.meta_changed.connect(self._on_meta_change)
         self._subs_api.loaded.connect(self._on_subtitles_load)
+        self._subs_api.about_to_save.connect(self._on_subtitles_about_to_save)
         self._subs_api.saved.connect(self._on_subtitles_save)
 
     @property
     def needs_save(self) -> bool:
         """Return whether there are any unsaved changes.
 
+        Cheap enough to be polled freely.
+
         :return: whether there are any unsaved changes
         """
-        return self._make_state() != self._saved_state
+        return self._version != self._saved_version
+
+    @property
+    def stats(self) -> UndoStats:
+        """Return statistics of the undo stack.
+
+        :return: number of entries and size of the stored data
+        """
+        return UndoStats(
+            entries=len(self._stack),
+            ram_size=self._pool.ram_size,
+            disk_size=self._pool.disk_size,
+            disk_file_size=self._pool.disk_file_size,
+        )
 
     @property
     def has_undo(self) -> bool:
@@ -168,7 +661,7 @@ class UndoApi:
 
     @contextlib.contextmanager
     def capture(self) -> T.Iterator[None]:
-        """Execute user operation and record the application state after it.
+        """Execute user operation and record the changes it made.
 
         Doesn't push onto undo stack if nothing has changed.
         This function should wrap any operation that makes "undoable" changes
@@ -186,72 +679,198 @@ class UndoApi:
         if not self.has_undo:
             raise RuntimeError("no more undo")
         self._ignore = True
+        self._revert_pending()
+        for change in reversed(self._stack[self._stack_pos].changes):
+            change.revert(self._subs_api)
         self._stack_pos -= 1
-        old_state = self._stack[self._stack_pos]
-        assert old_state
-        self._apply_state(old_state)
+        self._version = self._stack[self._stack_pos].version
+        self._subs_api.selection = self._stack[self._stack_pos].selection
         self._ignore = False
 
     def redo(self) -> None:
         """Reapply undone application state."""
         if not self.has_redo:
             raise RuntimeError("no more redo")
-
         self._ignore = True
+        self._revert_pending()
         self._stack_pos += 1
-        new_state = self._stack[self._stack_pos]
-        self._apply_state(new_state)
+        for change in self._stack[self._stack_pos].changes:
+            change.apply(self._subs_api)
+        self._version = self._stack[self._stack_pos].version
+        self._subs_api.selection = self._stack[self._stack_pos].selection
         self._ignore = False
 
     def _discard_redo(self) -> None:
+        self._release(self._stack[self._stack_pos + 1 :])
         self._stack = self._stack[: self._stack_pos + 1]
         self._stack_pos = len(self._stack) - 1
 
     def _discard_old_undo(self) -> None:
+        # the changes of the bottommost entry are never reverted, so the
+        # entries can be simply dropped
         max_undo = self._cfg.opt["basic"]["max_undo"]
         if len(self._stack) < max_undo or max_undo <= 0:
             return
         assert self._stack_pos == len(self._stack) - 1
+        self._release(self._stack[: -max_undo + 1])
         self._stack = self._stack[-max_undo + 1 :]
         self._stack_pos = len(self._stack) - 1
 
     def push(self) -> bool:
-        """Discard any redo information and push current state onto stack.
+        """Discard any redo information and push recorded changes onto stack.
 
         :return: whether there was a change
         """
         if self._ignore:
             return False
-        old_state = self._stack[self._stack_pos]
-        cur_state = self._make_state()
-        if old_state == cur_state:
+        if not self._pending:
+            return False
+        if not _has_net_change(self._pending):
+            # the document is back to the state of the current entry
+            self._pending = []
+            self._version = self._stack[self._stack_pos].version
             return False
         self._discard_redo()
-        self._stack.append(cur_state)
+        entry = UndoEntry(
+            self._pending, self._subs_api.selection, self._version
+        )
+        entry.store(self._pool)
+        self._stack.append(entry)
+        self._pending = []
         self._stack_pos = len(self._stack) - 1
         self._discard_old_undo()
+        max_undo_memory = self._cfg.opt["basic"]["max_undo_memory_mb"]
+        if max_undo_memory > 0:
+            self._pool.spill(max_undo_memory * 1024 * 1024)
         return True
 
+    def _release(self, entries: T.List[UndoEntry]) -> None:
+        for entry in entries:
+            entry.release(self._pool)
+
+    def _revert_pending(self) -> None:
+        # changes that weren't pushed are discarded
+        for change in reversed(self._pending):
+            change.revert(self._subs_api)
+        self._pending = []
+        self._old_rows.clear()
+        self._version = self._stack[self._stack_pos].version
+
+    def _record(self, change: UndoChange) -> None:
+        self._pending.append(change)
+        # every state gets a distinct version, even if it has the same
+        # contents as some other state
+        self._last_version += 1
+        self._version = self._last_version
+
+    def _connect_list(self, list_name: str) -> None:
+        items = _get_list(self._subs_api, list_name)
+        items.items_inserted.connect(
+            functools.partial(self._on_items_insertion, list_name)
+        )
+        items.items_about_to_be_removed.connect(
+            functools.partial(self._on_items_removal, list_name)
+        )
+        items.items_moved.connect(
+            functools.partial(self._on_items_move, list_name)
+        )
+        items.item_about_to_be_modified.connect(
+            functools.partial(self._on_item_about_to_be_modified, list_name)
+        )
+        items.item_modified.connect(
+            functools.partial(self._on_item_modification, list_name)
+        )
+
+    def _get_rows(self, list_name: str, idx: int, count: int) -> T.List[TRow]:
+        items = _get_list(self._subs_api, list_name)
+        return list(
+            map(_LIST_ROW_GETTERS[list_name], items[idx : idx + count])
+        )
+
+    def _is_recording(self) -> bool:
+        # loading replaces everything in bulk and resets the stack afterwards
+        return not self._ignore and not self._subs_api.is_loading
+
+    def _on_items_insertion(
+        self, list_name: str, idx: int, count: int
+    ) -> None:
+        if self._is_recording():
+            self._record(
+                _ItemsInsertion(
+                    list_name, idx, self._get_rows(list_name, idx, count)
+                )
+            )
+
+    def _on_items_removal(self, list_name: str, idx: int, count: int) -> None:
+        if self._is_recording():
+            self._record(
+                _ItemsRemoval(
+                    list_name, idx, self._get_rows(list_name, idx, count)
+                )
+            )
+
+    def _on_items_move(
+        self, list_name: str, idx: int, count: int, new_idx: int
+    ) -> None:
+        if self._is_recording():
+            self._record(_ItemsMove(list_name, idx, count, new_idx))
+
+    def _on_item_about_to_be_modified(self, list_name: str, idx: int) -> None:
+        # setters can change other properties, which nests the signals
+        if self._is_recording():
+            self._old_rows.setdefault(
+                (list_name, idx), self._get_rows(list_name, idx, 1)[0]
+            )
+
+    def _on_item_modification(self, list_name: str, idx: int) -> None:
+        old_row = self._old_rows.pop((list_name, idx), None)
+        if not self._is_recording() or old_row is None:
+            return
+        new_row = self._get_rows(list_name, idx, 1)[0]
+        field_nums = [
+            field_num
+            for field_num, (old_value, new_value) in enumerate(
+                zip(old_row, new_row)
+            )
+            if old_value != new_value
+        ]
+        if field_nums:
+            self._record(
+                _ItemModification(
+                    list_name,
+                    idx,
+                    {num: old_row[num] for num in field_nums},
+                    {num: new_row[num] for num in field_nums},
+                )
+            )
+
+    def _on_meta_change(self) -> None:
+        old_meta = self._meta
+        self._meta = dict(self._subs_api.meta.items())
+        if self._is_recording() and old_meta != self._meta:
+            self._record(_MetaChange(old_meta, self._meta))
+
     def _on_subtitles_load(self) -> None:
-        state = self._make_state()
-        self._stack = [state]
+        self._last_version += 1
+        self._version = self._last_version
+        self._pool.close()
+        self._pool = UndoBlobPool()
+        entry = UndoEntry([], self._subs_api.selection, self._version)
+        entry.store(self._pool)
+        self._stack = [entry]
         self._stack_pos = 0
-        self._saved_state = state
+        self._pending = []
+        self._old_rows.clear()
+        self._meta = dict(self._subs_api.meta.items())
+        self._saved_version = self._version
+        self._saving_version = None
 
-    def _on_subtitles_save(self) -> None:
-        self._saved_state = self._make_state()
-
-    def _make_state(self) -> UndoState:
-        return UndoState(
-            events=self._subs_api.events,
-            styles=self._subs_api.styles,
-            meta=self._subs_api.meta,
-            selected_indexes=self._subs_api.selected_indexes,
-        )
+    def _on_subtitles_about_to_save(self) -> None:
+        # saving finishes in the background; the file contains the state
+        # from when it started, not from when it finished
+        self._saving_version = self._version
 
-    def _apply_state(self, state: UndoState) -> None:
-        self._subs_api.events.replace(list(state.events))
-        self._subs_api.styles.replace(list(state.styles))
-        self._subs_api.meta.clear()
-        self._subs_api.meta.update(state.meta)
-        self._subs_api.selected_indexes = state.selected_indexes
+    def _on_subtitles_save(self) -> None:
+        if self._saving_version is not None:
+            self._saved_version = self._saving_version
+            self._saving_version = None
@@ -17,7 +17,12 @@
 """Video API."""
 
 import bisect
+import concurrent.futures
+import copy
 import fractions
+import os
+import queue
+import subprocess
 import threading
 import time
 import typing as T
@@ -31,12 +36,137 @@ from PyQt5 import QtCore
 
 from bubblesub.api.log import LogApi
 from bubblesub.api.subs import SubtitlesApi
-from bubblesub.api.threading import ThreadingApi
-from bubblesub.ass_renderer import AssRenderer
+from bubblesub.api.threading import TaskHandle, ThreadingApi
+from bubblesub.ass_renderer import AssRenderer, AssRendererPool
+from bubblesub.fmt.ass.event import AssEventList
+from bubblesub.fmt.ass.meta import AssMeta
+from bubblesub.fmt.ass.style import AssStyleList
 
 _LOADING = object()
 _SAMPLER_LOCK = threading.Lock()
 _PIX_FMT = [ffms2.get_pix_fmt("rgb24")]
+_PIPELINE_END = object()
+
+PIPELINE_QUEUE_SIZE = 8
+RENDER_THREADS = min(PIPELINE_QUEUE_SIZE, os.cpu_count() or 1)
+
+
+def _save_image(
+    path: Path,
+    size: T.Tuple[int, int],
+    frame: np.array,
+    subs: T.Optional[T.Tuple[T.Tuple[int, int], PIL.Image.Image]],
+) -> None:
+    """Compose and encode a screenshot.
+
+    Runs in a worker thread; PIL releases the GIL while encoding.
+
+    :param path: path to save the screenshot to
+    :param size: (width, height) tuple
+    :param frame: RGB video frame
+    :param subs: position and image of the subtitles to burn in, if any
+    """
+    image = PIL.Image.fromarray(frame)
+    if subs is not None:
+        subs_pos, subs_image = subs
+        image.paste(subs_image, subs_pos, subs_image)
+    image.save(str(path))
+
+
+def _run_pipeline(
+    source: T.Iterable[T.Any],
+    stages: T.List[T.Callable[[T.Any], T.Any]],
+    sink: T.Callable[[T.Any], None],
+    handle: T.Optional[TaskHandle],
+) -> None:
+    # The source is iterated and each stage runs on its own thread, while
+    # the sink runs on the calling thread. Stages are connected with bounded
+    # queues, so a slow stage holds back the previous ones instead of
+    # letting the items pile up in memory.
+    queues: T.List["queue.Queue[T.Any]"] = [
+        queue.Queue(PIPELINE_QUEUE_SIZE) for _stage in range(len(stages) + 1)
+    ]
+    stopped = threading.Event()
+    errors: T.List[BaseException] = []
+
+    def _put(target: "queue.Queue[T.Any]", item: T.Any) -> bool:
+        while not stopped.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _iterate(origin: "queue.Queue[T.Any]") -> T.Iterator[T.Any]:
+        while not stopped.is_set():
+            try:
+                item = origin.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _PIPELINE_END:
+                return
+            yield item
+
+    def _run_thread(
+        items: T.Iterable[T.Any],
+        func: T.Callable[[T.Any], T.Any],
+        target: "queue.Queue[T.Any]",
+    ) -> None:
+        try:
+            for item in items:
+                if (handle and handle.is_canceled) or not _put(
+                    target, func(item)
+                ):
+                    break
+            _put(target, _PIPELINE_END)
+        except BaseException as ex:  # pylint: disable=broad-except
+            errors.append(ex)
+            stopped.set()
+
+    threads = [
+        threading.Thread(
+            target=_run_thread, args=(source, lambda item: item, queues[0])
+        )
+    ] + [
+        threading.Thread(
+            target=_run_thread,
+            args=(_iterate(queues[i]), stage, queues[i + 1]),
+        )
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for item in _iterate(queues[-1]):
+            sink(item)
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _run_render_pipeline(
+    source: T.Iterable[T.Any],
+    render: T.Callable[[T.Any], T.Any],
+    sink: T.Callable[[T.Any], None],
+    handle: T.Optional[TaskHandle],
+) -> None:
+    # libass releases the GIL, so the frames are rendered on a few
+    # threads at once; the futures are resolved in order, which keeps
+    # the frames in order too
+    with concurrent.futures.ThreadPoolExecutor(RENDER_THREADS) as executor:
+        _run_pipeline(
+            source,
+            [
+                lambda item: executor.submit(render, item),
+                lambda future: future.result(),
+            ],
+            sink,
+            handle,
+        )
 
 
 def _load_video_source(
@@ -145,24 +275,9 @@ class VideoStream(QtCore.QObject):
         :param height: optional height to render to
         """
 
-        if width and height:
-            grab_width = width
-            grab_height = height
-        elif height:
-            grab_width = int(self.width * height / self.height)
-            grab_height = height
-        elif width:
-            grab_height = int(self.height * width / self.width)
-            grab_width = width
-        else:
-            grab_width = self.width
-            grab_height = self.height
-
-        if grab_width <= 0 or grab_height <= 0:
-            raise ValueError("cannot take a screenshot at negative resolution")
-
+        grab_width, grab_height = self._get_grab_size(width, height)
         pts = self.align_pts_to_prev_frame(pts)
-        idx = self.timecodes.index(pts)
+        idx = int(self.frame_idx_from_pts(pts))
         frame = self.get_frame(idx, grab_width, grab_height)
         image = PIL.Image.frombytes("RGB", (grab_width, grab_height), frame)
 
@@ -173,13 +288,284 @@ class VideoStream(QtCore.QObject):
                 self._subs_api.meta,
                 (grab_width, grab_height),
             )
-            subs_image = self._ass_renderer.render(
+            region = self._ass_renderer.render_region(
                 time=pts, aspect_ratio=self._aspect_ratio
             )
-            image = PIL.Image.composite(subs_image, image, subs_image)
+            if region is not None:
+                image.paste(region.image, (region.x, region.y), region.image)
 
         image.save(str(path))
 
+    def schedule_screenshots(
+        self,
+        shots: T.Sequence[T.Tuple[int, Path]],
+        include_subtitles: bool,
+        width: T.Optional[int],
+        height: T.Optional[int],
+        complete_callback: T.Callable[[int], T.Any],
+    ) -> TaskHandle:
+        """Save screenshots of many frames in the background.
+
+        Frames are decoded in PTS order, subtitles are rendered from a
+        snapshot of the current subtitles prepared once for all the frames
+        and the images are encoded in a thread pool.
+
+        :param shots: list of (pts, path) tuples to make screenshots of
+        :param include_subtitles: whether to 'burn in' the subtitles
+        :param width: optional width to render to
+        :param height: optional height to render to
+        :param complete_callback: callback receiving the number of saved
+            screenshots (executed in the qt thread)
+        :return: handle of the background task
+        """
+        grab_size = self._get_grab_size(width, height)
+        renderer = (
+            self._make_snapshot_renderer(grab_size)
+            if include_subtitles
+            else None
+        )
+        return self._threading_api.schedule_cancelable_task(
+            lambda handle: self._save_screenshots(
+                shots, grab_size, renderer, handle
+            ),
+            complete_callback,
+        )
+
+    def schedule_clip(
+        self,
+        start: int,
+        end: int,
+        path: Path,
+        include_subtitles: bool,
+        width: T.Optional[int],
+        height: T.Optional[int],
+        complete_callback: T.Callable[[int], T.Any],
+    ) -> TaskHandle:
+        """Save a video clip in the background.
+
+        Decoding, rendering the subtitles and encoding run on separate
+        threads connected with bounded queues, so that all three overlap.
+        Frames are piped to ffmpeg as raw RGB, or saved as a PNG sequence if
+        the path has no extension.
+
+        :param start: PTS of the first frame
+        :param end: PTS where the clip ends
+        :param path: path to save the clip to, or directory to save the PNG
+            sequence to
+        :param include_subtitles: whether to 'burn in' the subtitles
+        :param width: optional width to render to
+        :param height: optional height to render to
+        :param complete_callback: callback receiving the number of saved
+            frames (executed in the qt thread)
+        :return: handle of the background task
+        """
+        grab_size = self._get_grab_size(width, height)
+        renderer = (
+            self._make_snapshot_renderer(grab_size)
+            if include_subtitles
+            else None
+        )
+        return self._threading_api.schedule_cancelable_task(
+            lambda handle: self.save_clip(
+                start, end, path, grab_size, renderer, handle
+            ),
+            complete_callback,
+        )
+
+    def save_clip(
+        self,
+        start: int,
+        end: int,
+        path: Path,
+        size: T.Tuple[int, int],
+        renderer: T.Optional[AssRendererPool],
+        handle: T.Optional[TaskHandle] = None,
+    ) -> int:
+        """Save a video clip.
+
+        Blocks until the clip is saved; see .schedule_clip() for details.
+
+        :param start: PTS of the first frame
+        :param end: PTS where the clip ends
+        :param path: path to save the clip to, or directory to save the PNG
+            sequence to
+        :param size: (width, height) tuple to render to
+        :param renderer: renderer to burn the subtitles in with, if any
+        :param handle: handle to report the progress to and check for
+            cancellation
+        :return: number of saved frames
+        """
+        if not self._wait_for_source():
+            return 0
+        start_idx = bisect.bisect_left(self.timecodes, start)
+        end_idx = bisect.bisect_left(self.timecodes, end)
+        if start_idx >= end_idx:
+            return 0
+
+        frame_count = end_idx - start_idx
+        done_count = 0
+
+        def _decode() -> T.Iterator[T.Tuple[int, np.array]]:
+            for idx in range(start_idx, end_idx):
+                frame = self.get_frame(idx, *size)
+                if frame is None:
+                    break
+                yield (idx, frame)
+
+        def _render(item: T.Tuple[int, np.array]) -> bytes:
+            idx, frame = item
+            if renderer is None:
+                return T.cast(bytes, frame.tobytes())
+            image = PIL.Image.fromarray(frame)
+            region = renderer.render_region(
+                time=self.timecodes[idx], aspect_ratio=self._aspect_ratio
+            )
+            if region is not None:
+                image.paste(region.image, (region.x, region.y), region.image)
+            return T.cast(bytes, image.tobytes())
+
+        def _report_progress() -> None:
+            nonlocal done_count
+            done_count += 1
+            if handle:
+                handle.report_progress(done_count, frame_count)
+
+        if not path.suffix:
+            path.mkdir(parents=True, exist_ok=True)
+
+            def _write(data: bytes) -> None:
+                PIL.Image.frombytes("RGB", size, data).save(
+                    str(path / f"frame-{done_count:06d}.png")
+                )
+                _report_progress()
+
+            _run_render_pipeline(_decode(), _render, _write, handle)
+            return done_count
+
+        with subprocess.Popen(
+            [
+                "ffmpeg",
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "rawvideo",
+                "-pix_fmt",
+                "rgb24",
+                "-s",
+                f"{size[0]}x{size[1]}",
+                "-r",
+                str(self.frame_rate),
+                "-i",
+                "-",
+                "-pix_fmt",
+                "yuv420p",
+                str(path),
+            ],
+            stdin=subprocess.PIPE,
+        ) as process:
+            assert process.stdin
+
+            def _encode(data: bytes) -> None:
+                assert process.stdin
+                process.stdin.write(data)
+                _report_progress()
+
+            try:
+                _run_render_pipeline(_decode(), _render, _encode, handle)
+            finally:
+                process.stdin.close()
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with {process.returncode}")
+        return done_count
+
+    def _make_snapshot_renderer(
+        self, size: T.Tuple[int, int]
+    ) -> AssRendererPool:
+        # copies the subtitles, so that they can be rendered on another
+        # thread while the user keeps editing
+        style_list = AssStyleList()
+        style_list.append(
+            *[copy.copy(style) for style in self._subs_api.styles]
+        )
+        event_list = AssEventList()
+        event_list.append(
+            *[copy.copy(event) for event in self._subs_api.events]
+        )
+        meta = AssMeta()
+        meta.update(dict(self._subs_api.meta.items()))
+        return AssRendererPool(style_list, event_list, meta, size)
+
+    def _save_screenshots(
+        self,
+        shots: T.Sequence[T.Tuple[int, Path]],
+        size: T.Tuple[int, int],
+        renderer: T.Optional[AssRendererPool],
+        handle: TaskHandle,
+    ) -> int:
+        if not self._wait_for_source():
+            return 0
+
+        jobs = sorted(
+            (self.align_pts_to_prev_frame(pts), path) for pts, path in shots
+        )
+        max_workers = os.cpu_count() or 1
+        pending: T.Set[concurrent.futures.Future[None]] = set()
+        done_count = 0
+        last_pts: T.Optional[int] = None
+        frame: T.Optional[np.array] = None
+        subs: T.Optional[T.Tuple[T.Tuple[int, int], PIL.Image.Image]] = None
+
+        # forking from a worker thread can deadlock, and PIL encodes the
+        # images without holding the GIL anyway
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            for pts, path in jobs:
+                if handle.is_canceled:
+                    break
+
+                if pts != last_pts:
+                    last_pts = pts
+                    frame = self.get_frame(
+                        int(self.frame_idx_from_pts(pts)), *size
+                    )
+                    if frame is None:
+                        break
+                    if renderer is not None:
+                        region = renderer.render_region(
+                            time=pts, aspect_ratio=self._aspect_ratio
+                        )
+                        subs = (
+                            None
+                            if region is None
+                            else ((region.x, region.y), region.image)
+                        )
+
+                # keep only a few images in memory at a time
+                if len(pending) >= max_workers * 2:
+                    finished, pending = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for future in finished:
+                        future.result()
+                    done_count += len(finished)
+                    handle.report_progress(done_count, len(jobs))
+
+                pending.add(
+                    executor.submit(_save_image, path, size, frame, subs)
+                )
+
+            if handle.is_canceled:
+                for future in pending:
+                    future.cancel()
+            for future in concurrent.futures.as_completed(pending):
+                if not future.cancelled():
+                    future.result()
+                    done_count += 1
+                    handle.report_progress(done_count, len(jobs))
+
+        return done_count
+
     def align_pts_to_near_frame(self, pts: int) -> int:
         """Align PTS to a frame closest to given PTS.
 
@@ -338,13 +724,36 @@ class VideoStream(QtCore.QObject):
                 self._source.set_output_format(*new_output_fmt)
                 self._last_output_fmt = new_output_fmt
 
+            # ffms2 reuses the frame buffer for the next request, so the
+            # data must be copied before letting other threads in
             frame = self._source.get_frame(frame_idx)
             return (
                 frame.planes[0]
                 .reshape((height, frame.Linesize[0]))[:, 0 : width * 3]
                 .reshape(height, width, 3)
+                .copy()
             )
 
+    def _get_grab_size(
+        self, width: T.Optional[int], height: T.Optional[int]
+    ) -> T.Tuple[int, int]:
+        if width and height:
+            grab_width = width
+            grab_height = height
+        elif height:
+            grab_width = int(self.width * height / self.height)
+            grab_height = height
+        elif width:
+            grab_height = int(self.height * width / self.width)
+            grab_width = width
+        else:
+            grab_width = self.width
+            grab_height = self.height
+
+        if grab_width <= 0 or grab_height <= 0:
+            raise ValueError("cannot take a screenshot at negative resolution")
+        return (grab_width, grab_height)
+
     def _got_source(self, source: ffms2.VideoSource) -> None:
         with _SAMPLER_LOCK:
             self._source = source
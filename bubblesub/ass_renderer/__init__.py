@@ -17,4 +17,10 @@
 
 """Facade for AssRenderer."""
 
-from .ass_renderer import AssRenderer
+from .ass_renderer import (
+    AssRenderer,
+    AssRendererPool,
+    RenderedRegion,
+    drop_spare_renderers,
+    warm_up_fonts,
+)
@@ -17,33 +17,161 @@
 
 """Module for drawing ASS structures to numpy bitmaps."""
 
-import ctypes
 import fractions
+import math
+import os
+import re
+import threading
 import typing as T
+from collections import OrderedDict
 
 import numpy as np
 import PIL.Image
 
 from bubblesub.ass_renderer import libass
+from bubblesub.ass_renderer.canvas import PremultipliedCanvas
 from bubblesub.fmt.ass.event import AssEventList
 from bubblesub.fmt.ass.meta import AssMeta
 from bubblesub.fmt.ass.style import AssStyleList
 
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# radius of the LANCZOS filter in source pixels when upscaling
+_LANCZOS_SUPPORT = 3
+
+# tags and effects that make events look different over time
+_ANIMATION_REGEX = re.compile(r"\\(?:t\s*\(|move|fad|[kK])")
+
+
+class _Bitmap(T.NamedTuple):
+    rect: T.Tuple[int, int, int, int]
+    data: np.ndarray
+
+
+def _get_bitmap_size(bitmap: T.Optional[_Bitmap]) -> int:
+    return 0 if bitmap is None else bitmap.data.nbytes
+
+
+class RenderedRegion(T.NamedTuple):
+    """Part of a rendered frame."""
+
+    x: int
+    y: int
+    image: PIL.Image
+
+
+_FONTS_LOCK = threading.Lock()
+_SPARE_RENDERERS: T.List[T.Tuple[libass.AssContext, libass.AssRenderer]] = []
+# enough for every thread of a pool to render at once
+_MAX_SPARE_RENDERERS = os.cpu_count() or 1
+# bumped whenever the renderers in use might miss newly installed fonts
+_FONTS_GENERATION = 0
+
+
+def _make_libass_renderer() -> T.Tuple[libass.AssContext, libass.AssRenderer]:
+    ctx = libass.AssContext()
+    renderer = ctx.make_renderer()
+    renderer.set_fonts()
+    return (ctx, renderer)
+
+
+def _take_libass_renderer() -> T.Tuple[libass.AssContext, libass.AssRenderer]:
+    # waits for the warm-up if it's still running rather than scanning the
+    # fonts for the second time in parallel
+    with _FONTS_LOCK:
+        if _SPARE_RENDERERS:
+            return _SPARE_RENDERERS.pop()
+        return _make_libass_renderer()
+
+
+def _give_back_libass_renderer(
+    ctx: libass.AssContext, renderer: libass.AssRenderer, generation: int
+) -> None:
+    with _FONTS_LOCK:
+        if (
+            generation == _FONTS_GENERATION
+            and len(_SPARE_RENDERERS) < _MAX_SPARE_RENDERERS
+        ):
+            _SPARE_RENDERERS.append((ctx, renderer))
+
+
+def warm_up_fonts() -> None:
+    """Prepare libass renderers ahead of time.
+
+    Setting up the fonts makes fontconfig scan every installed font, which
+    can take seconds. One renderer is prepared for every thread that might
+    render at once. They are handed over to the AssRenderers that need one,
+    and taken back once these are gone, so that the fonts are set up only
+    as many times as there are renderers in use at the same time.
+    """
+    # the lock is taken for one renderer at a time, so that whoever needs
+    # one right away doesn't have to wait for all of them
+    while True:
+        with _FONTS_LOCK:
+            if len(_SPARE_RENDERERS) >= _MAX_SPARE_RENDERERS:
+                return
+            _SPARE_RENDERERS.append(_make_libass_renderer())
+
+
+def drop_spare_renderers() -> None:
+    """Discard the libass renderers prepared ahead of time.
+
+    Renderers taken from now on set up the fonts anew, which makes them see
+    fonts installed since the spare ones were made. The renderers in use
+    aren't taken back either.
+    """
+    global _FONTS_GENERATION  # pylint: disable=global-statement
+    with _FONTS_LOCK:
+        _SPARE_RENDERERS.clear()
+        _FONTS_GENERATION += 1
+
 
 class AssRenderer:
-    """Public renderer facade."""
+    """Public renderer facade.
+
+    The libass track is kept between calls to .set_source() and follows the
+    changes made to the source lists: events are inserted, removed, moved
+    and updated in place, as are modified styles. The track is rebuilt only
+    once the lists are replaced, styles are inserted, removed, moved or
+    renamed, since events refer to the styles by their indexes.
+
+    Composited frames are cached by the track version and the events they
+    show, so rendering a frame that looks like a recently rendered one
+    doesn't touch libass at all.
+    """
 
     def __init__(self) -> None:
         """Initialize self."""
-        self._ctx = libass.AssContext()
-        self._renderer = self._ctx.make_renderer()
-        self._renderer.set_fonts()
+        self._ctx: T.Optional[libass.AssContext] = None
+        self._renderer: T.Optional[libass.AssRenderer] = None
+        self._fonts_generation = 0
         self._track: T.Optional[libass.AssTrack] = None
+        self._track_outdated = True
+        self._track_changed = False
+        self._dirty_styles: T.Set[int] = set()
+        self._dirty_events: T.Set[int] = set()
+        self._canvas: T.Optional[PremultipliedCanvas] = None
+        self._track_version = 0
+        self._track_settings: T.Any = None
+        self._cache: "OrderedDict[T.Hashable, T.Optional[_Bitmap]]" = (
+            OrderedDict()
+        )
+        self._cache_size = 0
+        self._last_composite: T.Optional[
+            T.Tuple[int, T.Optional[_Bitmap]]
+        ] = None
         self.style_list: T.Optional[AssStyleList] = None
         self.event_list: T.Optional[AssEventList] = None
         self.meta: T.Optional[AssMeta] = None
         self.video_resolution: T.Optional[T.Tuple[int, int]] = None
 
+    def __del__(self) -> None:
+        """Hand the libass renderer over to the next AssRenderer."""
+        if self._ctx is not None and self._renderer is not None:
+            _give_back_libass_renderer(
+                self._ctx, self._renderer, self._fonts_generation
+            )
+
     def set_source(
         self,
         style_list: AssStyleList,
@@ -58,30 +186,185 @@ class AssRenderer:
         :param meta: ASS metadata
         :param video_resolution: (width, height) tuple
         """
-        self.style_list = style_list
-        self.event_list = event_list
+        if (
+            style_list is not self.style_list
+            or event_list is not self.event_list
+        ):
+            self._disconnect_source()
+            self.style_list = style_list
+            self.event_list = event_list
+            self._connect_source()
+            self._track_outdated = True
+
         self.meta = meta
         self.video_resolution = video_resolution
+        self._sync_track()
 
-        self._track = self._ctx.make_track()
-        self._track.populate(style_list, event_list)
+    def _connect_source(self) -> None:
+        assert self.style_list is not None
+        assert self.event_list is not None
+        self.style_list.item_modified.connect(self._on_style_modification)
+        self.style_list.items_inserted.connect(self._on_structure_change)
+        self.style_list.items_removed.connect(self._on_structure_change)
+        self.style_list.items_moved.connect(self._on_structure_change)
+        self.event_list.item_modified.connect(self._on_event_modification)
+        self.event_list.items_about_to_be_inserted.connect(
+            self._on_events_about_to_change
+        )
+        self.event_list.items_about_to_be_removed.connect(
+            self._on_events_about_to_change
+        )
+        self.event_list.items_about_to_be_moved.connect(
+            self._on_events_about_to_change
+        )
+        self.event_list.items_inserted.connect(self._on_events_insertion)
+        self.event_list.items_removed.connect(self._on_events_removal)
+        self.event_list.items_moved.connect(self._on_events_move)
+
+    def _disconnect_source(self) -> None:
+        if self.style_list is not None:
+            self.style_list.item_modified.disconnect(
+                self._on_style_modification
+            )
+            self.style_list.items_inserted.disconnect(
+                self._on_structure_change
+            )
+            self.style_list.items_removed.disconnect(self._on_structure_change)
+            self.style_list.items_moved.disconnect(self._on_structure_change)
+        if self.event_list is not None:
+            self.event_list.item_modified.disconnect(
+                self._on_event_modification
+            )
+            self.event_list.items_about_to_be_inserted.disconnect(
+                self._on_events_about_to_change
+            )
+            self.event_list.items_about_to_be_removed.disconnect(
+                self._on_events_about_to_change
+            )
+            self.event_list.items_about_to_be_moved.disconnect(
+                self._on_events_about_to_change
+            )
+            self.event_list.items_inserted.disconnect(
+                self._on_events_insertion
+            )
+            self.event_list.items_removed.disconnect(self._on_events_removal)
+            self.event_list.items_moved.disconnect(self._on_events_move)
+
+    def _on_style_modification(self, idx: int) -> None:
+        assert self.style_list is not None
+        if "name" in self.style_list[idx].changed_properties:
+            # events refer to the styles by their names
+            self._track_outdated = True
+        else:
+            self._dirty_styles.add(idx)
+
+    def _on_event_modification(self, idx: int) -> None:
+        self._dirty_events.add(idx)
+
+    def _on_structure_change(self, *_args: T.Any) -> None:
+        # events refer to the styles by their indexes
+        self._track_outdated = True
+
+    def _on_events_about_to_change(self, *_args: T.Any) -> None:
+        # modifications are recorded by indexes from before the change
+        if self._track is not None and not self._track_outdated:
+            self._apply_modifications()
+
+    def _can_apply_events_delta(self) -> bool:
+        if self._track is None or self._track_outdated:
+            return False
+        self._track_changed = True
+        return True
+
+    def _on_events_insertion(self, idx: int, count: int) -> None:
+        if self._can_apply_events_delta():
+            assert self._track is not None
+            assert self.event_list is not None
+            self._track.insert_events(idx, self.event_list[idx : idx + count])
+
+    def _on_events_removal(self, idx: int, count: int) -> None:
+        if self._can_apply_events_delta():
+            assert self._track is not None
+            self._track.remove_events(idx, count)
+
+    def _on_events_move(self, idx: int, count: int, new_idx: int) -> None:
+        if self._can_apply_events_delta():
+            assert self._track is not None
+            self._track.move_events(idx, count, new_idx)
+
+    def _apply_modifications(self) -> None:
+        assert self._track is not None
+        assert self.style_list is not None
+        assert self.event_list is not None
+        if self._dirty_styles or self._dirty_events:
+            self._track_changed = True
+        for idx in self._dirty_styles:
+            self._track.update_style(idx, self.style_list[idx])
+        for idx in self._dirty_events:
+            self._track.update_event(idx, self.event_list[idx])
+        self._dirty_styles.clear()
+        self._dirty_events.clear()
+
+    @property
+    def _needs_sync(self) -> bool:
+        return bool(
+            self._track_outdated
+            or self._track_changed
+            or self._dirty_styles
+            or self._dirty_events
+        )
+
+    def _sync_track(self) -> None:
+        assert self.style_list is not None
+        assert self.event_list is not None
+        assert self.meta is not None
+        assert self.video_resolution is not None
+
+        if self._ctx is None or self._renderer is None:
+            self._fonts_generation = _FONTS_GENERATION
+            self._ctx, self._renderer = _take_libass_renderer()
+        if self._track_outdated or self._track is None:
+            self._track = self._ctx.make_track()
+            self._track.populate(self.style_list, self.event_list)
+            self._track_outdated = False
+            self._track_changed = True
+            self._dirty_styles.clear()
+            self._dirty_events.clear()
+        else:
+            self._apply_modifications()
+        changed = self._track_changed
+        self._track_changed = False
 
         self._track.play_res_x = int(
-            meta.get("PlayResX") or video_resolution[0]
+            self.meta.get("PlayResX") or self.video_resolution[0]
         )
         self._track.play_res_y = int(
-            meta.get("PlayResY") or video_resolution[1]
+            self.meta.get("PlayResY") or self.video_resolution[1]
         )
-        self._track.wrap_style = int(meta.get("WrapStyle") or 1)
+        self._track.wrap_style = int(self.meta.get("WrapStyle") or 1)
         self._track.scaled_border_and_shadow = (
-            meta.get("ScaledBorderAndShadow", "yes") == "yes"
+            self.meta.get("ScaledBorderAndShadow", "yes") == "yes"
+        )
+
+        settings = (
+            self._track.play_res_x,
+            self._track.play_res_y,
+            self._track.wrap_style,
+            self._track.scaled_border_and_shadow,
+            self.video_resolution,
         )
+        if changed or settings != self._track_settings:
+            self._track_version += 1
+            self._track_settings = settings
+            # nothing rendered before can be reused
+            self._cache.clear()
+            self._cache_size = 0
 
         self._renderer.storage_size = (
             self._track.play_res_x,
             self._track.play_res_y,
         )
-        self._renderer.frame_size = video_resolution
+        self._renderer.frame_size = self.video_resolution
         self._renderer.pixel_aspect = 1.0
 
     def render(
@@ -93,66 +376,157 @@ class AssRenderer:
         :param aspect_ratio: pixel aspect ratio to use
         :return: PIL image
         """
+        bitmap = self._composite(time)
+        assert self.video_resolution is not None
+        width, height = self.video_resolution
+        image_data = np.zeros((height, width, 4), dtype=np.uint8)
+        if bitmap is not None:
+            left, top, right, bottom = bitmap.rect
+            image_data[top:bottom, left:right] = bitmap.data
+
+        ret = PIL.Image.fromarray(image_data)
+        if aspect_ratio == 1:
+            return ret
+        ret = ret.resize(
+            (int(ret.width * aspect_ratio), ret.height), PIL.Image.LANCZOS
+        )
+        final = PIL.Image.new("RGBA", (width, height))
+        final.paste(ret, ((width - ret.width) // 2, 0))
+        return final
+
+    def render_region(
+        self, time: int, aspect_ratio: T.Union[float, fractions.Fraction]
+    ) -> T.Optional[RenderedRegion]:
+        """Render the ASS data to the smallest PIL.Image that holds it.
+
+        The result is the part of what .render() would return that contains
+        all the visible subtitles, so that callers only need to composite
+        that part onto the video frame.
+
+        :param time: PTS to render at
+        :param aspect_ratio: pixel aspect ratio to use
+        :return: rendered region or None if there is nothing to show
+        """
+        bitmap = self._composite(time)
+        if bitmap is None:
+            return None
+        left, top, right, bottom = bitmap.rect
+
+        if aspect_ratio == 1:
+            return RenderedRegion(left, top, PIL.Image.fromarray(bitmap.data))
+
+        # resample the same grid as resizing the whole frame would, padding
+        # the area so that the filter sees the same neighborhood
+        assert self.video_resolution is not None
+        width = self.video_resolution[0]
+        scaled_width = int(width * aspect_ratio)
+        scale = scaled_width / width
+        pad = math.ceil(_LANCZOS_SUPPORT / min(scale, 1)) + 1
+        pad_left = min(left, pad)
+        pad_right = min(width - right, pad)
+        left -= pad_left
+        right += pad_right
+        scaled_left = math.ceil(left * scale)
+        scaled_right = max(scaled_left + 1, math.floor(right * scale))
+        offset_x = (width - scaled_width) // 2 + scaled_left
+
+        image = PIL.Image.fromarray(
+            np.pad(bitmap.data, ((0, 0), (pad_left, pad_right), (0, 0)))
+        ).resize(
+            (scaled_right - scaled_left, bottom - top),
+            PIL.Image.LANCZOS,
+            box=(
+                min(scaled_left / scale - left, right - left),
+                0,
+                min(scaled_right / scale - left, right - left),
+                bottom - top,
+            ),
+        )
+
+        # crop what ends up outside of the frame
+        crop_left = max(0, -offset_x)
+        crop_right = min(image.width, width - offset_x)
+        if crop_left >= crop_right:
+            return None
+        if crop_left or crop_right != image.width:
+            image = image.crop((crop_left, 0, crop_right, image.height))
+        return RenderedRegion(offset_x + crop_left, top, image)
+
+    def _get_cache_key(self, time: int) -> T.Hashable:
+        assert self.event_list is not None
+        events = [
+            event
+            for event in self.event_list.events_at(time)
+            if not event.is_comment and event.start <= time < event.end
+        ]
+        # the track version changes whenever events are modified, inserted
+        # or removed, so the event identities are good enough
+        key: T.Tuple[T.Hashable, ...] = (
+            self._track_version,
+            tuple(sorted(id(event) for event in events)),
+        )
+        if any(
+            event.effect or _ANIMATION_REGEX.search(event.text)
+            for event in events
+        ):
+            key += (time,)
+        return key
+
+    def _composite(self, time: int) -> T.Optional[_Bitmap]:
         if self._track is None:
             raise ValueError("need source to render")
 
-        if any(dim <= 0 for dim in self._renderer.frame_size):
+        assert self.video_resolution is not None
+        if any(dim <= 0 for dim in self.video_resolution):
             raise ValueError("resolution needs to be a positive integer")
 
-        image_data = np.zeros(
-            (self._renderer.frame_size[1], self._renderer.frame_size[0], 4),
-            dtype=np.uint8,
-        )
+        if self._needs_sync:
+            self._sync_track()
 
-        for layer in self.render_raw(time):
-            red, green, blue, alpha = layer.rgba
-
-            mask_data = np.lib.stride_tricks.as_strided(
-                np.frombuffer(
-                    (ctypes.c_uint8 * (layer.stride * layer.h)).from_address(
-                        ctypes.addressof(layer.bitmap.contents)
-                    ),
-                    dtype=np.uint8,
-                ),
-                (layer.h, layer.w),
-                (layer.stride, 1),
-            )
-
-            overlay = np.zeros((layer.h, layer.w, 4), dtype=np.uint8)
-            overlay[..., :3] = (red, green, blue)
-            overlay[..., 3] = mask_data
-            overlay[..., 3] = (overlay[..., 3] * (1.0 - alpha / 255.0)).astype(
-                np.uint8
-            )
+        key = self._get_cache_key(time)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
 
-            fragment = image_data[
-                layer.dst_y : layer.dst_y + layer.h,
-                layer.dst_x : layer.dst_x + layer.w,
-            ]
+        last_composite = self._last_composite
+        images = self.render_raw(time)
+        if (
+            images.change == 0
+            and last_composite is not None
+            and last_composite[0] == self._track_version
+        ):
+            # libass says the images are the same as last time
+            bitmap = last_composite[1]
+        else:
+            bitmap = self._blend(images)
+        self._last_composite = (self._track_version, bitmap)
 
-            src_color = overlay[..., :3].astype(np.float32) / 255.0
-            src_alpha = overlay[..., 3].astype(np.float32) / 255.0
-            dst_color = fragment[..., :3].astype(np.float32) / 255.0
-            dst_alpha = fragment[..., 3].astype(np.float32) / 255.0
+        self._cache[key] = bitmap
+        self._cache_size += _get_bitmap_size(bitmap)
+        while self._cache_size > CACHE_MAX_SIZE:
+            self._cache_size -= _get_bitmap_size(
+                self._cache.popitem(last=False)[1]
+            )
+        return bitmap
 
-            out_alpha = src_alpha + dst_alpha * (1.0 - src_alpha)
-            out_color = (
-                src_color * src_alpha[..., None]
-                + dst_color
-                * dst_alpha[..., None]
-                * (1.0 - src_alpha[..., None])
-            ) / out_alpha[..., None]
+    def _blend(self, images: libass.AssImageSequence) -> T.Optional[_Bitmap]:
+        assert self.video_resolution is not None
+        width, height = self.video_resolution
+        if (
+            self._canvas is None
+            or self._canvas.width != width
+            or self._canvas.height != height
+        ):
+            self._canvas = PremultipliedCanvas(width, height)
+        self._canvas.clear()
 
-            fragment[..., :3] = out_color * 255
-            fragment[..., 3] = out_alpha * 255
+        for view in images.views():
+            self._canvas.blend(view.mask, view.rgba, view.dst_x, view.dst_y)
 
-        ret = PIL.Image.fromarray(image_data)
-        ret = ret.resize(
-            (int(ret.width * aspect_ratio), ret.height), PIL.Image.LANCZOS
-        )
-        final = PIL.Image.new("RGBA", self._renderer.frame_size)
-        final.paste(ret, ((self._renderer.frame_size[0] - ret.width) // 2, 0))
-        return final
+        rect = self._canvas.dirty_rect
+        if rect is None:
+            return None
+        return _Bitmap(rect, self._canvas.to_rgba(rect))
 
     def render_raw(self, time: int) -> libass.AssImageSequence:
         """Render the ASS data to a numpy array.
@@ -160,7 +534,75 @@ class AssRenderer:
         :param time: PTS to render at
         :return: numpy array with RGB data
         """
-        if self._track is None:
+        if self._track is None or self._renderer is None:
             raise ValueError("need source to render")
 
+        if self._needs_sync:
+            self._sync_track()
+        # libass compares the images to whatever it rendered last
+        self._last_composite = None
         return self._renderer.render_frame(self._track, now=time)
+
+
+class AssRendererPool:
+    """Renderer facade that can be used from many threads at once.
+
+    libass renderers can't be shared between threads, so every thread gets
+    an AssRenderer of its own, created on first use. All of them render the
+    same source, which must not be modified while the pool is in use.
+    """
+
+    def __init__(
+        self,
+        style_list: AssStyleList,
+        event_list: AssEventList,
+        meta: AssMeta,
+        video_resolution: T.Tuple[int, int],
+    ) -> None:
+        """Initialize self.
+
+        :param style_list: list of ASS styles
+        :param event_list: list of ASS events
+        :param meta: ASS metadata
+        :param video_resolution: (width, height) tuple
+        """
+        self.style_list = style_list
+        self.event_list = event_list
+        self.meta = meta
+        self.video_resolution = video_resolution
+        self._local = threading.local()
+
+    def _get_renderer(self) -> AssRenderer:
+        renderer = getattr(self._local, "renderer", None)
+        if renderer is None:
+            renderer = AssRenderer()
+            renderer.set_source(
+                self.style_list,
+                self.event_list,
+                self.meta,
+                self.video_resolution,
+            )
+            self._local.renderer = renderer
+        return T.cast(AssRenderer, renderer)
+
+    def render(
+        self, time: int, aspect_ratio: T.Union[float, fractions.Fraction]
+    ) -> PIL.Image:
+        """Render the ASS data to a PIL.Image bitmap.
+
+        :param time: PTS to render at
+        :param aspect_ratio: pixel aspect ratio to use
+        :return: PIL image
+        """
+        return self._get_renderer().render(time, aspect_ratio)
+
+    def render_region(
+        self, time: int, aspect_ratio: T.Union[float, fractions.Fraction]
+    ) -> T.Optional[RenderedRegion]:
+        """Render the ASS data to the smallest PIL.Image that holds it.
+
+        :param time: PTS to render at
+        :param aspect_ratio: pixel aspect ratio to use
+        :return: rendered region or None if there is nothing to show
+        """
+        return self._get_renderer().render_region(time, aspect_ratio)
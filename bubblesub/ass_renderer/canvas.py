@@ -0,0 +1,195 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+# Copyright (c) 2014 Tony Young
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Integer alpha compositing of libass images."""
+
+import typing as T
+
+import numpy as np
+
+# straight alpha color for every combination of alpha and premultiplied color
+_UNPREMULTIPLY = np.array(
+    [
+        [
+            min(255, (color * 255 + alpha // 2) // max(alpha, 1))
+            for color in range(256)
+        ]
+        for alpha in range(256)
+    ],
+    dtype=np.uint8,
+).ravel()
+
+
+def _div255(values: np.ndarray, scratch: np.ndarray) -> None:
+    # exact rounded division by 255 for values up to 255 * 255, done in
+    # place so that it fits in uint16 without any temporary arrays
+    values += 128
+    np.right_shift(values, 8, out=scratch)
+    values += scratch
+    values >>= 8
+
+
+class PremultipliedCanvas:
+    """RGBA canvas that libass images are composited onto.
+
+    Pixels are stored as uint16 premultiplied values in the 0-255 range.
+    Compositing an image over a pixel then boils down to
+    (dst * (255 - alpha) + color * alpha) / 255, where the numerator never
+    exceeds 255 * 255, so the whole "over" operator runs as a handful of
+    in-place integer operations. Channels are kept in separate planes, which
+    lets NumPy process each image row as one contiguous run. Scratch buffers
+    grow to the size of the largest image seen and are reused, so blending
+    doesn't allocate anything per image.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        """Initialize self.
+
+        :param width: canvas width
+        :param height: canvas height
+        """
+        self.width = width
+        self.height = height
+        self._planes = np.zeros((4, height, width), dtype=np.uint16)
+        self._dirty_rect: T.Optional[T.Tuple[int, int, int, int]] = None
+        self._alpha = np.empty((0, 0), dtype=np.uint16)
+        self._inv_alpha = np.empty((0, 0), dtype=np.uint16)
+        self._product = np.empty((4, 0, 0), dtype=np.uint16)
+        self._scratch = np.empty((4, 0, 0), dtype=np.uint16)
+
+    def clear(self) -> None:
+        """Make the canvas fully transparent."""
+        if self._dirty_rect is not None:
+            left, top, right, bottom = self._dirty_rect
+            self._planes[:, top:bottom, left:right] = 0
+            self._dirty_rect = None
+
+    def blend(
+        self,
+        mask: np.ndarray,
+        rgba: T.Tuple[int, int, int, int],
+        dst_x: int,
+        dst_y: int,
+    ) -> None:
+        """Composite a single-color image over the canvas.
+
+        :param mask: 2D uint8 array with image coverage
+        :param rgba: image color; alpha uses the libass convention where 0
+            means opaque
+        :param dst_x: horizontal position of the image on the canvas
+        :param dst_y: vertical position of the image on the canvas
+        """
+        height, width = mask.shape
+        left = max(0, -dst_x)
+        top = max(0, -dst_y)
+        right = min(width, self.width - dst_x)
+        bottom = min(height, self.height - dst_y)
+        if left >= right or top >= bottom:
+            return
+        mask = mask[top:bottom, left:right]
+        height, width = mask.shape
+        dst_x += left
+        dst_y += top
+        self._extend_dirty_rect(dst_x, dst_y, dst_x + width, dst_y + height)
+
+        self._reserve(width, height)
+        alpha = self._alpha[:height, :width]
+        inv_alpha = self._inv_alpha[:height, :width]
+        product = self._product[:, :height, :width]
+        scratch = self._scratch[:, :height, :width]
+        dst = self._planes[:, dst_y : dst_y + height, dst_x : dst_x + width]
+
+        *color, transparency = rgba
+        if transparency:
+            np.multiply(mask, 255 - transparency, out=alpha, dtype=np.uint16)
+            _div255(alpha, scratch[0])
+        else:
+            np.copyto(alpha, mask)
+        np.subtract(255, alpha, out=inv_alpha, dtype=np.uint16)
+
+        np.multiply(
+            alpha,
+            np.array((*color, 255), dtype=np.uint16)[:, None, None],
+            out=product,
+        )
+        dst *= inv_alpha
+        dst += product
+        _div255(dst, scratch)
+
+    @property
+    def dirty_rect(self) -> T.Optional[T.Tuple[int, int, int, int]]:
+        """Return the area drawn to since the last clear.
+
+        :return: (left, top, right, bottom) tuple or None if nothing was
+            drawn
+        """
+        return self._dirty_rect
+
+    def to_rgba(
+        self, rect: T.Optional[T.Tuple[int, int, int, int]] = None
+    ) -> np.ndarray:
+        """Return canvas contents as straight alpha RGBA bitmap.
+
+        :param rect: (left, top, right, bottom) area to return, whole canvas
+            by default
+        :return: array of shape (height, width, 4) with uint8 values
+        """
+        left, top, right, bottom = rect or (0, 0, self.width, self.height)
+        ret = np.zeros((bottom - top, right - left, 4), dtype=np.uint8)
+        if self._dirty_rect is None:
+            return ret
+        # only the dirty part of the area needs converting
+        src_left = max(left, self._dirty_rect[0])
+        src_top = max(top, self._dirty_rect[1])
+        src_right = min(right, self._dirty_rect[2])
+        src_bottom = min(bottom, self._dirty_rect[3])
+        if src_left >= src_right or src_top >= src_bottom:
+            return ret
+        planes = self._planes[:, src_top:src_bottom, src_left:src_right]
+        target = ret[
+            src_top - top : src_bottom - top,
+            src_left - left : src_right - left,
+        ]
+        index = planes[3] << 8
+        for channel in range(3):
+            np.take(
+                _UNPREMULTIPLY,
+                index + planes[channel],
+                out=target[..., channel],
+            )
+        target[..., 3] = planes[3]
+        return ret
+
+    def _extend_dirty_rect(
+        self, left: int, top: int, right: int, bottom: int
+    ) -> None:
+        if self._dirty_rect is not None:
+            left = min(left, self._dirty_rect[0])
+            top = min(top, self._dirty_rect[1])
+            right = max(right, self._dirty_rect[2])
+            bottom = max(bottom, self._dirty_rect[3])
+        self._dirty_rect = (left, top, right, bottom)
+
+    def _reserve(self, width: int, height: int) -> None:
+        old_height, old_width = self._alpha.shape
+        if width <= old_width and height <= old_height:
+            return
+        width = max(width, old_width)
+        height = max(height, old_height)
+        self._alpha = np.empty((height, width), dtype=np.uint16)
+        self._inv_alpha = np.empty((height, width), dtype=np.uint16)
+        self._product = np.empty((4, height, width), dtype=np.uint16)
+        self._scratch = np.empty((4, height, width), dtype=np.uint16)
@@ -23,6 +23,8 @@ import ctypes
 import ctypes.util
 import typing as T
 
+import numpy as np
+
 import bubblesub.fmt.ass.event
 import bubblesub.fmt.ass.style
 
@@ -48,10 +50,27 @@ def _color_to_int(color: T.Tuple[int, int, int, int]) -> int:
     return alpha | (blue << 8) | (green << 16) | (red << 24)
 
 
+class AssImageView(T.NamedTuple):
+    mask: np.ndarray
+    rgba: T.Tuple[int, int, int, int]
+    dst_x: int
+    dst_y: int
+
+
+class _ArrayInterface:
+    # exposes libass memory to numpy without going through ctypes arrays
+    __slots__ = ("__array_interface__",)
+
+
 class AssImageSequence:
-    def __init__(self, renderer: "AssRenderer", head_ptr: T.Any) -> None:
+    def __init__(
+        self, renderer: "AssRenderer", head_ptr: T.Any, change: int
+    ) -> None:
         self.renderer = renderer
         self.head_ptr = head_ptr
+        # 0 if the images are identical to the previously rendered ones,
+        # 1 if only their positions changed, 2 otherwise
+        self.change = change
 
     def __iter__(self) -> T.Iterator["AssImage"]:
         cur = self.head_ptr
@@ -59,6 +78,41 @@ class AssImageSequence:
             yield cur.contents
             cur = cur.contents.next_ptr
 
+    def views(self) -> T.Iterator[AssImageView]:
+        # the masks point straight to the libass memory, so they're only
+        # valid until the renderer renders another frame
+        interface = _ArrayInterface()
+        cur = self.head_ptr
+        while cur:
+            image = cur.contents
+            color = image.color
+            address = ctypes.c_void_p.from_address(
+                ctypes.addressof(image) + _BITMAP_OFFSET
+            ).value
+            if image.w <= 0 or image.h <= 0 or not address:
+                mask = _EMPTY_MASK
+            else:
+                interface.__array_interface__ = {
+                    "version": 3,
+                    "typestr": "|u1",
+                    "shape": (image.h, image.w),
+                    "strides": (image.stride, 1),
+                    "data": (address, True),
+                }
+                mask = np.asarray(interface)
+            yield AssImageView(
+                mask,
+                (
+                    (color >> 24) & 0xFF,
+                    (color >> 16) & 0xFF,
+                    (color >> 8) & 0xFF,
+                    color & 0xFF,
+                ),
+                image.dst_x,
+                image.dst_y,
+            )
+            cur = image.next_ptr
+
 
 class AssImage(ctypes.Structure):
     TYPE_CHARACTER = 0
@@ -90,6 +144,9 @@ AssImage._fields_ = [
     ("next_ptr", ctypes.POINTER(AssImage)),
     ("type", ctypes.c_int),
 ]
+_BITMAP_OFFSET = AssImage.bitmap.offset
+_EMPTY_MASK = np.zeros((0, 0), dtype=np.uint8)
+_EMPTY_MASK.flags.writeable = False
 
 
 def _make_libass_setter(
@@ -229,13 +286,12 @@ class AssRenderer(ctypes.Structure):
     def render_frame(self, track: "AssTrack", now: int) -> AssImageSequence:
         if not self._fonts_set:
             raise RuntimeError("set_fonts before rendering")
+        change = ctypes.c_int(0)
+        track.update_read_order()
         head = _libass.ass_render_frame(
-            ctypes.byref(self),
-            ctypes.byref(track),
-            now,
-            ctypes.POINTER(ctypes.c_int)(),
+            ctypes.byref(self), ctypes.byref(track), now, ctypes.byref(change),
         )
-        return AssImageSequence(self, head)
+        return AssImageSequence(self, head, change.value)
 
 
 class AssStyle(ctypes.Structure):
@@ -277,12 +333,16 @@ class AssStyle(ctypes.Structure):
         res += v * 4
         return res
 
-    def _after_init(self, track: "AssTrack") -> None:
+    def _after_init(self, track: "AssTrack", idx: int) -> None:
         self._track = track
+        self._idx = idx
 
     def populate(self, style: bubblesub.fmt.ass.style.AssStyle) -> None:
-        self.name = _encode_str(style.name)
-        self.fontname = _encode_str(style.font_name)
+        name = _encode_str(style.name)
+        fontname = _encode_str(style.font_name)
+        self._track._keep_alive[("style", self._idx)] = (name, fontname)
+        self.name = name
+        self.fontname = fontname
         self.fontsize = style.font_size
         self.primary_color = _color_to_int(style.primary_color)
         self.secondary_color = _color_to_int(style.secondary_color)
@@ -322,26 +382,54 @@ class AssEvent(ctypes.Structure):
         ("render_priv", ctypes.c_void_p),
     ]
 
-    def _after_init(self, track: "AssTrack") -> None:
+    def _after_init(self, track: "AssTrack", idx: int) -> None:
         self._track = track
+        self._idx = idx
 
     def _style_name_to_style_id(self, name: str) -> int:
-        for i, style in enumerate(self._track.styles):
-            if style.name is not None and style.name.decode("utf-8") == name:
-                return i
-        return -1
+        # track styles are allocated in the same order as the source list
+        assert self._track._style_list is not None
+        idx = self._track._style_list.index_by_name(name)
+        return -1 if idx is None else idx
 
     def populate(self, event: bubblesub.fmt.ass.event.AssEvent) -> None:
+        name = _encode_str(event.actor)
+        effect = _encode_str(event.effect)
+        text = _encode_str(event.text)
+        self._track._keep_alive[("event", self._idx)] = (name, effect, text)
+
         self.start_ms = int(event.start)
-        self.duration_ms = int(event.end - event.start)
+        # comments stay in the track so that its indexes match the source
+        # list, but they never show up
+        self.duration_ms = (
+            0 if event.is_comment else int(event.end - event.start)
+        )
         self.layer = event.layer
         self.style_id = self._style_name_to_style_id(event.style)
-        self.name = _encode_str(event.actor)
+        self.name = name
         self.margin_l = event.margin_left
         self.margin_r = event.margin_right
         self.margin_v = event.margin_vertical
-        self.effect = _encode_str(event.effect)
-        self.text = _encode_str(event.text)
+        self.effect = effect
+        self.text = text
+
+        self._free_render_priv()
+
+    def clear(self) -> None:
+        # the slot stays allocated, but never shows up
+        self._track._keep_alive.pop(("event", self._idx), None)
+        self.start_ms = 0
+        self.duration_ms = 0
+        self.name = None
+        self.effect = None
+        self.text = None
+        self._free_render_priv()
+
+    def _free_render_priv(self) -> None:
+        # drop positions libass remembered for the old content
+        if self.render_priv:
+            _libc.free(self.render_priv)
+            self.render_priv = None
 
 
 class AssTrack(ctypes.Structure):
@@ -375,6 +463,18 @@ class AssTrack(ctypes.Structure):
 
     def _after_init(self, ctx: AssContext) -> None:
         self._ctx = ctx
+        self._style_list: T.Optional[
+            bubblesub.fmt.ass.style.AssStyleList
+        ] = None
+        # libass only points to the strings, they're owned by Python
+        self._keep_alive: T.Dict[T.Tuple[str, int], T.Any] = {}
+        # libass can't remove events from the middle of a track, so events
+        # are put in whatever slot is free and ordered with read_order
+        self._event_slots: T.List[int] = []
+        self._free_event_slots: T.List[int] = []
+        # renumbering is deferred until the next render, so that bulk
+        # changes don't renumber the same events over and over
+        self._read_order_start: T.Optional[int] = None
 
     @property
     def styles(self) -> T.List[AssStyle]:
@@ -393,15 +493,83 @@ class AssTrack(ctypes.Structure):
         ).contents
 
     def make_style(self) -> AssStyle:
-        style = self.styles_arr[_libass.ass_alloc_style(ctypes.byref(self))]
-        style._after_init(self)
+        idx = _libass.ass_alloc_style(ctypes.byref(self))
+        style = self.styles_arr[idx]
+        style._after_init(self, idx)
         return style
 
     def make_event(self) -> AssEvent:
-        event = self.events_arr[_libass.ass_alloc_event(ctypes.byref(self))]
-        event._after_init(self)
+        idx = _libass.ass_alloc_event(ctypes.byref(self))
+        event = self.events_arr[idx]
+        event._after_init(self, idx)
         return event
 
+    def update_style(
+        self, idx: int, source_style: bubblesub.fmt.ass.style.AssStyle
+    ) -> None:
+        style = self.styles_arr[idx]
+        style._after_init(self, idx)
+        style.populate(source_style)
+
+    def update_event(
+        self, idx: int, source_event: bubblesub.fmt.ass.event.AssEvent
+    ) -> None:
+        slot = self._event_slots[idx]
+        event = self.events_arr[slot]
+        event._after_init(self, slot)
+        event.populate(source_event)
+
+    def insert_events(
+        self,
+        idx: int,
+        source_events: T.List[bubblesub.fmt.ass.event.AssEvent],
+    ) -> None:
+        slots = []
+        for source_event in source_events:
+            if self._free_event_slots:
+                slot = self._free_event_slots.pop()
+                event = self.events_arr[slot]
+                event._after_init(self, slot)
+            else:
+                event = self.make_event()
+                slot = event._idx
+            event.populate(source_event)
+            slots.append(slot)
+        self._event_slots[idx:idx] = slots
+        self._invalidate_read_order(idx)
+
+    def remove_events(self, idx: int, count: int) -> None:
+        slots = self._event_slots[idx : idx + count]
+        for slot in slots:
+            event = self.events_arr[slot]
+            event._after_init(self, slot)
+            event.clear()
+        del self._event_slots[idx : idx + count]
+        self._free_event_slots += slots
+        self._invalidate_read_order(idx)
+
+    def move_events(self, idx: int, count: int, new_idx: int) -> None:
+        slots = self._event_slots[idx : idx + count]
+        del self._event_slots[idx : idx + count]
+        self._event_slots[new_idx:new_idx] = slots
+        self._invalidate_read_order(min(idx, new_idx))
+
+    def _invalidate_read_order(self, start_idx: int) -> None:
+        if (
+            self._read_order_start is None
+            or start_idx < self._read_order_start
+        ):
+            self._read_order_start = start_idx
+
+    def update_read_order(self) -> None:
+        # libass draws events on the same layer in their read order
+        if self._read_order_start is None:
+            return
+        events_arr = self.events_arr
+        for idx in range(self._read_order_start, len(self._event_slots)):
+            events_arr[self._event_slots[idx]].read_order = idx
+        self._read_order_start = None
+
     def __del__(self) -> None:
         # XXX: we can't use ass_free_track because it assumes we've allocated
         #      our strings in the heap (wat), so we just free them with libc.
@@ -429,15 +597,17 @@ class AssTrack(ctypes.Structure):
             "MarginL, MarginR, MarginV, Effect, Text"
         )
 
+        self._style_list = style_list
+
         for source_style in style_list:
             style = self.make_style()
             style.populate(source_style)
 
         for source_event in event_list:
-            if source_event.is_comment:
-                continue
             event = self.make_event()
             event.populate(source_event)
+            event.read_order = event._idx
+            self._event_slots.append(event._idx)
 
 
 _libc.free.argtypes = [ctypes.c_void_p]
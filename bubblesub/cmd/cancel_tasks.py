@@ -0,0 +1,35 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from bubblesub.api.cmd import BaseCommand, CommandUnavailable
+
+
+class CancelTasksCommand(BaseCommand):
+    names = ["cancel-tasks"]
+    help_text = "Stops all background tasks that can be stopped."
+
+    @property
+    def is_enabled(self) -> bool:
+        return True
+
+    async def run(self) -> None:
+        count = self.api.threading.cancel_tasks()
+        if not count:
+            raise CommandUnavailable("nothing to cancel")
+        self.api.log.info(f"canceled {count} tasks")
+
+
+COMMANDS = [CancelTasksCommand]
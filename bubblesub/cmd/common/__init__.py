@@ -18,5 +18,6 @@
 
 from .bool import BooleanOperation
 from .path import FancyPath
+from .progress import log_progress
 from .pts import Pts
 from .sub_selection import SubtitlesSelection
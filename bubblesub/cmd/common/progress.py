@@ -0,0 +1,39 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Progress reporting of background tasks."""
+
+from bubblesub.api import Api
+from bubblesub.api.threading import TaskHandle
+
+
+def log_progress(api: Api, handle: TaskHandle, label: str) -> None:
+    """Log the progress of a background task every 10%.
+
+    :param api: core API
+    :param handle: handle of the task to follow
+    :param label: what the task does, used as the message prefix
+    """
+    last_reported = 0
+
+    def _on_progress(done: int, total: int) -> None:
+        nonlocal last_reported
+        percent = done * 100 // total
+        if percent // 10 > last_reported // 10 and done < total:
+            last_reported = percent
+            api.log.info(f"{label}: {percent}%")
+
+    handle.progressed.connect(_on_progress)
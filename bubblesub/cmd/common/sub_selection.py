@@ -197,10 +197,10 @@ class SubtitlesSelection:
     async def _get_ask_time(self) -> T.List[int]:
         if not self.api.subs.events:
             return []
-        value = await self.api.gui.exec(self._show_time_dialog)
-        if value is None:
+        idx = await self.api.gui.exec(self._show_time_dialog)
+        if idx is None:
             raise CommandCanceled
-        return [value - 1]
+        return [idx]
 
     async def _show_number_dialog(
         self, main_window: QtWidgets.QMainWindow
@@ -233,15 +233,26 @@ class SubtitlesSelection:
             return None
 
         target_pts, _is_relative = ret
-        best_distance = inf
-        best_idx = None
-        for i, sub in enumerate(self.api.subs.events):
-            center = (sub.start + sub.end) / 2
-            distance = abs(target_pts - center)
-            if distance < best_distance:
-                best_distance = distance
-                best_idx = i
-        if best_idx is None:
+        return self._get_nearest_index(target_pts)
+
+    def _get_nearest_index(self, pts: int) -> T.Optional[int]:
+        # any event centered within the radius overlaps the searched range,
+        # so widen the range until it holds the nearest event
+        events = self.api.subs.events
+        radius = 1000
+        while True:
+            candidates = events.events_in_range(pts - radius, pts + radius)
+            best_distance = min(
+                (abs(pts - (sub.start + sub.end) / 2) for sub in candidates),
+                default=inf,
+            )
+            if best_distance <= radius or len(candidates) == len(events):
+                break
+            radius *= 2
+        if not candidates:
             return None
-
-        return best_idx
+        return min(
+            T.cast(int, sub.index)
+            for sub in candidates
+            if abs(pts - (sub.start + sub.end) / 2) == best_distance
+        )
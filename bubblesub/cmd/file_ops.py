@@ -128,8 +128,7 @@ class SaveCommand(BaseCommand):
             if not path:
                 raise CommandCanceled
 
-        self.api.subs.save_ass(path, remember_path=True)
-        self.api.log.info(f"saved subtitles to {path}")
+        await self.api.gui.save_subs(path)
 
 
 class SaveAsCommand(BaseCommand):
@@ -149,8 +148,7 @@ class SaveAsCommand(BaseCommand):
             ),
         )
 
-        self.api.subs.save_ass(path, remember_path=True)
-        self.api.log.info(f"saved subtitles to {path}")
+        await self.api.gui.save_subs(path)
 
     @staticmethod
     def decorate_parser(api: Api, parser: argparse.ArgumentParser) -> None:
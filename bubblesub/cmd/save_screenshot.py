@@ -17,9 +17,14 @@
 import argparse
 
 from bubblesub.api import Api
-from bubblesub.api.cmd import BaseCommand
-from bubblesub.cmd.common import FancyPath, Pts
-from bubblesub.util import ms_to_str
+from bubblesub.api.cmd import BaseCommand, CommandUnavailable
+from bubblesub.cmd.common import (
+    FancyPath,
+    Pts,
+    SubtitlesSelection,
+    log_progress,
+)
+from bubblesub.util import ms_to_str, sanitize_file_name
 
 
 class SaveScreenshotCommand(BaseCommand):
@@ -96,4 +101,103 @@ class SaveScreenshotCommand(BaseCommand):
         )
 
 
-COMMANDS = [SaveScreenshotCommand]
+class SaveScreenshotsCommand(BaseCommand):
+    names = ["save-screenshots"]
+    help_text = "Makes a screenshot of every given subtitle."
+    help_text_extra = (
+        "Screenshots are taken in the middle of each subtitle and saved in "
+        "the background; use cancel-tasks to stop. "
+        "Prompts user to choose the directory to save the files to if it "
+        "wasn't specified in the command arguments."
+    )
+
+    @property
+    def is_enabled(self) -> bool:
+        return (
+            self.api.video.current_stream
+            and self.api.video.current_stream.is_ready
+            and self.args.target.makes_sense
+        )
+
+    async def run(self) -> None:
+        stream = self.api.video.current_stream
+        assert stream.path
+
+        indexes = await self.args.target.get_indexes()
+        if not indexes:
+            raise CommandUnavailable("nothing to make screenshots of")
+
+        path = await self.args.path.get_save_path(
+            default_file_name=f"shots-{stream.path.name}"
+        )
+        path.mkdir(parents=True, exist_ok=True)
+
+        shots = []
+        for idx in indexes:
+            sub = self.api.subs.events[idx]
+            pts = (sub.start + sub.end) // 2
+            shots.append(
+                (
+                    pts,
+                    path
+                    / sanitize_file_name(
+                        f"shot-{idx + 1:05d}-{ms_to_str(pts)}.png"
+                    ),
+                )
+            )
+
+        def _on_finish(count: int) -> None:
+            self.api.log.info(f"saved {count} screenshots to {path}")
+
+        handle = stream.schedule_screenshots(
+            shots,
+            self.args.include_subs,
+            self.args.width,
+            self.args.height,
+            _on_finish,
+        )
+        log_progress(self.api, handle, "saving screenshots")
+        self.api.log.info(f"saving {len(shots)} screenshots to {path}")
+
+    @staticmethod
+    def decorate_parser(api: Api, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "-t",
+            "--target",
+            help="subtitles to make screenshots of",
+            type=lambda value: SubtitlesSelection(api, value),
+            default="selected",
+        )
+        parser.add_argument(
+            "-p",
+            "--path",
+            help="directory to save the screenshots to",
+            type=lambda value: FancyPath(api, value),
+            default="",
+        )
+        parser.add_argument(
+            "-i",
+            "--include-subs",
+            help='whether to "burn" the subtitles into the screenshots',
+            action="store_true",
+        )
+        parser.add_argument(
+            "--width",
+            help="width of the screenshots (by default, original video width)",
+            type=int,
+        )
+        parser.add_argument(
+            "--height",
+            help=(
+                "height of the screenshots "
+                "(by default, original video height)"
+            ),
+            type=int,
+        )
+        parser.epilog = (
+            "If only either of width or height is given, "
+            "the command tries to maintain aspect ratio."
+        )
+
+
+COMMANDS = [SaveScreenshotCommand, SaveScreenshotsCommand]
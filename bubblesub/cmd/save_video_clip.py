@@ -0,0 +1,123 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import shutil
+
+from bubblesub.api import Api
+from bubblesub.api.cmd import BaseCommand, CommandUnavailable
+from bubblesub.cmd.common import FancyPath, Pts, log_progress
+from bubblesub.util import ms_to_str
+
+
+class SaveVideoClipCommand(BaseCommand):
+    names = ["save-video-clip"]
+    help_text = "Saves given part of the video to a file."
+    help_text_extra = (
+        "The clip is encoded with ffmpeg in the background; "
+        "use cancel-tasks to stop. "
+        "If the path has no extension, the frames are saved to that "
+        "directory as PNG files instead. "
+        "Prompts user to choose where to save the file to if the path wasn't "
+        "specified in the command arguments."
+    )
+
+    @property
+    def is_enabled(self) -> bool:
+        return (
+            self.api.video.current_stream
+            and self.api.video.current_stream.is_ready
+        )
+
+    async def run(self) -> None:
+        stream = self.api.video.current_stream
+        assert stream.path
+
+        start = await self.args.start.get()
+        end = await self.args.end.get()
+        if start >= end:
+            raise CommandUnavailable("nothing to save")
+
+        path = await self.args.path.get_save_path(
+            file_filter="Matroska video (*.mkv)",
+            default_file_name="clip-{}-{}..{}.mkv".format(
+                stream.path.name, ms_to_str(start), ms_to_str(end)
+            ),
+        )
+        if path.suffix and not shutil.which("ffmpeg"):
+            raise CommandUnavailable("ffmpeg is not installed")
+
+        def _on_finish(count: int) -> None:
+            self.api.log.info(f"saved {count} frames to {path}")
+
+        handle = stream.schedule_clip(
+            start,
+            end,
+            path,
+            self.args.include_subs,
+            self.args.width,
+            self.args.height,
+            _on_finish,
+        )
+        log_progress(self.api, handle, "saving video clip")
+        self.api.log.info(f"saving video clip to {path}")
+
+    @staticmethod
+    def decorate_parser(api: Api, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "-s",
+            "--start",
+            help="start of the clip",
+            type=lambda value: Pts(api, value),
+            default="a.s",
+        )
+        parser.add_argument(
+            "-e",
+            "--end",
+            help="end of the clip",
+            type=lambda value: Pts(api, value),
+            default="a.e",
+        )
+        parser.add_argument(
+            "-p",
+            "--path",
+            help="path to save the clip to",
+            type=lambda value: FancyPath(api, value),
+            default="",
+        )
+        parser.add_argument(
+            "-i",
+            "--include-subs",
+            help='whether to "burn" the subtitles into the clip',
+            action="store_true",
+        )
+        parser.add_argument(
+            "--width",
+            help="width of the clip (by default, original video width)",
+            type=int,
+        )
+        parser.add_argument(
+            "--height",
+            help="height of the clip (by default, original video height)",
+            type=int,
+        )
+        parser.epilog = (
+            "If only either of width or height is given, "
+            "the command tries to maintain aspect ratio."
+        )
+
+
+COMMANDS = [SaveVideoClipCommand]
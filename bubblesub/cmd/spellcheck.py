@@ -20,7 +20,6 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 
 from bubblesub.api import Api
 from bubblesub.api.cmd import BaseCommand
-from bubblesub.fmt.ass.util import spell_check_ass_line
 from bubblesub.spell_check import (
     BaseSpellChecker,
     SpellCheckerError,
@@ -135,9 +134,7 @@ class _SpellCheckDialog(Dialog):
         cursor = self.text_edit.textCursor()
         while self._lines_to_spellcheck:
             line = self._lines_to_spellcheck[0]
-            for start, end, word in spell_check_ass_line(
-                self._spell_checker, line.text.replace("\\N", "\n")
-            ):
+            for start, end, word in line.spell_check(self._spell_checker):
                 assert line.index is not None
                 if (
                     len(self._api.subs.selected_indexes) > 1
@@ -14,8 +14,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import fractions
 import typing as T
 from copy import copy
+from pathlib import Path
 
 import PIL.Image
 import PIL.ImageQt
@@ -23,7 +25,8 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 
 from bubblesub.api import Api
 from bubblesub.api.cmd import BaseCommand
-from bubblesub.ass_renderer import AssRenderer
+from bubblesub.api.threading import QueueWorker
+from bubblesub.ass_renderer import AssRenderer, drop_spare_renderers
 from bubblesub.fmt.ass.event import AssEvent, AssEventList
 from bubblesub.fmt.ass.meta import AssMeta
 from bubblesub.fmt.ass.style import AssStyle, AssStyleList
@@ -41,6 +44,90 @@ from bubblesub.ui.util import (
 )
 
 
+class _PreviewRequest(T.NamedTuple):
+    style: AssStyle
+    text: str
+    background_path: T.Optional[Path]
+    resolution: T.Tuple[int, int]
+    aspect_ratio: T.Union[float, fractions.Fraction]
+
+
+class _PreviewWorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(int, QtGui.QImage)
+
+
+class _PreviewWorker(QueueWorker):
+    """Renders style previews off the UI thread.
+
+    Only the most recent request is rendered; the ones that were superseded
+    before the worker got to them are skipped.
+    """
+
+    def __init__(self, api: Api) -> None:
+        """Initialize self.
+
+        :param api: core API
+        """
+        super().__init__(api.log)
+        self.signals = _PreviewWorkerSignals()
+        self.latest_request_id = 0
+        self._renderer = AssRenderer()
+
+    def schedule_preview(self, request: _PreviewRequest) -> None:
+        """Request the preview to be rendered.
+
+        :param request: what to render
+        """
+        self.latest_request_id += 1
+        self.schedule_task((self.latest_request_id, request))
+
+    def discard_pending(self) -> None:
+        """Make any requested previews stale."""
+        self.latest_request_id += 1
+
+    def _process_task(self, task: T.Any) -> None:
+        request_id, request = task
+        if request_id != self.latest_request_id:
+            return
+        self.signals.finished.emit(request_id, self._render(request))
+
+    def _render(self, request: _PreviewRequest) -> QtGui.QImage:
+        style = request.style
+        style.name = "Default"
+        style_list = AssStyleList()
+        style_list.append(style)
+
+        event = AssEvent(
+            start=0,
+            end=1000,
+            text=request.text.replace("\n", "\\N"),
+            style=style.name,
+        )
+        event_list = AssEventList()
+        event_list.append(event)
+
+        image = PIL.Image.new(mode="RGBA", size=request.resolution)
+
+        if request.background_path and request.background_path.exists():
+            background = PIL.Image.open(request.background_path)
+            for y in range(0, request.resolution[1], background.height):
+                for x in range(0, request.resolution[0], background.width):
+                    image.paste(background, (x, y))
+
+        self._renderer.set_source(
+            style_list, event_list, AssMeta(), request.resolution
+        )
+        region = self._renderer.render_region(
+            time=0, aspect_ratio=request.aspect_ratio
+        )
+        if region is not None:
+            image.paste(region.image, (region.x, region.y), region.image)
+
+        # ImageQt only wraps the data it holds, so it needs to be copied
+        # before it's passed to another thread
+        return PIL.ImageQt.ImageQt(image).copy()
+
+
 class _StylePreview(QtWidgets.QGroupBox):
     preview_text_changed = QtCore.pyqtSignal([])
 
@@ -55,7 +142,9 @@ class _StylePreview(QtWidgets.QGroupBox):
         self._api = api
         self._selection_model = selection_model
 
-        self._renderer = AssRenderer()
+        self._worker = _PreviewWorker(api)
+        self._worker.signals.finished.connect(self._on_preview_render)
+        api.threading.schedule_runnable(self._worker)
 
         self._editor = QtWidgets.QPlainTextEdit()
         self._editor.setPlainText(api.cfg.opt["styles"]["preview_test_text"])
@@ -120,62 +209,44 @@ class _StylePreview(QtWidgets.QGroupBox):
     def update_preview(self) -> None:
         selected_style = self._selected_style
         if not selected_style:
+            self._worker.discard_pending()
             self._preview_box.clear()
             return
 
         resolution = (self._preview_box.width(), self._preview_box.height())
         if resolution[0] <= 0 or resolution[1] <= 0:
+            self._worker.discard_pending()
             self._preview_box.clear()
             return
 
-        fake_style = copy(selected_style)
-        fake_style.name = "Default"
+        style = copy(selected_style)
         if (
             self._api.video.current_stream
             and self._api.video.current_stream.is_ready
         ):
-            fake_style.scale(
-                resolution[1] / self._api.video.current_stream.height
+            style.scale(resolution[1] / self._api.video.current_stream.height)
+
+        self._worker.schedule_preview(
+            _PreviewRequest(
+                style=style,
+                text=self.preview_text,
+                background_path=self._background_combobox.currentData(),
+                resolution=resolution,
+                aspect_ratio=(
+                    self._api.video.current_stream.aspect_ratio
+                    if self._api.video.current_stream
+                    else 1
+                ),
             )
-        fake_style_list = AssStyleList()
-        fake_style_list.append(fake_style)
-
-        fake_event = AssEvent(
-            start=0,
-            end=1000,
-            text=self.preview_text.replace("\n", "\\N"),
-            style=fake_style.name,
         )
-        fake_event_list = AssEventList()
-        fake_event_list.append(fake_event)
-
-        fake_meta = AssMeta()
-
-        image = PIL.Image.new(mode="RGBA", size=resolution)
-
-        background_path = self._background_combobox.currentData()
-        if background_path and background_path.exists():
-            background = PIL.Image.open(background_path)
-            for y in range(0, resolution[1], background.height):
-                for x in range(0, resolution[0], background.width):
-                    image.paste(background, (x, y))
 
-        self._renderer.set_source(
-            fake_style_list, fake_event_list, fake_meta, resolution
-        )
-        subs_image = self._renderer.render(
-            time=0,
-            aspect_ratio=(
-                self._api.video.current_stream.aspect_ratio
-                if self._api.video.current_stream
-                else 1
-            ),
-        )
-        image = PIL.Image.composite(subs_image, image, subs_image)
+    def shutdown(self) -> None:
+        self._worker.stop()
 
-        image = PIL.ImageQt.ImageQt(image)
-        image = QtGui.QImage(image)
-        self._preview_box.setPixmap(QtGui.QPixmap.fromImage(image))
+    def _on_preview_render(self, request_id: int, image: QtGui.QImage) -> None:
+        # the style might have changed while it was being rendered
+        if request_id == self._worker.latest_request_id:
+            self._preview_box.setPixmap(QtGui.QPixmap.fromImage(image))
 
 
 class _StyleList(QtWidgets.QWidget):
@@ -289,12 +360,7 @@ class _StyleList(QtWidgets.QWidget):
                 return None
             style_name = dialog.textValue()
 
-            exists = False
-            for style in self._api.subs.styles:
-                if style.name == style_name:
-                    exists = True
-
-            if not exists:
+            if self._api.subs.styles.get_by_name(style_name) is None:
                 return style_name
 
             prompt_text = '"{}" already exists. Choose different name:'.format(
@@ -400,6 +466,7 @@ class _FontGroupBox(QtWidgets.QGroupBox):
 
         if api.cfg.opt["gui"]["try_to_refresh_fonts"]:
             refresh_font_db()
+            drop_spare_renderers()
 
         self.font_name_edit = FontComboBox(api, self)
         self.font_size_edit = QtWidgets.QSpinBox(self)
@@ -702,6 +769,10 @@ class _StylesManagerDialog(Dialog):
     def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
         self._preview_box.update_preview()
 
+    def done(self, code: int) -> None:
+        self._preview_box.shutdown()
+        super().done(code)
+
     def _sync_preview_text(self) -> None:
         self._style_editor.font_group_box.font_name_edit.set_sample_text(
             self._preview_box.preview_text
@@ -41,4 +41,21 @@ class RedoCommand(BaseCommand):
         self.api.undo.redo()
 
 
-COMMANDS = [UndoCommand, RedoCommand]
+class UndoStatsCommand(BaseCommand):
+    names = ["undo-stats"]
+    help_text = (
+        "Shows how many undo entries there are "
+        "and how much memory and disk space they take."
+    )
+
+    async def run(self) -> None:
+        stats = self.api.undo.stats
+        self.api.log.info(
+            f"undo entries: {stats.entries}, "
+            f"memory: {stats.ram_size / 1024:.1f} KiB, "
+            f"disk: {stats.disk_size / 1024:.1f} KiB "
+            f"(spill file: {stats.disk_file_size / 1024:.1f} KiB)"
+        )
+
+
+COMMANDS = [UndoCommand, RedoCommand, UndoStatsCommand]
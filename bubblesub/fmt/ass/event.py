@@ -18,7 +18,29 @@
 
 import typing as T
 
-from bubblesub.model import ObservableList, ObservableObject
+from bubblesub.fmt.ass.util import (
+    ass_to_plaintext,
+    character_count,
+    spell_check_ass_line,
+)
+from bubblesub.model import IntervalIndex, ObservableList, ObservableObject
+from bubblesub.spell_check import BaseSpellChecker
+
+# in the order of the AssEvent constructor arguments
+EVENT_FIELDS = (
+    "start",
+    "end",
+    "style",
+    "actor",
+    "text",
+    "note",
+    "effect",
+    "layer",
+    "margin_left",
+    "margin_right",
+    "margin_vertical",
+    "is_comment",
+)
 
 
 class AssEvent(ObservableObject):
@@ -56,22 +78,33 @@ class AssEvent(ObservableObject):
         """
         super().__init__()
 
-        self.event_list: T.Optional["AssEventList"] = None
-
-        self.start = start
-        self.end = end
-        self.style = style
-        self.actor = actor
-        self._text = text
-        self._note = note
-        self.effect = effect
-        self.layer = layer
-        self.margin_left = margin_left
-        self.margin_right = margin_right
-        self.margin_vertical = margin_vertical
-        self.is_comment = is_comment
-
-        self._hash = 0
+        self.event_list: T.Optional["AssEventList"]
+        self._text_cache: T.Dict[str, T.Any]
+        self._hash: int
+        self._serialized: T.Optional[str]
+        self._change_index: T.Optional[int]
+
+        # there's nothing to observe yet, so skip the change tracking -
+        # events are created in bulk when loading files
+        self.__dict__.update(
+            event_list=None,
+            _text_cache={},
+            start=start,
+            end=end,
+            style=style,
+            actor=actor,
+            _text=text,
+            _note=note,
+            effect=effect,
+            layer=layer,
+            margin_left=margin_left,
+            margin_right=margin_right,
+            margin_vertical=margin_vertical,
+            is_comment=is_comment,
+            _hash=0,
+            _serialized=None,
+            _change_index=None,
+        )
 
     def __hash__(self) -> int:
         """Make this class available for use in sets and so on.
@@ -95,6 +128,56 @@ class AssEvent(ObservableObject):
         :param value: new text
         """
         self._text = value.replace("\n", "\\N")
+        self._text_cache = {}
+
+    @property
+    def plaintext(self) -> str:
+        """Return event text stripped of ASS tags.
+
+        The value is cached until the text changes.
+
+        :return: plain text
+        """
+        if "plaintext" not in self._text_cache:
+            self._text_cache["plaintext"] = ass_to_plaintext(self.text)
+        return T.cast(str, self._text_cache["plaintext"])
+
+    @property
+    def character_count(self) -> int:
+        """Return how many characters the event text contains.
+
+        The value is cached until the text changes.
+
+        :return: number of characters
+        """
+        if "character_count" not in self._text_cache:
+            self._text_cache["character_count"] = character_count(self.text)
+        return T.cast(int, self._text_cache["character_count"])
+
+    def spell_check(
+        self, spell_checker: BaseSpellChecker
+    ) -> T.List[T.Tuple[int, int, str]]:
+        """Return badly spelled words within the event text.
+
+        Positions refer to the text with \\N replaced with newlines, the way
+        it is shown in the editor. The result is cached until the text or
+        the spell checker change.
+
+        :param spell_checker: spell checker to validate the words with
+        :return: list of tuples with start, end and text
+        """
+        cached = self._text_cache.get("spell_check")
+        if cached is None or cached[0] is not spell_checker:
+            cached = (
+                spell_checker,
+                list(
+                    spell_check_ass_line(
+                        spell_checker, self.text.replace("\\N", "\n")
+                    )
+                ),
+            )
+            self._text_cache["spell_check"] = cached
+        return T.cast(T.List[T.Tuple[int, int, str]], cached[1])
 
     @property
     def note(self) -> str:
@@ -176,12 +259,28 @@ class AssEvent(ObservableObject):
         assert self.event_list is not None
         return self.event_list.get(index + 1, None)
 
-    def _after_change(self) -> None:
-        """Emit item changed event in the parent subtitle list."""
+    def _before_change(self) -> None:
+        """Emit item about to change event in the parent subtitle list."""
         index = self.index
+        # looking the index up is linear, so remember it until the change
+        # is finished
+        self._change_index = index
         if index is not None and self.event_list is not None:
-            self.event_list.item_modified.emit(index)
+            self.event_list.item_about_to_be_modified.emit(index)
+
+    def _after_change(self) -> None:
+        """Emit item changed event in the parent subtitle list."""
+        self._serialized = None
+        index = self._change_index
+        self._change_index = None
+        if self.event_list is not None:
+            if index is None or self.event_list.get(index) is not self:
+                index = self.index
+            if index is not None:
+                self.event_list.item_modified.emit(index)
+        self._update_hash()
 
+    def _update_hash(self) -> None:
         self._hash = hash(
             (
                 id(self.event_list),
@@ -209,6 +308,8 @@ class AssEvent(ObservableObject):
         """
         ret = self.__dict__.copy()
         del ret["event_list"]
+        del ret["_serialized"]
+        del ret["_text_cache"]
         return ret
 
     def __setstate__(self, state: T.Any) -> None:
@@ -218,6 +319,9 @@ class AssEvent(ObservableObject):
         """
         self.__dict__.update(state)
         self.event_list = None
+        self._serialized = None
+        self._text_cache = {}
+        self._change_index = None
 
     def __copy__(self) -> "AssEvent":
         """Duplicate self.
@@ -231,6 +335,7 @@ class AssEvent(ObservableObject):
             if not callable(value):
                 ret.__dict__[key] = value
         ret.__dict__["event_list"] = None
+        ret.__dict__["_text_cache"] = {}
         return ret
 
 
@@ -240,14 +345,44 @@ class AssEventList(ObservableList[AssEvent]):
     def __init__(self) -> None:
         """Initialize self."""
         super().__init__()
+        self._time_index: IntervalIndex[AssEvent] = IntervalIndex()
         self.items_inserted.connect(self._on_items_insertion)
         self.items_about_to_be_removed.connect(self._on_items_removal)
+        self.item_modified.connect(self._on_item_modification)
+
+    def events_at(self, pts: int) -> T.List[AssEvent]:
+        """Return events that are displayed at given PTS.
+
+        :param pts: PTS to look up the events for
+        :return: list of events, ordered by their start time
+        """
+        return list(self._time_index.overlapping(pts, pts))
+
+    def events_in_range(self, start: int, end: int) -> T.List[AssEvent]:
+        """Return events that overlap given time range.
+
+        :param start: range start PTS
+        :param end: range end PTS
+        :return: list of events, ordered by their start time
+        """
+        return list(self._time_index.overlapping(start, end))
 
     def _on_items_insertion(self, idx: int, count: int) -> None:
-        for item in self._items[idx : idx + count]:
+        # attaching events to the list doesn't count as modifying them, so
+        # bypass the change tracking that would look up their indexes
+        items = self._items[idx : idx + count]
+        for item in items:
             assert item.event_list is None, "AssEvent belongs to another list"
-            item.event_list = self
+            item.__dict__["event_list"] = self
+            item._update_hash()  # pylint: disable=protected-access
+        self._time_index.update((item, item.start, item.end) for item in items)
 
     def _on_items_removal(self, idx: int, count: int) -> None:
         for item in self._items[idx : idx + count]:
-            item.event_list = None
+            item.__dict__["event_list"] = None
+            item._update_hash()  # pylint: disable=protected-access
+            self._time_index.discard(item)
+
+    def _on_item_modification(self, idx: int) -> None:
+        item = self._items[idx]
+        self._time_index.add(item, item.start, item.end)
@@ -17,8 +17,11 @@
 """ASS file reader."""
 
 import io
+import multiprocessing
+import os
 import re
 import typing as T
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from bubblesub.fmt.ass.event import AssEvent
@@ -28,6 +31,49 @@ from bubblesub.fmt.ass.util import unescape_ass_tag
 
 TIMESTAMP_RE = re.compile(r"(\d{1,2}):(\d{2}):(\d{2})[.,](\d{2,3})")
 SECTION_HEADING_RE = re.compile(r"^\[([^\]]+)\]$")
+PARALLEL_PARSE_THRESHOLD = 50_000
+PARALLEL_PARSE_CHUNK_SIZE = 10_000
+NOTE_RE = re.compile(r"{NOTE:(?P<note>[^}]*)}")
+TIME_RE = re.compile(r"{TIME:(?P<start>-?\d+),(?P<end>-?\d+)}")
+
+EVENT_FIELD_NAMES = [
+    "Layer",
+    "Start",
+    "End",
+    "Style",
+    "Name",
+    "MarginL",
+    "MarginR",
+    "MarginV",
+    "Effect",
+    "Text",
+]
+
+STYLE_FIELD_NAMES = [
+    "Name",
+    "Fontname",
+    "Fontsize",
+    "PrimaryColour",
+    "SecondaryColour",
+    "OutlineColour",
+    "BackColour",
+    "Bold",
+    "Italic",
+    "Underline",
+    "StrikeOut",
+    "ScaleX",
+    "ScaleY",
+    "Spacing",
+    "Angle",
+    "BorderStyle",
+    "Outline",
+    "Shadow",
+    "Alignment",
+    "MarginL",
+    "MarginR",
+    "MarginV",
+    "Encoding",
+]
 
 
 def _deserialize_color(text: str) -> AssColor:
@@ -55,8 +101,37 @@ def _timestamp_to_ms(text: str) -> int:
     return milliseconds
 
 
+# AssEvent constructor arguments, in positional order
+_EventRow = T.Tuple[
+    int, int, str, str, str, str, str, int, int, int, int, bool
+]
+
+
+class _EventBatch(T.NamedTuple):
+    field_count: int
+    field_indexes: T.List[int]
+    lines: T.List[T.Tuple[int, str]]
+
+
 class _ReadContext:
-    field_names: T.List[str] = []
+    def __init__(self) -> None:
+        """Initialize self."""
+        self.line_num = 0
+        self.field_count = 0
+        self.field_indexes: T.List[int] = []
+        self.styles: T.List[AssStyle] = []
+        self.event_batches: T.List[_EventBatch] = []
+
+
+def _parse_format(
+    line: str, ctx: _ReadContext, expected_field_names: T.List[str]
+) -> None:
+    _, rest = line.split(": ", 1)
+    field_names = [p.strip() for p in rest.split(",")]
+    ctx.field_count = len(field_names)
+    ctx.field_indexes = [
+        field_names.index(name) for name in expected_field_names
+    ]
 
 
 def _info_section_handler(
@@ -75,38 +150,62 @@ def _styles_section_handler(
     line: str, ass_file: AssFile, ctx: _ReadContext
 ) -> None:
     if line.startswith("Format:"):
-        _, rest = line.split(": ", 1)
-        ctx.field_names = [p.strip() for p in rest.split(",")]
+        _parse_format(line, ctx, STYLE_FIELD_NAMES)
         return
 
     _, rest = line.split(": ", 1)
     field_values = rest.strip().split(",")
-    field_dict = dict(zip(ctx.field_names, field_values))
-    ass_file.styles.append(
+    (
+        name,
+        font_name,
+        font_size,
+        primary_color,
+        secondary_color,
+        outline_color,
+        back_color,
+        bold,
+        italic,
+        underline,
+        strike_out,
+        scale_x,
+        scale_y,
+        spacing,
+        angle,
+        border_style,
+        outline,
+        shadow,
+        alignment,
+        margin_left,
+        margin_right,
+        margin_vertical,
+        encoding,
+    ) = [field_values[idx] for idx in ctx.field_indexes]
+
+    ctx.styles.append(
         AssStyle(
-            name=field_dict["Name"],
-            font_name=field_dict["Fontname"],
-            font_size=int(float(field_dict["Fontsize"])),
-            primary_color=_deserialize_color(field_dict["PrimaryColour"]),
-            secondary_color=_deserialize_color(field_dict["SecondaryColour"]),
-            outline_color=_deserialize_color(field_dict["OutlineColour"]),
-            back_color=_deserialize_color(field_dict["BackColour"]),
-            bold=field_dict["Bold"] == "-1",
-            italic=field_dict["Italic"] == "-1",
-            underline=field_dict["Underline"] == "-1",
-            strike_out=field_dict["StrikeOut"] == "-1",
-            scale_x=float(field_dict["ScaleX"]),
-            scale_y=float(field_dict["ScaleY"]),
-            spacing=float(field_dict["Spacing"]),
-            angle=float(field_dict["Angle"]),
-            border_style=int(field_dict["BorderStyle"]),
-            outline=float(field_dict["Outline"]),
-            shadow=float(field_dict["Shadow"]),
-            alignment=int(field_dict["Alignment"]),
-            margin_left=int(float(field_dict["MarginL"])),
-            margin_right=int(float(field_dict["MarginR"])),
-            margin_vertical=int(float(field_dict["MarginV"])),
-            encoding=int(field_dict["Encoding"]),
+            name=name,
+            font_name=font_name,
+            font_size=int(float(font_size)),
+            primary_color=_deserialize_color(primary_color),
+            secondary_color=_deserialize_color(secondary_color),
+            outline_color=_deserialize_color(outline_color),
+            back_color=_deserialize_color(back_color),
+            bold=bold == "-1",
+            italic=italic == "-1",
+            underline=underline == "-1",
+            strike_out=strike_out == "-1",
+            scale_x=float(scale_x),
+            scale_y=float(scale_y),
+            spacing=float(spacing),
+            angle=float(angle),
+            border_style=int(border_style),
+            outline=float(outline),
+            shadow=float(shadow),
+            alignment=int(alignment),
+            margin_left=int(float(margin_left)),
+            margin_right=int(float(margin_right)),
+            margin_vertical=int(float(margin_vertical)),
+            encoding=int(encoding),
         )
     )
 
@@ -115,69 +214,151 @@ def _events_section_handler(
     line: str, ass_file: AssFile, ctx: _ReadContext
 ) -> None:
     if line.startswith("Format:"):
-        _, rest = line.split(": ", 1)
-        ctx.field_names = [p.strip() for p in rest.split(",")]
+        _parse_format(line, ctx, EVENT_FIELD_NAMES)
+        ctx.event_batches.append(
+            _EventBatch(ctx.field_count, ctx.field_indexes, [])
+        )
         return
 
-    event_type, rest = line.split(": ", 1)
-    field_values = rest.strip().split(",", len(ctx.field_names) - 1)
-    field_dict = dict(zip(ctx.field_names, field_values))
+    # parsing is deferred until the whole section is known, so that large
+    # files can be parsed in parallel
+    if not ctx.event_batches:
+        raise ValueError("missing format line")
+    ctx.event_batches[-1].lines.append((ctx.line_num, line))
+
 
+def _parse_event(
+    line: str, field_count: int, field_indexes: T.List[int]
+) -> _EventRow:
+    event_type, rest = line.split(": ", 1)
     if event_type not in {"Comment", "Dialogue"}:
         raise ValueError(f'unknown event type: "{event_type}"')
 
-    text = field_dict["Text"]
-    note = ""
-    match = re.search(r"{NOTE:(?P<note>[^}]*)}", text)
-    if match:
-        text = text[: match.start()] + text[match.end() :]
-        note = unescape_ass_tag(match.group("note"))
+    field_values = rest.strip().split(",", field_count - 1)
+    (
+        layer,
+        start_text,
+        end_text,
+        style,
+        actor,
+        margin_left,
+        margin_right,
+        margin_vertical,
+        effect,
+        text,
+    ) = [field_values[idx] for idx in field_indexes]
 
     # ASS tags have centisecond precision
-    start = _timestamp_to_ms(field_dict["Start"])
-    end = _timestamp_to_ms(field_dict["End"])
-
-    # refine times down to millisecond precision using novelty {TIME:…} tag,
-    # but only if the times match the regular ASS times. This is so that
-    # subtitle times modified outside of bubblesub with editors that do not
-    # write the novelty {TIME:…} tag are not overwritten.
-    match = re.search(r"{TIME:(?P<start>-?\d+),(?P<end>-?\d+)}", text)
-    if match:
-        text = text[: match.start()] + text[match.end() :]
-        start_ms = int(match.group("start"))
-        end_ms = int(match.group("end"))
-        if 0 <= start_ms - start < 10:
-            start = start_ms
-        if 0 <= end_ms - end < 10:
-            end = end_ms
-
-    ass_file.events.append(
-        AssEvent(
-            layer=int(field_dict["Layer"]),
-            start=start,
-            end=end,
-            style=field_dict["Style"],
-            actor=field_dict["Name"],
-            margin_left=int(field_dict["MarginL"]),
-            margin_right=int(field_dict["MarginR"]),
-            margin_vertical=int(field_dict["MarginV"]),
-            effect=field_dict["Effect"],
-            text=text,
-            note=note,
-            is_comment=event_type == "Comment",
-        )
+    start = _timestamp_to_ms(start_text)
+    end = _timestamp_to_ms(end_text)
+
+    note = ""
+    if "{" in text:
+        match = NOTE_RE.search(text)
+        if match:
+            text = text[: match.start()] + text[match.end() :]
+            note = unescape_ass_tag(match.group("note"))
+
+        # refine times down to millisecond precision using novelty {TIME:…}
+        # tag, but only if the times match the regular ASS times. This is so
+        # that subtitle times modified outside of bubblesub with editors that
+        # do not write the novelty {TIME:…} tag are not overwritten.
+        match = TIME_RE.search(text)
+        if match:
+            text = text[: match.start()] + text[match.end() :]
+            start_ms = int(match.group("start"))
+            end_ms = int(match.group("end"))
+            if 0 <= start_ms - start < 10:
+                start = start_ms
+            if 0 <= end_ms - end < 10:
+                end = end_ms
+
+    return (
+        start,
+        end,
+        style,
+        actor,
+        text,
+        note,
+        effect,
+        int(layer),
+        int(margin_left),
+        int(margin_right),
+        int(margin_vertical),
+        event_type == "Comment",
     )
 
 
+def _parse_events(
+    field_count: int,
+    field_indexes: T.List[int],
+    lines: T.List[T.Tuple[int, str]],
+) -> T.List[_EventRow]:
+    # runs in worker processes for large files, so it must produce plain,
+    # picklable values rather than AssEvent instances
+    rows: T.List[_EventRow] = []
+    for line_num, line in lines:
+        try:
+            rows.append(_parse_event(line, field_count, field_indexes))
+        except (ValueError, IndexError):
+            raise ValueError(
+                f'corrupt ASS file at line #{line_num+1}: "{line}"'
+            )
+    return rows
+
+
+def _load_events(ctx: _ReadContext) -> T.List[AssEvent]:
+    jobs: T.List[T.Tuple[int, T.List[int], T.List[T.Tuple[int, str]]]] = []
+    for batch in ctx.event_batches:
+        for i in range(0, len(batch.lines), PARALLEL_PARSE_CHUNK_SIZE):
+            jobs.append(
+                (
+                    batch.field_count,
+                    batch.field_indexes,
+                    batch.lines[i : i + PARALLEL_PARSE_CHUNK_SIZE],
+                )
+            )
+
+    total = sum(len(batch.lines) for batch in ctx.event_batches)
+    workers = min(os.cpu_count() or 1, len(jobs))
+    if total < PARALLEL_PARSE_THRESHOLD or workers <= 1:
+        chunks = [_parse_events(*job) for job in jobs]
+    else:
+        # forking a process that runs Qt and other threads can deadlock
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            chunks = list(executor.map(_parse_events, *zip(*jobs)))
+
+    return [AssEvent(*row) for chunk in chunks for row in chunk]
+
+
 def _dummy_handler(
     line: str, ass_file: AssFile, context: _ReadContext
 ) -> None:
     pass
 
 
+SECTION_HANDLERS: T.Dict[
+    str, T.Callable[[str, AssFile, _ReadContext], None]
+] = {
+    "Script Info": _info_section_handler,
+    "V4+ Styles": _styles_section_handler,
+    "Events": _events_section_handler,
+    "Aegisub Project Garbage": _dummy_handler,
+    "Graphics": _dummy_handler,
+    "Fonts": _dummy_handler,
+}
+
+
 def load_ass(handle: T.IO[str], ass_file: AssFile) -> None:
     """Load ASS from the specified source.
 
+    The source is read line by line. Parsed styles and events are collected
+    first and put into the file in bulk once the whole source is read.
+    Files with many events have their events parsed in a process pool.
+
     :param handle: readable stream
     :param ass_file: file to load to
     """
@@ -189,34 +370,25 @@ def load_ass(handle: T.IO[str], ass_file: AssFile) -> None:
 
     handler: T.Optional[T.Callable[[str, AssFile, _ReadContext], None]] = None
 
-    text = handle.read()
-    text = text.replace("\r", "")
-    if text.startswith("\N{BOM}"):
-        text = text[len("\N{BOM}") :]
-    lines = text.split("\n")
-
-    for i, line in enumerate(lines):
+    for i, line in enumerate(handle):
+        ctx.line_num = i
+        if i == 0 and line.startswith("\N{BOM}"):
+            line = line[len("\N{BOM}") :]
         line = line.strip()
         if not line:
             continue
 
         try:
-            match = SECTION_HEADING_RE.match(line)
+            match = (
+                SECTION_HEADING_RE.match(line)
+                if line.startswith("[")
+                else None
+            )
             if match:
                 section = match.group(1)
-                if section == "Script Info":
-                    handler = _info_section_handler
-                elif section == "V4+ Styles":
-                    handler = _styles_section_handler
-                elif section == "Events":
-                    handler = _events_section_handler
-                elif section in [
-                    "Aegisub Project Garbage",
-                    "Graphics",
-                    "Fonts",
-                ]:
-                    handler = _dummy_handler
-                else:
+                try:
+                    handler = SECTION_HANDLERS[section]
+                except KeyError:
                     raise ValueError(f'unrecognized section: "{section}"')
             elif not handler:
                 raise ValueError("expected section")
@@ -225,6 +397,9 @@ def load_ass(handle: T.IO[str], ass_file: AssFile) -> None:
         except (ValueError, IndexError):
             raise ValueError(f'corrupt ASS file at line #{i+1}: "{line}"')
 
+    ass_file.styles.append(*ctx.styles)
+    ass_file.events.append(*_load_events(ctx))
+
 
 def read_ass(source: T.Union[Path, T.IO[str], str]) -> AssFile:
     """Read ASS from the specified source.
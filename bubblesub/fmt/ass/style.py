@@ -23,6 +23,33 @@ from bubblesub.model import ObservableList, ObservableObject
 
 AssColor = namedtuple("AssColor", ["red", "green", "blue", "alpha"])
 
+# in the order of the AssStyle constructor arguments
+STYLE_FIELDS = (
+    "name",
+    "font_name",
+    "font_size",
+    "primary_color",
+    "secondary_color",
+    "outline_color",
+    "back_color",
+    "bold",
+    "italic",
+    "underline",
+    "strike_out",
+    "scale_x",
+    "scale_y",
+    "spacing",
+    "angle",
+    "border_style",
+    "outline",
+    "shadow",
+    "alignment",
+    "margin_left",
+    "margin_right",
+    "margin_vertical",
+    "encoding",
+)
+
 
 class AssStyle(ObservableObject):
     """ASS style."""
@@ -109,6 +136,8 @@ class AssStyle(ObservableObject):
         self.encoding = encoding
 
         self._hash = 0
+        self._serialized: T.Optional[str] = None
+        self._change_index: T.Optional[int] = None
 
     def __hash__(self) -> int:
         """Make this class available for use in sets and so on.
@@ -160,12 +189,27 @@ class AssStyle(ObservableObject):
         self._old_name = self._name
         self._name = new_name
 
-    def _after_change(self) -> None:
-        """Emit item changed event in the parent style list."""
+    def _before_change(self) -> None:
+        """Emit item about to change event in the parent style list."""
         index = self.index
+        # reused by ._after_change(), unless the style moved in the meantime
+        self._change_index = index
         if index is not None and self.style_list is not None:
-            self.style_list.item_modified.emit(self.index)
+            self.style_list.item_about_to_be_modified.emit(index)
+
+    def _after_change(self) -> None:
+        """Emit item changed event in the parent style list."""
+        self._serialized = None
+        index = self._change_index
+        self._change_index = None
+        if self.style_list is not None:
+            if index is None or self.style_list.get(index) is not self:
+                index = self.index
+            if index is not None:
+                self.style_list.item_modified.emit(index)
+        self._update_hash()
 
+    def _update_hash(self) -> None:
         self._hash = hash(
             (
                 id(self.style_list),
@@ -204,6 +248,7 @@ class AssStyle(ObservableObject):
         """
         ret = self.__dict__.copy()
         del ret["style_list"]
+        del ret["_serialized"]
         return ret
 
     def __setstate__(self, state: T.Any) -> None:
@@ -213,6 +258,8 @@ class AssStyle(ObservableObject):
         """
         self.__dict__.update(state)
         self.style_list = None
+        self._serialized = None
+        self._change_index = None
 
     def __copy__(self) -> "AssStyle":
         """Duplicate self.
@@ -235,8 +282,13 @@ class AssStyleList(ObservableList[AssStyle]):
     def __init__(self) -> None:
         """Initialize self."""
         super().__init__()
+        self._name_to_idx: T.Optional[T.Dict[str, int]] = None
         self.items_inserted.connect(self._on_items_insertion)
         self.items_about_to_be_removed.connect(self._on_items_removal)
+        self.items_inserted.connect(self._invalidate_name_index)
+        self.items_removed.connect(self._invalidate_name_index)
+        self.items_moved.connect(self._invalidate_name_index)
+        self.item_modified.connect(self._on_item_modification)
 
     def get_by_name(self, name: str) -> T.Optional[AssStyle]:
         """Retrieve style by its name.
@@ -244,16 +296,39 @@ class AssStyleList(ObservableList[AssStyle]):
         :param name: name of the style to look for
         :return: style instance if one was found, None otherwise
         """
-        for style in self._items:
-            if style.name == name:
-                return style
-        return None
+        idx = self.index_by_name(name)
+        if idx is None:
+            return None
+        return self._items[idx]
+
+    def index_by_name(self, name: str) -> T.Optional[int]:
+        """Retrieve style position by its name.
+
+        :param name: name of the style to look for
+        :return: style position if one was found, None otherwise
+        """
+        if self._name_to_idx is None:
+            self._name_to_idx = {}
+            for idx, style in enumerate(self._items):
+                self._name_to_idx.setdefault(style.name, idx)
+        return self._name_to_idx.get(name)
+
+    def _invalidate_name_index(self) -> None:
+        self._name_to_idx = None
+
+    def _on_item_modification(self, idx: int) -> None:
+        if "name" in self._items[idx].changed_properties:
+            self._name_to_idx = None
 
     def _on_items_insertion(self, idx: int, count: int) -> None:
+        # attaching styles to the list doesn't count as modifying them, so
+        # bypass the change tracking that would look up their indexes
         for item in self._items[idx : idx + count]:
             assert item.style_list is None, "AssStyle belongs to another list"
-            item.style_list = self
+            item.__dict__["style_list"] = self
+            item._update_hash()  # pylint: disable=protected-access
 
     def _on_items_removal(self, idx: int, count: int) -> None:
         for item in self._items[idx : idx + count]:
-            item.event_list = None
+            item.__dict__["style_list"] = None
+            item._update_hash()  # pylint: disable=protected-access
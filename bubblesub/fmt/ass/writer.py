@@ -16,21 +16,174 @@
 
 """ASS file writer."""
 
-import functools
 import typing as T
+import weakref
 from collections import OrderedDict
+from copy import copy
 from decimal import Decimal
+from operator import attrgetter
 from pathlib import Path
 
-from bubblesub.fmt.ass.event import AssEvent
+from bubblesub.fmt.ass.event import EVENT_FIELDS, AssEvent
 from bubblesub.fmt.ass.file import AssFile
-from bubblesub.fmt.ass.style import AssColor, AssStyle
+from bubblesub.fmt.ass.style import STYLE_FIELDS, AssColor, AssStyle
 from bubblesub.fmt.ass.util import escape_ass_tag
+from bubblesub.model import ObservableList
 from bubblesub.util import ms_to_times
 
+# pylint: disable=protected-access
+
 NOTICE = (
     "Script generated by bubblesub\nhttps://github.com/bubblesub/bubblesub"
 )
+CHUNK_SIZE = 256
+
+TItem = T.TypeVar("TItem", AssEvent, AssStyle)
+
+# capturing the event fields is much cheaper than copying the events
+_EventFields = T.NamedTuple(  # type: ignore
+    "_EventFields", [(field, T.Any) for field in EVENT_FIELDS]
+)
+_get_event_fields = attrgetter(*EVENT_FIELDS)
+_get_style_fields = attrgetter(*STYLE_FIELDS)
+
+
+class _ChunkCache(T.Generic[TItem]):
+    """Serialized lines of a list, joined into fixed size chunks.
+
+    Chunks are dropped whenever the list reports that they're affected by a
+    change, so writing the same list repeatedly only serializes and joins
+    the parts that changed in the meantime. The field values of the items
+    are cached in the same chunks.
+    """
+
+    def __init__(self, items: ObservableList[TItem]) -> None:
+        """Initialize self.
+
+        :param items: list to cache the chunks of
+        """
+        self._chunks: T.Dict[int, str] = {}
+        self._rows: T.Dict[int, T.Tuple[T.Tuple[T.Any, ...], ...]] = {}
+        items.item_modified.connect(self._on_item_modified)
+        items.items_inserted.connect(self._on_items_inserted)
+        items.items_removed.connect(self._on_items_removed)
+        items.items_moved.connect(self._on_items_moved)
+
+    def get(
+        self,
+        items: ObservableList[TItem],
+        serialize: T.Callable[[TItem], str],
+    ) -> T.Iterable[str]:
+        """Return the chunks of the specified list, building missing ones.
+
+        :param items: list to serialize
+        :param serialize: function serializing a single item
+        :return: joined serialized lines, each ending with a newline
+        """
+        for chunk_idx in range((len(items) + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            chunk = self._chunks.get(chunk_idx)
+            if chunk is None:
+                start = chunk_idx * CHUNK_SIZE
+                chunk = "".join(
+                    serialize(item) + "\n"
+                    for item in items[start : start + CHUNK_SIZE]
+                )
+                self._chunks[chunk_idx] = chunk
+            yield chunk
+
+    def snapshot(
+        self,
+        items: ObservableList[TItem],
+        serialize: T.Callable[[TItem], str],
+        capture: T.Callable[[TItem], T.Any],
+    ) -> T.List[T.Any]:
+        """Capture the list so that it can be serialized on another thread.
+
+        Cached chunks and lines are captured as text, the remaining items
+        with the specified function.
+
+        :param items: list to capture
+        :param serialize: function serializing a single item
+        :param capture: function capturing a single item
+        :return: serialized chunks and lines mixed with captured items
+        """
+        ret: T.List[T.Any] = []
+        for chunk_idx in range((len(items) + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            chunk = self._chunks.get(chunk_idx)
+            if chunk is not None:
+                ret.append(chunk)
+                continue
+            start = chunk_idx * CHUNK_SIZE
+            for item in items[start : start + CHUNK_SIZE]:
+                if item._serialized is None:
+                    ret.append(capture(item))
+                else:
+                    ret.append(serialize(item) + "\n")
+        return ret
+
+    def rows(
+        self,
+        items: ObservableList[TItem],
+        get_row: T.Callable[[TItem], T.Tuple[T.Any, ...]],
+    ) -> T.List[T.Tuple[T.Tuple[T.Any, ...], ...]]:
+        """Return field values of the specified list, capturing missing ones.
+
+        :param items: list to capture
+        :param get_row: function returning field values of a single item
+        :return: field values of the items, in chunks
+        """
+        ret = []
+        for chunk_idx in range((len(items) + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            rows = self._rows.get(chunk_idx)
+            if rows is None:
+                start = chunk_idx * CHUNK_SIZE
+                rows = tuple(map(get_row, items[start : start + CHUNK_SIZE]))
+                self._rows[chunk_idx] = rows
+            ret.append(rows)
+        return ret
+
+    def _invalidate_from(self, idx: int) -> None:
+        first_chunk_idx = idx // CHUNK_SIZE
+        for cache in (self._chunks, self._rows):
+            for chunk_idx in list(cache):
+                if chunk_idx >= first_chunk_idx:
+                    del cache[chunk_idx]
+
+    def _on_item_modified(self, idx: int) -> None:
+        self._chunks.pop(idx // CHUNK_SIZE, None)
+        self._rows.pop(idx // CHUNK_SIZE, None)
+
+    def _on_items_inserted(self, idx: int, _count: int) -> None:
+        self._invalidate_from(idx)
+
+    def _on_items_removed(self, idx: int, _count: int) -> None:
+        self._invalidate_from(idx)
+
+    def _on_items_moved(self, idx: int, _count: int, new_idx: int) -> None:
+        self._invalidate_from(min(idx, new_idx))
+
+
+_CHUNK_CACHES: "weakref.WeakKeyDictionary[T.Any, _ChunkCache[T.Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_chunk_cache(items: ObservableList[TItem]) -> _ChunkCache[TItem]:
+    try:
+        return _CHUNK_CACHES[items]
+    except KeyError:
+        cache: _ChunkCache[TItem] = _ChunkCache(items)
+        _CHUNK_CACHES[items] = cache
+        return cache
+
+
+def _write_lines(
+    items: ObservableList[TItem],
+    serialize: T.Callable[[TItem], str],
+    handle: T.IO[str],
+) -> None:
+    for chunk in _get_chunk_cache(items).get(items, serialize):
+        handle.write(chunk)
 
 
 def _serialize_text(text: str) -> str:
@@ -63,9 +216,15 @@ def write_meta(ass_file: AssFile, handle: T.IO[str]) -> None:
     :param ass_file: ASS file to take the metadata from
     :param handle: handle to write the metadata to
     """
-    meta: T.Dict[str, str] = OrderedDict()
+    _write_meta_items(ass_file.meta.items(), handle)
+
+
+def _write_meta_items(
+    items: T.Iterable[T.Tuple[str, T.Optional[str]]], handle: T.IO[str]
+) -> None:
+    meta: T.Dict[str, T.Optional[str]] = OrderedDict()
     meta["ScriptType"] = "sentinel"  # make sure script type is the first entry
-    meta.update(ass_file.meta.items())
+    meta.update(items)
     meta["ScriptType"] = "v4.00+"
 
     print("[Script Info]", file=handle)
@@ -81,6 +240,11 @@ def write_styles(ass_file: AssFile, handle: T.IO[str]) -> None:
     :param ass_file: ASS file to take the styles from
     :param handle: handle to write the styles to
     """
+    _write_styles_header(handle)
+    _write_lines(ass_file.styles, serialize_style, handle)
+
+
+def _write_styles_header(handle: T.IO[str]) -> None:
     print("[V4+ Styles]", file=handle)
     print(
         "Format: Name, Fontname, Fontsize, PrimaryColour, "
@@ -90,17 +254,22 @@ def write_styles(ass_file: AssFile, handle: T.IO[str]) -> None:
         "MarginL, MarginR, MarginV, Encoding",
         file=handle,
     )
-    for style in ass_file.styles:
-        write_style(style, handle)
 
 
-@functools.lru_cache(maxsize=1024)
 def serialize_style(style: AssStyle) -> str:
     """Serializes ASS style to plain text.
 
+    The result is cached until the style changes.
+
     :param style: ASS style to serialize
     :return: serialized ASS style
     """
+    if style._serialized is None:
+        style._serialized = _serialize_style(style)
+    return style._serialized
+
+
+def _serialize_style(style: AssStyle) -> str:
     return "Style: " + ",".join(
         [
             _serialize_text(style.name),
@@ -145,23 +314,33 @@ def write_events(ass_file: AssFile, handle: T.IO[str]) -> None:
     :param ass_file: ASS file to take the events from
     :param handle: handle to write the events to
     """
+    _write_events_header(handle)
+    _write_lines(ass_file.events, serialize_event, handle)
+
+
+def _write_events_header(handle: T.IO[str]) -> None:
     print("[Events]", file=handle)
     print(
         "Format: Layer, Start, End, Style, Name, "
         "MarginL, MarginR, MarginV, Effect, Text",
         file=handle,
     )
-    for event in ass_file.events:
-        write_event(event, handle)
 
 
-@functools.lru_cache(maxsize=1024)
 def serialize_event(event: AssEvent) -> str:
     """Serializes ASS event to plain text.
 
+    The result is cached until the event changes.
+
     :param event: ASS event to serialize
     :return: serialized ASS event
     """
+    if event._serialized is None:
+        event._serialized = _serialize_event(event)
+    return event._serialized
+
+
+def _serialize_event(event: AssEvent) -> str:
     text = event.text
 
     if event.start is not None and event.end is not None:
@@ -216,3 +395,65 @@ def write_ass(ass_file: AssFile, target: T.Union[Path, T.IO[str]]) -> None:
     write_styles(ass_file, target)
     print("", file=target)
     write_events(ass_file, target)
+
+
+class AssSnapshot(T.NamedTuple):
+    """ASS file contents frozen at some point in time.
+
+    Lines that are already serialized are kept as text and the remaining
+    styles and events are copied, so taking a snapshot is cheap and it can
+    be written on another thread while the file keeps changing.
+    """
+
+    meta: T.List[T.Tuple[str, T.Optional[str]]]
+    styles: T.List[T.Any]
+    events: T.List[T.Any]
+    style_rows: T.List[T.Tuple[T.Tuple[T.Any, ...], ...]]
+    event_rows: T.List[T.Tuple[T.Tuple[T.Any, ...], ...]]
+
+
+def snapshot_ass(ass_file: AssFile) -> AssSnapshot:
+    """Capture ASS file contents to be written later.
+
+    Along with what's needed to write the ASS, the field values of the
+    styles and events are captured, in the order of STYLE_FIELDS and
+    EVENT_FIELDS and in chunks of CHUNK_SIZE items.
+
+    :param ass_file: file to capture
+    :return: captured contents
+    """
+    style_cache = _get_chunk_cache(ass_file.styles)
+    event_cache = _get_chunk_cache(ass_file.events)
+    return AssSnapshot(
+        meta=list(ass_file.meta.items()),
+        styles=style_cache.snapshot(ass_file.styles, serialize_style, copy),
+        events=event_cache.snapshot(
+            ass_file.events, serialize_event, _get_event_fields,
+        ),
+        style_rows=style_cache.rows(ass_file.styles, _get_style_fields),
+        event_rows=event_cache.rows(ass_file.events, _get_event_fields),
+    )
+
+
+def write_ass_snapshot(snapshot: AssSnapshot, handle: T.IO[str]) -> None:
+    """Write captured ASS file contents.
+
+    :param snapshot: contents captured with snapshot_ass
+    :param handle: handle to write the contents to
+    """
+    _write_meta_items(snapshot.meta, handle)
+    print("", file=handle)
+    _write_styles_header(handle)
+    for style in snapshot.styles:
+        handle.write(
+            style if isinstance(style, str) else _serialize_style(style) + "\n"
+        )
+    print("", file=handle)
+    _write_events_header(handle)
+    for event in snapshot.events:
+        handle.write(
+            event
+            if isinstance(event, str)
+            else _serialize_event(T.cast(AssEvent, _EventFields._make(event)))
+            + "\n"
+        )
@@ -0,0 +1,190 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Project sidecar.
+
+The sidecar sits next to an ASS file and holds the same document in a form
+that is much faster to load than parsing the ASS, along with the state of
+the program that the ASS can't express. It is only trusted when the ASS
+file it was made for is unchanged.
+
+Sidecars travel along with the scripts, so they're stored as JSON rather
+than pickled - loading one must never be able to run code.
+"""
+
+import gc
+import hashlib
+import itertools
+import json
+import operator
+import typing as T
+from pathlib import Path
+
+from bubblesub.fmt.ass.event import EVENT_FIELDS, AssEvent
+from bubblesub.fmt.ass.file import AssFile
+from bubblesub.fmt.ass.style import STYLE_FIELDS, AssColor, AssStyle
+from bubblesub.fmt.ass.writer import AssSnapshot
+from bubblesub.util import write_file_atomically
+
+SIDECAR_SUFFIX = ".bubblesub"
+SIDECAR_VERSION = 2
+
+STYLE_COLOR_FIELDS = range(3, 7)
+
+
+def _get_field_types(values: T.Iterable[T.Any]) -> T.List[T.Any]:
+    return [
+        (int, float)
+        if isinstance(value, float)
+        else list
+        if isinstance(value, AssColor)
+        else type(value)
+        for value in values
+    ]
+
+
+# the types the fields of the default items have in JSON
+_EVENT_FIELD_TYPES = _get_field_types(
+    operator.attrgetter(*EVENT_FIELDS)(AssEvent())
+)
+_STYLE_FIELD_TYPES = _get_field_types(
+    operator.attrgetter(*STYLE_FIELDS)(AssStyle(name=""))
+)
+
+
+def get_sidecar_path(path: Path) -> Path:
+    """Return path to the sidecar of the specified ASS file.
+
+    :param path: path to the ASS file
+    :return: path to the sidecar
+    """
+    return path.with_name(path.name + SIDECAR_SUFFIX)
+
+
+def _get_integrity(path: Path) -> T.List[T.Any]:
+    stat = path.stat()
+    return [
+        stat.st_mtime_ns,
+        stat.st_size,
+        hashlib.sha1(path.read_bytes()).hexdigest(),
+    ]
+
+
+def write_sidecar(
+    path: Path, snapshot: AssSnapshot, state: T.Dict[str, T.Any]
+) -> None:
+    """Write sidecar for the specified ASS file.
+
+    Must be called after the ASS file is written, since the sidecar records
+    which version of it it matches.
+
+    :param path: path to the ASS file
+    :param snapshot: ASS file contents captured with snapshot_ass
+    :param state: other state to persist
+    """
+    data = dict(state)
+    data["meta"] = snapshot.meta
+    data["styles"] = list(itertools.chain.from_iterable(snapshot.style_rows))
+    data["events"] = list(itertools.chain.from_iterable(snapshot.event_rows))
+    data["version"] = SIDECAR_VERSION
+    data["integrity"] = _get_integrity(path)
+    write_file_atomically(
+        get_sidecar_path(path),
+        json.dumps(data, separators=(",", ":")).encode(),
+    )
+
+
+def read_sidecar(
+    path: Path, ass_file: AssFile
+) -> T.Optional[T.Dict[str, T.Any]]:
+    """Load ASS file contents from its sidecar.
+
+    :param path: path to the ASS file
+    :param ass_file: file to load to
+    :return: sidecar contents if the sidecar exists and matches the ASS file,
+        None otherwise, in which case the ASS file is left untouched
+    """
+    sidecar_path = get_sidecar_path(path)
+    if not sidecar_path.exists():
+        return None
+    # the objects built below are all long lived, so the cyclic garbage
+    # collector scanning them over and over is wasted work
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _read_sidecar(path, sidecar_path, ass_file)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _read_sidecar(
+    path: Path, sidecar_path: Path, ass_file: AssFile
+) -> T.Optional[T.Dict[str, T.Any]]:
+    try:
+        data = json.loads(sidecar_path.read_bytes())
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != SIDECAR_VERSION
+        ):
+            return None
+        if data["integrity"] != _get_integrity(path):
+            return None
+        _check_meta(data["meta"])
+        for row in data["styles"]:
+            _check_row(row, _STYLE_FIELD_TYPES)
+            for i in STYLE_COLOR_FIELDS:
+                _check_row(row[i], [int] * 4)
+        for row in data["events"]:
+            _check_row(row, _EVENT_FIELD_TYPES)
+        styles = [
+            AssStyle(
+                *[
+                    AssColor(*value) if i in STYLE_COLOR_FIELDS else value
+                    for i, value in enumerate(row)
+                ]
+            )
+            for row in data["styles"]
+        ]
+        events = [AssEvent(*row) for row in data["events"]]
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+    ass_file.events.clear()
+    ass_file.styles.clear()
+    ass_file.meta.clear()
+    ass_file.meta.update(dict(data["meta"]))
+    ass_file.styles.append(*styles)
+    ass_file.events.append(*events)
+    return T.cast(T.Dict[str, T.Any], data)
+
+
+def _check_meta(meta: T.Any) -> None:
+    if not isinstance(meta, list):
+        raise ValueError("bad meta")
+    for item in meta:
+        _check_row(item, [str, (str, type(None))])
+
+
+def _check_row(row: T.Any, field_types: T.List[T.Any]) -> None:
+    # sidecars can be edited by hand or come from other versions, and the
+    # items must not end up holding values of unexpected types
+    if (
+        not isinstance(row, list)
+        or len(row) != len(field_types)
+        or not all(map(isinstance, row, field_types))
+    ):
+        raise ValueError("bad row")
@@ -16,9 +16,15 @@
 
 """Common containers, decorators, etc."""
 
+import bisect
+import heapq
+import math
 import typing as T
 
 from PyQt5 import QtCore
+from sortedcontainers import SortedList
+
+from bubblesub.util import make_ranges
 
 TItem = T.TypeVar("TItem")
 
@@ -28,8 +34,23 @@ class ObservableObject:
 
     def __init__(self) -> None:
         """Initialize self."""
-        self._setattr_impl = self._setattr_normal
-        self._dirty = False
+        self._changed_props: T.FrozenSet[str]
+        # bypass __setattr__, subclasses may be instantiated in bulk
+        self.__dict__.update(
+            _setattr_impl=self._setattr_normal,
+            _dirty=False,
+            _changed_props=frozenset(),
+        )
+
+    @property
+    def changed_properties(self) -> T.FrozenSet[str]:
+        """Return names of the properties that triggered current change.
+
+        Meaningful only within ._after_change() and the handlers it invokes.
+
+        :return: set of property names
+        """
+        return self._changed_props
 
     def __setattr__(self, prop: str, new_value: T.Any) -> None:
         """Set attribute.
@@ -43,14 +64,15 @@ class ObservableObject:
         """
         if prop.startswith("_"):
             super().__setattr__(prop, new_value)
+        elif prop not in self.__dict__ and not hasattr(type(self), prop):
+            # first assignment, usually from the constructor - avoid the
+            # costly AttributeError round trip, which matters when building
+            # hundreds of thousands of objects at once
+            super().__setattr__(prop, new_value)
         else:
-            try:
-                old_value = getattr(self, prop)
-            except AttributeError:
-                super().__setattr__(prop, new_value)
-            else:
-                if new_value != old_value:
-                    self._setattr_impl(prop, new_value)
+            old_value = getattr(self, prop)
+            if new_value != old_value:
+                self._setattr_impl(prop, new_value)
 
     def _setattr_normal(self, prop: str, new_value: T.Any) -> None:
         """Regular implementation of attribute setter.
@@ -62,7 +84,9 @@ class ObservableObject:
         """
         self._before_change()
         super().__setattr__(prop, new_value)
+        self._changed_props = frozenset({prop})
         self._after_change()
+        self._changed_props = frozenset()
 
     def _setattr_throttled(self, prop: str, new_value: T.Any) -> None:
         """Throttled implementation of attribute setter.
@@ -76,6 +100,7 @@ class ObservableObject:
         if not self._dirty:
             self._before_change()
         super().__setattr__(prop, new_value)
+        self._changed_props = self._changed_props | {prop}
         self._dirty = True
 
     def begin_update(self) -> None:
@@ -98,6 +123,7 @@ class ObservableObject:
             self._after_change()
         self._setattr_impl = self._setattr_normal
         self._dirty = False
+        self._changed_props = frozenset()
 
     def _before_change(self) -> None:
         """Meant to be overriden by the user.
@@ -114,6 +140,7 @@ class ObservableObject:
 
 class _ObservableListSignals(QtCore.QObject):
     # QObject doesn't play nice with multiple inheritance, hence composition
+    item_about_to_be_modified = QtCore.pyqtSignal([int])
     item_modified = QtCore.pyqtSignal([int])
     items_about_to_be_inserted = QtCore.pyqtSignal([int, int])
     items_about_to_be_removed = QtCore.pyqtSignal([int, int])
@@ -126,6 +153,9 @@ class _ObservableListSignals(QtCore.QObject):
 class ObservableList(T.Generic[TItem]):
     """Alternative to QtCore.QAbstractListModel that simplifies indexing."""
 
+    item_about_to_be_modified = property(
+        lambda self: self._signals.item_about_to_be_modified
+    )
     item_modified = property(lambda self: self._signals.item_modified)
     items_about_to_be_inserted = property(
         lambda self: self._signals.items_about_to_be_inserted
@@ -336,3 +366,261 @@ class ObservableList(T.Generic[TItem]):
         """
         self.clear()
         self.insert(0, *values)
+
+
+class IntervalIndex(T.Generic[TItem]):
+    """Index of items spanning closed time intervals.
+
+    Items are grouped in buckets by the bit length of their interval
+    length, and kept sorted by their interval start within each bucket.
+    Intervals in a bucket are at most twice as long as one another, so
+    a query visits only the entries that start shortly before the queried
+    range, regardless of how long the longest interval is.
+    """
+
+    def __init__(self) -> None:
+        """Initialize self."""
+        self._buckets: T.Dict[int, SortedList] = {}
+        self._items: T.Dict[int, T.Tuple[int, int, TItem]] = {}
+
+    def __len__(self) -> int:
+        """Return how many items the index contains.
+
+        :return: number of items
+        """
+        return len(self._items)
+
+    def add(self, item: TItem, start: int, end: int) -> None:
+        """Add an item to the index or update its interval.
+
+        :param item: item to add
+        :param start: interval start
+        :param end: interval end
+        """
+        start, end = min(start, end), max(start, end)
+        old_entry = self._items.get(id(item))
+        if old_entry is not None:
+            if old_entry[0] == start and old_entry[1] == end:
+                return
+            self.discard(item)
+        self._items[id(item)] = (start, end, item)
+        bucket_key = _get_bucket_key(start, end)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = SortedList()
+        bucket.add((start, end, id(item)))
+
+    def update(self, entries: T.Iterable[T.Tuple[TItem, int, int]]) -> None:
+        """Add many items to the index at once.
+
+        Faster than calling .add() for each of them.
+
+        :param entries: tuples with the item, interval start and interval end
+        """
+        new_entries: T.Dict[int, T.List[T.Tuple[int, int, int]]] = {}
+        for item, start, end in entries:
+            if id(item) in self._items:
+                self.add(item, start, end)
+                continue
+            start, end = min(start, end), max(start, end)
+            self._items[id(item)] = (start, end, item)
+            new_entries.setdefault(_get_bucket_key(start, end), []).append(
+                (start, end, id(item))
+            )
+        for bucket_key, bucket_entries in new_entries.items():
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                self._buckets[bucket_key] = SortedList(bucket_entries)
+            else:
+                bucket.update(bucket_entries)
+
+    def discard(self, item: TItem) -> None:
+        """Remove an item from the index, if it's there.
+
+        :param item: item to remove
+        """
+        entry = self._items.pop(id(item), None)
+        if entry is None:
+            return
+        start, end, _item = entry
+        bucket_key = _get_bucket_key(start, end)
+        bucket = self._buckets[bucket_key]
+        bucket.remove((start, end, id(item)))
+        if not bucket:
+            del self._buckets[bucket_key]
+
+    def clear(self) -> None:
+        """Remove all items from the index."""
+        self._buckets.clear()
+        self._items.clear()
+
+    def overlapping(self, start: int, end: int) -> T.Iterator[TItem]:
+        """Iterate over items whose intervals overlap given range.
+
+        Both ends of the intervals and of the range are inclusive.
+
+        :param start: range start
+        :param end: range end
+        :return: iterator over items, ordered by their interval start
+        """
+        matches = [
+            self._overlapping_in_bucket(bucket_key, start, end)
+            for bucket_key in self._buckets
+        ]
+        if len(matches) == 1:
+            entries: T.Iterable[T.Tuple[int, int, int]] = matches[0]
+        else:
+            entries = heapq.merge(*matches)
+        for _entry_start, _entry_end, key in entries:
+            yield self._items[key][2]
+
+    def _overlapping_in_bucket(
+        self, bucket_key: int, start: int, end: int
+    ) -> T.Iterator[T.Tuple[int, int, int]]:
+        # the longest interval in the bucket bounds how far before the
+        # range an overlapping interval can start
+        max_length = (1 << bucket_key) - 1
+        for entry in self._buckets[bucket_key].irange(
+            minimum=(start - max_length,), maximum=(end, math.inf),
+        ):
+            if entry[1] >= start:
+                yield entry
+
+
+def _get_bucket_key(start: int, end: int) -> int:
+    return math.ceil(end - start).bit_length()
+
+
+class RangeSet:
+    """Immutable set of integers stored as sorted, disjoint ranges.
+
+    Suited for selections, which tend to consist of a few long runs of
+    consecutive indexes.
+    """
+
+    def __init__(self, items: T.Iterable[int] = ()) -> None:
+        """Initialize self.
+
+        :param items: initial content
+        """
+        self._starts: T.List[int] = []
+        self._ends: T.List[int] = []
+        for start, count in make_ranges(set(items)):
+            self._starts.append(start)
+            self._ends.append(start + count)
+        self._list: T.Optional[T.List[int]] = None
+
+    @classmethod
+    def _from_bounds(cls, bounds: T.Iterable[T.Tuple[int, int]]) -> "RangeSet":
+        ret = cls()
+        for start, end in bounds:
+            if start >= end:
+                continue
+            if ret._ends and ret._ends[-1] == start:
+                ret._ends[-1] = end
+            else:
+                ret._starts.append(start)
+                ret._ends.append(end)
+        return ret
+
+    def __contains__(self, item: T.Any) -> bool:
+        """Return whether the set contains given number.
+
+        :param item: number to look up
+        :return: whether the set contains given number
+        """
+        pos = bisect.bisect_right(self._starts, item) - 1
+        return pos >= 0 and item < self._ends[pos]
+
+    def __len__(self) -> int:
+        """Return how many numbers the set contains.
+
+        :return: number of items
+        """
+        return sum(end - start for start, end in zip(self._starts, self._ends))
+
+    def __iter__(self) -> T.Iterator[int]:
+        """Iterate over the numbers in ascending order.
+
+        :return: iterator
+        """
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end)
+
+    def __eq__(self, other: T.Any) -> T.Any:
+        """Whether two RangeSets contain the same numbers.
+
+        :param other: object to compare self with
+        :return: bool or NotImplemented to fall back to default implementation
+        """
+        if isinstance(other, RangeSet):
+            return self._starts == other._starts and self._ends == other._ends
+        return NotImplemented
+
+    def __getstate__(self) -> T.Any:
+        """Return the state to pickle, without the cached list.
+
+        :return: bounds of the ranges
+        """
+        return (self._starts, self._ends)
+
+    def __setstate__(self, state: T.Any) -> None:
+        """Restore pickled state.
+
+        :param state: bounds of the ranges
+        """
+        self._starts, self._ends = state
+        self._list = None
+
+    def __ne__(self, other: T.Any) -> T.Any:
+        """Opposite of __eq__.
+
+        :param other: object to compare self with
+        :return: bool or NotImplemented to fall back to default implementation
+        """
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    @property
+    def ranges(self) -> T.List[T.Tuple[int, int]]:
+        """Return the ranges as (start, count) tuples.
+
+        :return: list of ranges in ascending order
+        """
+        return [
+            (start, end - start)
+            for start, end in zip(self._starts, self._ends)
+        ]
+
+    def to_list(self) -> T.List[int]:
+        """Return the numbers as a sorted list.
+
+        The list is cached and shared between calls, so it must not be
+        modified.
+
+        :return: sorted list of numbers
+        """
+        if self._list is None:
+            self._list = list(self)
+        return self._list
+
+    def remove_and_shift(self, idx: int, count: int) -> "RangeSet":
+        """Return a copy with given range removed and the numbers that
+        follow it shifted back to fill the gap.
+
+        Mirrors what happens to list indexes when list items get removed.
+
+        :param idx: where to start the removal
+        :param count: how many numbers to remove
+        :return: new set
+        """
+        bounds: T.List[T.Tuple[int, int]] = []
+        removal_end = idx + count
+        for start, end in zip(self._starts, self._ends):
+            if start < idx:
+                bounds.append((start, min(end, idx)))
+            if end > removal_end:
+                bounds.append((max(start, removal_end) - count, end - count))
+        return RangeSet._from_bounds(bounds)
@@ -0,0 +1,191 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.api.journal module."""
+
+import tempfile
+import typing as T
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from bubblesub.api.journal import JournalApi, _is_process_alive, read_journal
+from bubblesub.api.subs import SubtitlesApi
+from bubblesub.fmt.ass.event import AssEvent
+from bubblesub.fmt.ass.style import AssStyle
+
+
+@pytest.fixture(name="journal_dir")
+def fixture_journal_dir() -> T.Iterator[Path]:
+    """Redirect journals to a temporary directory.
+
+    :return: path to the temporary directory
+    """
+    with tempfile.TemporaryDirectory() as dir_name:
+        with patch(
+            "bubblesub.api.journal.get_journal_dir",
+            return_value=Path(dir_name),
+        ):
+            yield Path(dir_name)
+
+
+@patch("bubblesub.api.journal.QtCore.QTimer")
+def test_journal_replay(timer_mock: Mock, journal_dir: Path) -> None:
+    """Test that replaying the journal reproduces the document.
+
+    :param timer_mock: mock to QTimer class
+    :param journal_dir: directory to store the journal in
+    """
+    subs_api = SubtitlesApi(Mock(), Mock())
+    journal_api = JournalApi(Mock(), subs_api, Mock())
+
+    subs_api.events.append(*[AssEvent(text=str(i)) for i in range(5)])
+    assert not journal_api.path.exists()
+    journal_api.flush()
+    assert journal_api.path.exists()
+
+    subs_api.events[1].text = "modified"
+    subs_api.events.remove(0, 1)
+    subs_api.events[3].start = 100
+    subs_api.events.move(3, 1, 0)
+    subs_api.events.insert(1, AssEvent(text="inserted"))
+    subs_api.styles.append(AssStyle(name="style"))
+    subs_api.meta.set("key", "value")
+    journal_api.flush()
+
+    doc_path, ass_file = read_journal(journal_api.path)
+    assert doc_path is None
+    assert [event.text for event in ass_file.events] == [
+        "4",
+        "inserted",
+        "modified",
+        "2",
+        "3",
+    ]
+    assert ass_file.events[0].start == 100
+    assert [style.name for style in ass_file.styles] == ["style"]
+    assert ass_file.meta.get("key") == "value"
+
+    journal_api.close()
+    assert not journal_api.path.exists()
+    assert list(journal_dir.iterdir()) == []
+
+
+@patch("bubblesub.api.journal.QtCore.QTimer")
+def test_journal_truncated(timer_mock: Mock, journal_dir: Path) -> None:
+    """Test that an incomplete trailing record is ignored.
+
+    :param timer_mock: mock to QTimer class
+    :param journal_dir: directory to store the journal in
+    """
+    subs_api = SubtitlesApi(Mock(), Mock())
+    journal_api = JournalApi(Mock(), subs_api, Mock())
+
+    subs_api.events.append(AssEvent(text="first"))
+    journal_api.flush()
+    subs_api.events.append(AssEvent(text="second"))
+    journal_api.flush()
+
+    path = journal_dir / "1.journal"
+    path.write_bytes(journal_api.path.read_bytes()[:-5])
+    _doc_path, ass_file = read_journal(path)
+    assert [event.text for event in ass_file.events] == ["first"]
+
+
+@patch("bubblesub.api.journal.QtCore.QTimer")
+def test_journal_load_discards(timer_mock: Mock, journal_dir: Path) -> None:
+    """Test that loading a document starts the journal anew.
+
+    :param timer_mock: mock to QTimer class
+    :param journal_dir: directory to store the journal in
+    """
+    subs_api = SubtitlesApi(Mock(), Mock())
+    journal_api = JournalApi(Mock(), subs_api, Mock())
+
+    subs_api.events.append(AssEvent(text="first"))
+    subs_api.loaded.emit()
+    journal_api.flush()
+    assert list(journal_dir.iterdir()) == []
+
+
+@patch("bubblesub.api.journal.JOURNAL_SYNC_INTERVAL", 3)
+@patch("bubblesub.api.journal.os.fsync")
+@patch("bubblesub.api.journal.QtCore.QTimer")
+def test_journal_sync(
+    timer_mock: Mock, fsync_mock: Mock, journal_dir: Path
+) -> None:
+    """Test that the journal is synced to the disk every few records.
+
+    :param timer_mock: mock to QTimer class
+    :param fsync_mock: mock to os.fsync
+    :param journal_dir: directory to store the journal in
+    """
+    subs_api = SubtitlesApi(Mock(), Mock())
+    journal_api = JournalApi(Mock(), subs_api, Mock())
+
+    subs_api.events.append(AssEvent(text="first"))
+    journal_api.flush()
+    assert fsync_mock.call_count == 1
+
+    for i in range(2):
+        subs_api.events.append(AssEvent(text=str(i)))
+        journal_api.flush()
+    assert fsync_mock.call_count == 1
+
+    subs_api.events.append(AssEvent(text="third"))
+    journal_api.flush()
+    assert fsync_mock.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "handle,last_error,exit_code,expected",
+    [
+        (None, 87, 0, False),
+        (None, 5, 0, True),
+        (1, 0, 259, True),
+        (1, 0, 0, False),
+    ],
+)
+@patch("bubblesub.api.journal.os.name", "nt")
+def test_is_process_alive_windows(
+    handle: T.Optional[int], last_error: int, exit_code: int, expected: bool
+) -> None:
+    """Test checking whether a process is running on Windows.
+
+    :param handle: process handle returned by OpenProcess
+    :param last_error: error code set by OpenProcess
+    :param exit_code: exit code returned by GetExitCodeProcess
+    :param expected: whether the process should count as running
+    """
+    kernel32 = Mock()
+    kernel32.OpenProcess.return_value = handle
+
+    kernel32.GetExitCodeProcess.side_effect = lambda _handle, ref: (
+        setattr(ref._obj, "value", exit_code) or 1
+    )
+    with patch(
+        "bubblesub.api.journal.ctypes.WinDLL",
+        return_value=kernel32,
+        create=True,
+    ), patch(
+        "bubblesub.api.journal.ctypes.get_last_error",
+        return_value=last_error,
+        create=True,
+    ):
+        assert _is_process_alive(1234) == expected
+    if handle:
+        kernel32.CloseHandle.assert_called_once()
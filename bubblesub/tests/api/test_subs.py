@@ -0,0 +1,239 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.api.subs module."""
+
+import copy
+import json
+import pickle
+import tempfile
+from pathlib import Path
+from unittest.mock import MagicMock, Mock, patch
+
+from bubblesub.api.subs import SubtitlesApi
+from bubblesub.fmt.ass.event import AssEvent
+from bubblesub.fmt.ass.style import AssStyle
+from bubblesub.fmt.sidecar import SIDECAR_VERSION, get_sidecar_path
+
+
+def _make_cfg(project_sidecar: bool = False) -> Mock:
+    cfg = Mock()
+    cfg.opt = MagicMock()
+    cfg.opt.__getitem__.return_value = {"project_sidecar": project_sidecar}
+    return cfg
+
+
+def test_versions() -> None:
+    """Test that change counters are bumped by relevant model changes."""
+    subs_api = SubtitlesApi(Mock(), Mock())
+    subs_api.events.append(AssEvent(start=0, end=100))
+    subs_api.styles.append(AssStyle(name="Default"))
+    versions = (
+        subs_api.timing_version,
+        subs_api.text_version,
+        subs_api.style_version,
+    )
+
+    subs_api.events[0].start = 50
+    assert subs_api.timing_version == versions[0] + 1
+    assert subs_api.text_version == versions[1]
+
+    subs_api.events[0].text = "test"
+    assert subs_api.timing_version == versions[0] + 1
+    assert subs_api.text_version == versions[1] + 1
+    assert subs_api.style_version == versions[2]
+
+    subs_api.events[0].begin_update()
+    subs_api.events[0].end = 200
+    subs_api.events[0].actor = "actor"
+    subs_api.events[0].end_update()
+    assert subs_api.timing_version == versions[0] + 2
+    assert subs_api.text_version == versions[1] + 2
+
+    subs_api.styles[0].font_size = 30
+    assert subs_api.style_version == versions[2] + 1
+
+
+def test_selection_follows_removal() -> None:
+    """Test that removing events updates the selection."""
+    subs_api = SubtitlesApi(Mock(), Mock())
+    subs_api.events.append(*[AssEvent() for _ in range(10)])
+    subs_api.selected_indexes = [7, 1, 2, 5]
+    assert subs_api.selected_indexes == [1, 2, 5, 7]
+    assert subs_api.is_selected(2)
+    assert not subs_api.is_selected(3)
+
+    subs_api.events.remove(2, 4)
+    assert subs_api.selected_indexes == [1, 3]
+    assert subs_api.has_selection
+
+    subs_api.events.clear()
+    assert subs_api.selected_indexes == []
+    assert not subs_api.has_selection
+
+
+def test_save_ass() -> None:
+    """Test that saving writes the state from when the save was requested."""
+    threading_api = Mock()
+    subs_api = SubtitlesApi(_make_cfg(), threading_api)
+    subs_api.events.append(AssEvent(text="before"))
+    saved_mock = Mock()
+    subs_api.saved.connect(saved_mock)
+
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.ass"
+        subs_api.save_ass(path, remember_path=True)
+        subs_api.events[0].text = "after"
+        saved_mock.assert_not_called()
+
+        func, callback = threading_api.schedule_write_task.call_args[0]
+        callback(func())
+        subs_api.wait_for_save()
+
+        assert "before" in path.read_text()
+        assert list(Path(dir_name).iterdir()) == [path]
+        assert subs_api.path == path
+        saved_mock.assert_called_once()
+
+
+def test_save_ass_superseded() -> None:
+    """Test that an outdated save doesn't overwrite a newer one."""
+    threading_api = Mock()
+    subs_api = SubtitlesApi(_make_cfg(), threading_api)
+    subs_api.events.append(AssEvent(text="first"))
+
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.ass"
+        subs_api.save_ass(path)
+        subs_api.events[0].text = "second"
+        subs_api.save_ass(path)
+
+        old_call, new_call = threading_api.schedule_write_task.call_args_list
+        new_call[0][0]()
+        assert old_call[0][0]().superseded
+        assert "second" in path.read_text()
+
+
+def test_save_ass_callbacks() -> None:
+    """Test that save outcomes are reported to every caller."""
+    threading_api = Mock()
+    subs_api = SubtitlesApi(_make_cfg(), threading_api)
+    saved_mock = Mock()
+    subs_api.saved.connect(saved_mock)
+
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "missing" / "test.ass"
+        first_callback = Mock()
+        second_callback = Mock()
+        subs_api.save_ass(
+            path, remember_path=True, complete_callback=first_callback
+        )
+        subs_api.save_ass(
+            path, remember_path=True, complete_callback=second_callback
+        )
+
+        old_call, new_call = threading_api.schedule_write_task.call_args_list
+        for call in (new_call, old_call):
+            func, callback = call[0]
+            callback(func())
+        subs_api.wait_for_save()
+
+    saved_mock.assert_not_called()
+    assert isinstance(first_callback.call_args[0][0], OSError)
+    assert first_callback.call_args == second_callback.call_args
+
+
+def test_project_sidecar() -> None:
+    """Test that the sidecar is used when loading an unchanged file."""
+    threading_api = Mock()
+    threading_api.schedule_write_task.side_effect = lambda func, callback: callback(
+        func()
+    )
+    subs_api = SubtitlesApi(_make_cfg(project_sidecar=True), threading_api)
+    subs_api.events.append(*[AssEvent(text=str(i)) for i in range(3)])
+    subs_api.styles.append(AssStyle(name="style"))
+    subs_api.meta.set("key", "value")
+    subs_api.selected_indexes = [1, 2]
+
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.ass"
+        subs_api.save_ass(path)
+        assert get_sidecar_path(path).exists()
+
+        with patch("bubblesub.api.subs.load_ass") as load_ass_mock:
+            subs_api.load_ass(path)
+            load_ass_mock.assert_not_called()
+        assert [event.text for event in subs_api.events] == ["0", "1", "2"]
+        assert [style.name for style in subs_api.styles] == ["style"]
+        assert subs_api.meta.get("key") == "value"
+        assert subs_api.selected_indexes == [1, 2]
+
+        path.write_text(path.read_text().replace("}2\n", "}changed\n"))
+        subs_api.load_ass(path)
+        assert subs_api.events[2].text == "changed"
+        assert subs_api.selected_indexes == []
+
+
+def test_project_sidecar_bad_rows() -> None:
+    """Test that sidecars with unexpected values are never loaded."""
+    threading_api = Mock()
+    threading_api.schedule_write_task.side_effect = lambda func, callback: callback(
+        func()
+    )
+    subs_api = SubtitlesApi(_make_cfg(project_sidecar=True), threading_api)
+    subs_api.events.append(AssEvent(text="text"))
+    subs_api.styles.append(AssStyle(name="style"))
+
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.ass"
+        subs_api.save_ass(path)
+        sidecar_path = get_sidecar_path(path)
+        data = json.loads(sidecar_path.read_text())
+        for key, idx, field_idx, value in [
+            ("events", 0, 4, 5),
+            ("events", 0, 11, 1),
+            ("styles", 0, 3, [1, 2, 3]),
+            ("styles", 0, 3, [1, 2, 3, "4"]),
+            ("meta", 0, 1, 5),
+        ]:
+            bad_data = copy.deepcopy(data)
+            if key == "meta":
+                bad_data[key] = [["key", "value"]]
+            bad_data[key][idx][field_idx] = value
+            sidecar_path.write_text(json.dumps(bad_data))
+            with patch("bubblesub.api.subs.load_ass") as load_ass_mock:
+                subs_api.load_ass(path)
+                load_ass_mock.assert_called_once()
+
+        data["events"][0].pop()
+        sidecar_path.write_text(json.dumps(data))
+        with patch("bubblesub.api.subs.load_ass") as load_ass_mock:
+            subs_api.load_ass(path)
+            load_ass_mock.assert_called_once()
+
+
+def test_project_sidecar_pickle() -> None:
+    """Test that pickled sidecars are never loaded."""
+    subs_api = SubtitlesApi(_make_cfg(project_sidecar=True), Mock())
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.ass"
+        path.write_text("[Script Info]\n")
+        get_sidecar_path(path).write_bytes(
+            pickle.dumps({"version": SIDECAR_VERSION})
+        )
+        with patch("bubblesub.api.subs.load_ass") as load_ass_mock:
+            subs_api.load_ass(path)
+            load_ass_mock.assert_called_once()
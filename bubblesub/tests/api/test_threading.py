@@ -0,0 +1,54 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.api.threading module."""
+
+import threading
+from unittest.mock import MagicMock, Mock
+
+from PyQt5 import QtCore
+
+from bubblesub.api.threading import ThreadingApi
+
+
+class _BlockingRunnable(QtCore.QRunnable):
+    def __init__(self, release: threading.Event) -> None:
+        """Initialize self.
+
+        :param release: event to wait for before finishing
+        """
+        super().__init__()
+        self._release = release
+
+    def run(self) -> None:
+        """Block until released."""
+        self._release.wait(10)
+
+
+def test_write_task_skips_busy_pool() -> None:
+    """Test that writer tasks run while the shared pool is occupied."""
+    threading_api = ThreadingApi(MagicMock())
+    # pylint: disable=protected-access
+    threading_api._thread_pool.setMaxThreadCount(1)
+    release = threading.Event()
+    written = threading.Event()
+    threading_api.schedule_runnable(_BlockingRunnable(release))
+    try:
+        threading_api.schedule_write_task(written.set, Mock())
+        assert written.wait(5)
+    finally:
+        release.set()
+        threading_api._thread_pool.waitForDone()
@@ -0,0 +1,340 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.api.undo module."""
+
+import tempfile
+import typing as T
+from pathlib import Path
+from unittest.mock import MagicMock, Mock, patch
+
+from bubblesub.api.subs import SubtitlesApi
+from bubblesub.api.undo import UndoApi, UndoBlobPool
+from bubblesub.fmt.ass.event import AssEvent
+from bubblesub.fmt.ass.style import AssStyle
+
+
+def _make_apis(
+    max_undo: int = 0, max_undo_memory_mb: int = 0
+) -> T.Tuple[SubtitlesApi, UndoApi]:
+    cfg = Mock()
+    cfg.opt = MagicMock()
+    cfg.opt.__getitem__.return_value = {
+        "max_undo": max_undo,
+        "max_undo_memory_mb": max_undo_memory_mb,
+    }
+    subs_api = SubtitlesApi(Mock(), Mock())
+    undo_api = UndoApi(cfg, subs_api)
+    subs_api.events.append(*[AssEvent(text=str(i)) for i in range(5)])
+    subs_api.styles.append(AssStyle(name="Default"))
+    subs_api.loaded.emit()
+    return subs_api, undo_api
+
+
+def _get_state(subs_api: SubtitlesApi) -> T.Any:
+    return (
+        [(event.start, event.text, event.actor) for event in subs_api.events],
+        [(style.name, style.bold) for style in subs_api.styles],
+        dict(subs_api.meta.items()),
+    )
+
+
+def test_undo_redo() -> None:
+    """Test that undoing and redoing every kind of change restores state."""
+    subs_api, undo_api = _make_apis()
+    assert not undo_api.has_undo
+    states = [_get_state(subs_api)]
+
+    operations: T.List[T.Callable[[], None]] = [
+        lambda: subs_api.events.insert(1, AssEvent(text="new")),
+        lambda: subs_api.events.remove(2, 2),
+        lambda: subs_api.events.move(0, 2, 1),
+        lambda: setattr(subs_api.events[1], "text", "changed"),
+        lambda: subs_api.events.replace(list(subs_api.events)[::-1]),
+        lambda: setattr(subs_api.styles[0], "bold", False),
+        lambda: subs_api.meta.set("key", "value"),
+    ]
+    for operation in operations:
+        with undo_api.capture():
+            operation()
+        states.append(_get_state(subs_api))
+    assert len(set(map(repr, states))) == len(states)
+
+    for state in reversed(states[:-1]):
+        undo_api.undo()
+        assert _get_state(subs_api) == state
+    assert not undo_api.has_undo
+
+    for state in states[1:]:
+        undo_api.redo()
+        assert _get_state(subs_api) == state
+    assert not undo_api.has_redo
+
+
+def test_undo_modifies_in_place() -> None:
+    """Test that undoing a modification doesn't replace the event."""
+    subs_api, undo_api = _make_apis()
+    event = subs_api.events[2]
+    with undo_api.capture():
+        event.begin_update()
+        event.start = 100
+        event.actor = "actor"
+        event.end_update()
+    undo_api.undo()
+    assert subs_api.events[2] is event
+    assert event.start == 0
+    assert event.actor == ""
+    undo_api.redo()
+    assert subs_api.events[2] is event
+    assert event.start == 100
+    assert event.actor == "actor"
+
+
+def test_undo_nothing_changed() -> None:
+    """Test that operations that change nothing aren't pushed."""
+    subs_api, undo_api = _make_apis()
+    with undo_api.capture():
+        subs_api.events[0].text = "0"
+    assert not undo_api.has_undo
+    assert not undo_api.needs_save
+
+
+def test_undo_no_net_change() -> None:
+    """Test that operations that end up changing nothing aren't pushed."""
+    subs_api, undo_api = _make_apis()
+    with undo_api.capture():
+        subs_api.events[0].text = "changed"
+        subs_api.events[0].actor = "actor"
+        subs_api.events[0].text = "0"
+        subs_api.events[0].actor = ""
+        subs_api.meta.set("Title", "title")
+        subs_api.meta.clear()
+    assert not undo_api.has_undo
+    assert not undo_api.needs_save
+
+    with undo_api.capture():
+        subs_api.events[0].text = "changed"
+        subs_api.events[1].text = "changed"
+        subs_api.events[0].text = "0"
+    assert undo_api.has_undo
+    undo_api.undo()
+    assert [event.text for event in subs_api.events] == list("01234")
+
+
+def test_undo_ignores_loading() -> None:
+    """Test that the items replaced by loading aren't recorded."""
+    subs_api, undo_api = _make_apis()
+    subs_api._cfg = MagicMock()  # pylint: disable=protected-access
+    with patch.object(
+        undo_api, "_get_rows", wraps=undo_api._get_rows
+    ) as get_rows_mock:
+        subs_api.unload()
+        get_rows_mock.assert_not_called()
+    assert not undo_api.has_undo
+    assert not undo_api.needs_save
+    assert len(subs_api.events) == 0
+
+
+def test_undo_discards_uncaptured_changes() -> None:
+    """Test that undoing drops changes made since the last push."""
+    subs_api, undo_api = _make_apis()
+    with undo_api.capture():
+        subs_api.events[0].text = "first"
+    subs_api.events.remove(0, 1)
+    undo_api.undo()
+    assert [event.text for event in subs_api.events] == list("01234")
+
+
+def test_undo_selection() -> None:
+    """Test that undoing restores the selection."""
+    subs_api, undo_api = _make_apis()
+    subs_api.selected_indexes = [1]
+    with undo_api.capture():
+        subs_api.events[1].text = "changed"
+        subs_api.selected_indexes = [3]
+    undo_api.undo()
+    assert subs_api.selected_indexes == []
+    undo_api.redo()
+    assert subs_api.selected_indexes == [3]
+
+
+def test_undo_max_undo() -> None:
+    """Test that the oldest entries are discarded."""
+    subs_api, undo_api = _make_apis(max_undo=3)
+    for i in range(5):
+        with undo_api.capture():
+            subs_api.events[0].text = f"changed {i}"
+    undo_api.undo()
+    assert not undo_api.has_undo
+    assert subs_api.events[0].text == "changed 3"
+
+
+def test_needs_save() -> None:
+    """Test that undoing back to the loaded state clears unsaved changes."""
+    subs_api, undo_api = _make_apis()
+    assert not undo_api.needs_save
+    with undo_api.capture():
+        subs_api.events[0].text = "changed"
+    assert undo_api.needs_save
+    undo_api.undo()
+    assert not undo_api.needs_save
+
+
+def test_needs_save_after_save() -> None:
+    """Test that saving marks the state that was being saved as saved."""
+    subs_api, undo_api = _make_apis()
+    with undo_api.capture():
+        subs_api.events[0].text = "changed"
+    subs_api.about_to_save.emit()
+    with undo_api.capture():
+        subs_api.events[0].text = "changed again"
+    subs_api.saved.emit()
+    assert undo_api.needs_save
+    undo_api.undo()
+    assert not undo_api.needs_save
+    undo_api.undo()
+    assert undo_api.needs_save
+    undo_api.redo()
+    assert not undo_api.needs_save
+
+
+def test_undo_deduplicates_items() -> None:
+    """Test that identical items are stored once and freed when dropped."""
+    subs_api, undo_api = _make_apis()
+    # pylint: disable=protected-access
+    pool = undo_api._pool
+    # the empty selection, shared by all the entries
+    assert len(pool) == 1
+
+    with undo_api.capture():
+        subs_api.events.replace(list(subs_api.events)[::-1])
+    assert len(pool) == 6
+
+    with undo_api.capture():
+        subs_api.events.remove(0, 1)
+    assert len(pool) == 6
+
+    undo_api.undo()
+    undo_api.undo()
+    with undo_api.capture():
+        subs_api.events.insert(0, AssEvent(text="new"))
+    assert len(pool) == 2
+    undo_api.undo()
+    assert [event.text for event in subs_api.events] == list("01234")
+    undo_api.redo()
+    assert subs_api.events[0].text == "new"
+
+
+def test_undo_spills_to_disk() -> None:
+    """Test that undo data over the memory budget is moved to the disk."""
+    subs_api, undo_api = _make_apis(max_undo_memory_mb=1)
+    long_text = "x" * 1024 * 1024
+    with tempfile.TemporaryDirectory() as dir_name:
+        with patch(
+            "bubblesub.api.undo.get_cache_dir", return_value=Path(dir_name)
+        ):
+            with undo_api.capture():
+                subs_api.events.insert(0, AssEvent(text=long_text))
+            with undo_api.capture():
+                subs_api.events.remove(1, 4)
+
+            stats = undo_api.stats
+            assert stats.entries == 3
+            assert stats.ram_size < 1024 * 1024
+            assert stats.disk_size > 1024 * 1024
+
+            undo_api.undo()
+            undo_api.undo()
+            undo_api.redo()
+            assert [event.text for event in subs_api.events] == [
+                long_text,
+                "0",
+                "1",
+                "2",
+                "3",
+                "4",
+            ]
+
+            subs_api.loaded.emit()
+            stats = undo_api.stats
+            assert stats.entries == 1
+            assert stats.ram_size < 1024
+            assert stats.disk_size == 0
+
+
+def test_blob_pool_compacts_spill_file() -> None:
+    """Test that space of released blobs is reclaimed from the disk."""
+    pool = UndoBlobPool()
+    with tempfile.TemporaryDirectory() as dir_name:
+        with patch(
+            "bubblesub.api.undo.get_cache_dir", return_value=Path(dir_name)
+        ):
+            keys = [pool.add((i, "x" * 1000)) for i in range(10)]
+            pool.spill(0)
+            assert pool.disk_size == pool.disk_file_size
+            assert pool.disk_size > 10_000
+
+            for key in keys[:5]:
+                pool.release(key)
+            assert pool.disk_size < pool.disk_file_size
+
+            pool.release(keys[5])
+            assert pool.disk_size == pool.disk_file_size
+            assert pool.disk_size > 4000
+
+            keys.append(pool.add((10, "x" * 1000)))
+            pool.spill(0)
+            assert pool.disk_size == pool.disk_file_size
+            assert [pool.get(key)[0] for key in keys[6:]] == list(range(6, 11))
+
+            for key in keys[6:]:
+                pool.release(key)
+            assert pool.disk_file_size == 0
+        pool.close()
+
+
+def test_undo_counts_all_data() -> None:
+    """Test that modifications, meta and selections take up the budget."""
+    subs_api, undo_api = _make_apis()
+    long_text = "x" * 1024 * 1024
+    ram_size = undo_api.stats.ram_size
+
+    with undo_api.capture():
+        subs_api.events[0].text = long_text
+    assert undo_api.stats.ram_size > ram_size + 1024 * 1024
+    ram_size = undo_api.stats.ram_size
+
+    with undo_api.capture():
+        subs_api.meta.set("Title", long_text)
+    assert undo_api.stats.ram_size > ram_size + 1024 * 1024
+    ram_size = undo_api.stats.ram_size
+
+    with undo_api.capture():
+        subs_api.events.append(
+            *[AssEvent(text=str(i)) for i in range(100_000)]
+        )
+        subs_api.selected_indexes = list(range(100_000))
+    assert undo_api.stats.ram_size > ram_size + 100_000
+
+    undo_api.undo()
+    undo_api.undo()
+    undo_api.undo()
+    assert _get_state(subs_api)[0][0] == (0, "0", "")
+    assert "Title" not in _get_state(subs_api)[2]
+    undo_api.redo()
+    undo_api.redo()
+    assert subs_api.events[0].text == long_text
+    assert subs_api.meta.get("Title") == long_text
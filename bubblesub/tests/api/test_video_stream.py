@@ -16,14 +16,19 @@
 
 """Tests for bubblesub.api.video module."""
 
+import tempfile
 import typing as T
 from pathlib import Path
 from unittest.mock import Mock, PropertyMock, patch
 
 import numpy as np
+import PIL.Image
 import pytest
 
+from bubblesub.api.threading import TaskHandle
 from bubblesub.api.video import VideoStream
+from bubblesub.api.video_stream import _run_pipeline
+from bubblesub.ass_renderer import RenderedRegion
 
 
 def _test_align_pts_to_frame(
@@ -201,3 +206,166 @@ def test_frame_idx_from_pts(
             )
         else:
             assert stream.frame_idx_from_pts(pts) == expected
+
+
+@pytest.mark.parametrize("canceled", [False, True])
+def test_save_screenshots(canceled: bool) -> None:
+    """Test saving screenshots of many frames at once.
+
+    :param canceled: whether to cancel the task before it starts
+    """
+    threading_api = Mock()
+    log_api = Mock()
+    subs_api = Mock()
+
+    with patch(
+        VideoStream.__module__ + "." + VideoStream.__name__ + ".timecodes",
+        new_callable=PropertyMock,
+        return_value=[0, 10, 20],
+    ), tempfile.TemporaryDirectory() as dir_name:
+        stream = VideoStream(threading_api, log_api, subs_api, Path("dummy"))
+        stream._source = Mock()  # pylint: disable=protected-access
+        get_frame_mock = Mock(
+            side_effect=lambda idx, width, height: np.full(
+                (height, width, 3), idx * 100, dtype=np.uint8
+            )
+        )
+        stream.get_frame = get_frame_mock  # type: ignore
+        handle = TaskHandle()
+        if canceled:
+            handle.cancel()
+
+        shots = [
+            (25, Path(dir_name) / "c.png"),
+            (5, Path(dir_name) / "a.png"),
+            (11, Path(dir_name) / "b.png"),
+            (19, Path(dir_name) / "b2.png"),
+        ]
+        # pylint: disable=protected-access
+        count = stream._save_screenshots(shots, (4, 2), None, handle)
+
+        if canceled:
+            assert count == 0
+            assert not list(Path(dir_name).iterdir())
+            return
+
+        assert count == 4
+        assert [call[0][0] for call in get_frame_mock.call_args_list] == [
+            0,
+            1,
+            2,
+        ]
+        for name, value in [("a", 0), ("b", 100), ("b2", 100), ("c", 200)]:
+            with PIL.Image.open(Path(dir_name) / f"{name}.png") as image:
+                assert image.size == (4, 2)
+                assert image.getpixel((0, 0)) == (value, value, value)
+
+
+def test_save_screenshots_with_subtitles() -> None:
+    """Test that subtitles are burnt into the screenshots."""
+    with patch(
+        VideoStream.__module__ + "." + VideoStream.__name__ + ".timecodes",
+        new_callable=PropertyMock,
+        return_value=[0, 10, 20],
+    ), tempfile.TemporaryDirectory() as dir_name:
+        stream = VideoStream(Mock(), Mock(), Mock(), Path("dummy"))
+        stream._source = Mock()  # pylint: disable=protected-access
+        stream.get_frame = Mock(  # type: ignore
+            return_value=np.zeros((2, 4, 3), dtype=np.uint8)
+        )
+        renderer = Mock()
+        renderer.render_region.return_value = RenderedRegion(
+            1, 0, PIL.Image.new("RGBA", (2, 1), (255, 0, 0, 255))
+        )
+
+        # pylint: disable=protected-access
+        stream._save_screenshots(
+            [(0, Path(dir_name) / "a.png")], (4, 2), renderer, TaskHandle()
+        )
+
+        with PIL.Image.open(Path(dir_name) / "a.png") as image:
+            assert [image.getpixel((x, 0)) for x in range(4)] == [
+                (0, 0, 0),
+                (255, 0, 0),
+                (255, 0, 0),
+                (0, 0, 0),
+            ]
+            assert image.getpixel((1, 1)) == (0, 0, 0)
+
+
+def test_get_frame_copies_buffer() -> None:
+    """Test that frames outlive the buffer that ffms2 reuses."""
+    with patch(
+        VideoStream.__module__ + "." + VideoStream.__name__ + ".timecodes",
+        new_callable=PropertyMock,
+        return_value=[0, 10, 20],
+    ):
+        stream = VideoStream(Mock(), Mock(), Mock(), Path("dummy"))
+        stream._wait_for_source = Mock(return_value=True)  # type: ignore
+        buffer = np.zeros(2 * 16, dtype=np.uint8)
+        source_frame = Mock(planes=[buffer], Linesize=[16])
+
+        # pylint: disable=protected-access
+        stream._source = Mock(
+            get_frame=Mock(
+                side_effect=lambda idx: buffer.fill(idx) or source_frame
+            )
+        )
+        first = stream.get_frame(1, 4, 2)
+        second = stream.get_frame(2, 4, 2)
+
+        assert first is not None and second is not None
+        assert first.shape == (2, 4, 3)
+        assert (first == 1).all()
+        assert (second == 2).all()
+
+
+def test_run_pipeline() -> None:
+    """Test that items pass through all the stages in order."""
+    results: T.List[int] = []
+    _run_pipeline(
+        range(100),
+        [lambda item: item * 2, lambda item: item + 1],
+        results.append,
+        None,
+    )
+    assert results == [item * 2 + 1 for item in range(100)]
+
+
+def test_run_pipeline_error() -> None:
+    """Test that errors raised by the stages stop the pipeline."""
+
+    stage = Mock(side_effect=[*range(50), ValueError("bad item")])
+    results: T.List[int] = []
+    with pytest.raises(ValueError, match="bad item"):
+        _run_pipeline(range(1000), [stage], results.append, None)
+    assert results == list(range(len(results)))
+    assert len(results) <= 50
+
+
+def test_save_clip_png() -> None:
+    """Test saving a clip as a PNG sequence."""
+    with patch(
+        VideoStream.__module__ + "." + VideoStream.__name__ + ".timecodes",
+        new_callable=PropertyMock,
+        return_value=[0, 10, 20, 30, 40],
+    ), tempfile.TemporaryDirectory() as dir_name:
+        stream = VideoStream(Mock(), Mock(), Mock(), Path("dummy"))
+        stream._source = Mock()  # pylint: disable=protected-access
+        stream.get_frame = Mock(  # type: ignore
+            side_effect=lambda idx, width, height: np.full(
+                (height, width, 3), idx, dtype=np.uint8
+            )
+        )
+        handle = TaskHandle()
+        path = Path(dir_name) / "clip"
+
+        assert stream.save_clip(5, 35, path, (4, 2), None, handle) == 3
+
+        assert sorted(child.name for child in path.iterdir()) == [
+            "frame-000000.png",
+            "frame-000001.png",
+            "frame-000002.png",
+        ]
+        with PIL.Image.open(path / "frame-000002.png") as image:
+            assert image.getpixel((0, 0)) == (3, 3, 3)
@@ -0,0 +1,183 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.ass_renderer.ass_renderer module."""
+
+import concurrent.futures
+import fractions
+import typing as T
+from unittest.mock import MagicMock, Mock, patch
+
+import numpy as np
+import PIL.Image
+import pytest
+
+from bubblesub.ass_renderer import (
+    AssRenderer,
+    AssRendererPool,
+    drop_spare_renderers,
+    warm_up_fonts,
+)
+from bubblesub.ass_renderer.ass_renderer import _Bitmap
+from bubblesub.ass_renderer.canvas import PremultipliedCanvas
+from bubblesub.fmt.ass.event import AssEvent, AssEventList
+from bubblesub.fmt.ass.meta import AssMeta
+from bubblesub.fmt.ass.style import AssStyleList
+
+
+def _premultiply(image: np.ndarray) -> np.ndarray:
+    return np.round(image[..., :3] * (image[..., 3:] / 255.0)).astype(int)
+
+
+@pytest.mark.parametrize(
+    "aspect_ratio", [1, fractions.Fraction(4, 3), 0.75, 1.9]
+)
+@pytest.mark.parametrize("dst_x,dst_y", [(30, 40), (0, 0), (90, 70), (-5, 10)])
+def test_render_region(
+    aspect_ratio: T.Union[float, fractions.Fraction], dst_x: int, dst_y: int
+) -> None:
+    """Test that the rendered region matches the whole rendered frame.
+
+    :param aspect_ratio: pixel aspect ratio to render with
+    :param dst_x: horizontal position of the subtitles
+    :param dst_y: vertical position of the subtitles
+    """
+    canvas = PremultipliedCanvas(100, 80)
+    rng = np.random.default_rng(0)
+    mask = rng.integers(0, 256, (10, 15), dtype=np.uint8)
+    canvas.blend(mask, (200, 100, 50, 0), dst_x, dst_y)
+    assert canvas.dirty_rect
+    bitmap = _Bitmap(canvas.dirty_rect, canvas.to_rgba(canvas.dirty_rect))
+
+    renderer = AssRenderer()
+    renderer.video_resolution = (100, 80)
+    with patch.object(renderer, "_composite", return_value=bitmap):
+        expected = np.asarray(renderer.render(0, aspect_ratio))
+        region = renderer.render_region(0, aspect_ratio)
+
+    if region is None:
+        # stretched out of the frame
+        assert not expected.any()
+    else:
+        actual = PIL.Image.new("RGBA", (100, 80))
+        actual.paste(region.image, (region.x, region.y))
+        # colors of nearly transparent pixels are imprecise, so compare them
+        # premultiplied
+        assert (
+            np.abs(
+                _premultiply(np.asarray(actual)) - _premultiply(expected)
+            ).max()
+            <= 1
+        )
+        assert region.image.width * region.image.height < 100 * 80 / 4
+
+
+def test_render_region_empty() -> None:
+    """Test that rendering nothing gives no region."""
+    renderer = AssRenderer()
+    with patch.object(renderer, "_composite", return_value=None):
+        assert renderer.render_region(0, 1) is None
+
+
+def test_render_cache() -> None:
+    """Test that identical frames are composited only once."""
+    event_list = AssEventList()
+    event_list.append(
+        AssEvent(start=0, end=100, text="static"),
+        AssEvent(start=50, end=150, text=r"{\fad(10,10)}animated"),
+    )
+    renderer = AssRenderer()
+    with patch.object(renderer, "_ctx"), patch.object(
+        renderer, "_renderer"
+    ), patch.object(renderer, "_blend", return_value=None) as blend_mock:
+        renderer.set_source(AssStyleList(), event_list, AssMeta(), (10, 10))
+        render_frame_mock = renderer._renderer.render_frame
+        render_frame_mock.return_value = Mock(change=2)
+
+        renderer.render_region(10, 1)
+        renderer.render_region(20, 1)
+        assert blend_mock.call_count == 1
+
+        renderer.render_region(60, 1)
+        renderer.render_region(70, 1)
+        renderer.render_region(70, 1)
+        assert blend_mock.call_count == 3
+
+        event_list[0].text = "changed"
+        renderer.render_region(20, 1)
+        assert blend_mock.call_count == 4
+
+        render_frame_mock.return_value = Mock(change=0)
+        renderer.render_region(120, 1)
+        assert blend_mock.call_count == 4
+        assert render_frame_mock.call_count == 5
+
+
+def _make_renderer() -> AssRenderer:
+    renderer = AssRenderer()
+    renderer.set_source(AssStyleList(), AssEventList(), AssMeta(), (10, 10))
+    return renderer
+
+
+@patch("bubblesub.ass_renderer.ass_renderer._SPARE_RENDERERS", [])
+@patch("bubblesub.ass_renderer.ass_renderer._MAX_SPARE_RENDERERS", 2)
+@patch("bubblesub.ass_renderer.ass_renderer._make_libass_renderer")
+def test_warm_up_fonts(make_libass_renderer_mock: Mock) -> None:
+    """Test that the renderers prepared ahead of time get used.
+
+    :param make_libass_renderer_mock: mock to libass renderer factory
+    """
+    make_libass_renderer_mock.side_effect = lambda: (Mock(), Mock())
+    warm_up_fonts()
+    warm_up_fonts()
+    assert make_libass_renderer_mock.call_count == 2
+
+    renderers = [_make_renderer(), _make_renderer()]
+    assert make_libass_renderer_mock.call_count == 2
+
+    renderers.append(_make_renderer())
+    assert make_libass_renderer_mock.call_count == 3
+
+    # renderers that are gone hand their libass renderers over
+    del renderers[0]
+    renderers.append(_make_renderer())
+    assert make_libass_renderer_mock.call_count == 3
+
+    # unless the fonts might have changed in the meantime
+    drop_spare_renderers()
+    del renderers[0]
+    renderers.append(_make_renderer())
+    assert make_libass_renderer_mock.call_count == 4
+
+
+@patch("bubblesub.ass_renderer.ass_renderer._SPARE_RENDERERS", [])
+@patch("bubblesub.ass_renderer.ass_renderer._make_libass_renderer")
+def test_renderer_pool(make_libass_renderer_mock: Mock) -> None:
+    """Test that every thread renders with a libass renderer of its own.
+
+    :param make_libass_renderer_mock: mock to libass renderer factory
+    """
+    make_libass_renderer_mock.side_effect = lambda: (Mock(), MagicMock())
+    pool = AssRendererPool(AssStyleList(), AssEventList(), AssMeta(), (10, 10))
+
+    pool.render_region(0, 1)
+    pool.render_region(10, 1)
+    assert make_libass_renderer_mock.call_count == 1
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        executor.submit(pool.render_region, 0, 1).result()
+        executor.submit(pool.render_region, 10, 1).result()
+    assert make_libass_renderer_mock.call_count == 2
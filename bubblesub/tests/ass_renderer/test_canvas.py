@@ -0,0 +1,91 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+# Copyright (c) 2014 Tony Young
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Tests for bubblesub.ass_renderer.canvas module."""
+
+import typing as T
+
+import numpy as np
+
+from bubblesub.ass_renderer.canvas import PremultipliedCanvas
+
+
+def _blend_reference(
+    image: np.ndarray, mask: np.ndarray, rgba: tuple, dst_x: int, dst_y: int,
+) -> None:
+    *color, transparency = rgba
+    height, width = mask.shape
+    fragment = image[dst_y : dst_y + height, dst_x : dst_x + width]
+    src_alpha = mask / 255.0 * (1.0 - transparency / 255.0)
+    dst_alpha = fragment[..., 3]
+    out_alpha = src_alpha + dst_alpha * (1.0 - src_alpha)
+    fragment[..., :3] = np.where(
+        out_alpha[..., None] > 0,
+        (
+            np.array(color) / 255.0 * src_alpha[..., None]
+            + fragment[..., :3] * (dst_alpha * (1.0 - src_alpha))[..., None]
+        )
+        / np.maximum(out_alpha, 1e-9)[..., None],
+        0,
+    )
+    fragment[..., 3] = out_alpha
+
+
+def test_blend() -> None:
+    """Test that blending matches floating point Porter-Duff "over"."""
+    rng = np.random.default_rng(0)
+    canvas = PremultipliedCanvas(64, 48)
+    expected = np.zeros((48, 64, 4))
+    for _ in range(50):
+        height, width = rng.integers(1, 30, 2)
+        dst_x = int(rng.integers(0, 64 - width))
+        dst_y = int(rng.integers(0, 48 - height))
+        mask = rng.integers(0, 256, (height, width), dtype=np.uint8)
+        red, green, blue, alpha = (
+            int(value) for value in rng.integers(0, 256, 4)
+        )
+        rgba = (red, green, blue, alpha)
+        canvas.blend(mask, rgba, dst_x, dst_y)
+        _blend_reference(expected, mask, rgba, dst_x, dst_y)
+
+    actual = canvas.to_rgba().astype(int)
+    expected = np.round(expected * 255).astype(int)
+    assert np.abs(actual[..., 3] - expected[..., 3]).max() <= 3
+    visible = expected[..., 3] >= 128
+    assert visible.any()
+    assert np.abs(actual[..., :3] - expected[..., :3])[visible].max() <= 4
+
+
+def test_blend_clipping() -> None:
+    """Test that images sticking out of the canvas are clipped."""
+    canvas = PremultipliedCanvas(4, 4)
+    mask = np.full((3, 3), 255, dtype=np.uint8)
+    canvas.blend(mask, (10, 20, 30, 0), -1, 2)
+    canvas.blend(mask, (10, 20, 30, 0), 10, 10)
+    actual = canvas.to_rgba()
+    assert (actual[2:, :2] == (10, 20, 30, 255)).all()
+    assert (actual[:2] == 0).all()
+    assert (actual[:, 2:] == 0).all()
+
+
+def test_clear() -> None:
+    """Test that clearing makes the canvas transparent again."""
+    canvas = PremultipliedCanvas(4, 4)
+    assert not canvas.to_rgba().any()
+    canvas.blend(np.full((2, 2), 128, dtype=np.uint8), (255, 0, 0, 0), 1, 1)
+    assert canvas.to_rgba().any()
+    canvas.clear()
+    assert not canvas.to_rgba().any()
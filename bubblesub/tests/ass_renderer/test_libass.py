@@ -0,0 +1,334 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.ass_renderer.libass module.
+
+The module is loaded against a fake libass that keeps the tracks in Python
+memory, so that the way bubblesub fills them can be checked without the
+real library.
+"""
+
+import ctypes
+import importlib.util
+import types
+import typing as T
+from pathlib import Path
+from unittest.mock import MagicMock, Mock, patch
+
+import numpy as np
+import pytest
+
+import bubblesub.ass_renderer
+from bubblesub.ass_renderer import AssRenderer
+from bubblesub.ass_renderer.canvas import PremultipliedCanvas
+from bubblesub.fmt.ass.event import AssEvent, AssEventList
+from bubblesub.fmt.ass.meta import AssMeta
+from bubblesub.fmt.ass.style import AssStyle, AssStyleList
+
+
+class _FakeLibass:
+    def __init__(self, module: types.ModuleType) -> None:
+        """Initialize self.
+
+        :param module: libass module to take the structures from
+        """
+        self._module = module
+        # libass memory, kept alive for as long as the test runs
+        self._buffers: T.List[T.Any] = []
+
+    def _alloc(self, struct_type: T.Any) -> T.Any:
+        buffer = ctypes.create_string_buffer(
+            max(1, ctypes.sizeof(struct_type))
+        )
+        self._buffers.append(buffer)
+        return ctypes.cast(buffer, ctypes.POINTER(struct_type))
+
+    def _ass_library_init(self) -> T.Any:
+        return self._alloc(self._module.AssContext)
+
+    def _ass_renderer_init(self, _ctx: T.Any) -> T.Any:
+        return self._alloc(self._module.AssRenderer)
+
+    def _ass_new_track(self, _ctx: T.Any) -> T.Any:
+        return self._alloc(self._module.AssTrack)
+
+    def _grow(
+        self, track: T.Any, struct_type: T.Any, prefix: str
+    ) -> T.Tuple[T.Any, int]:
+        count = getattr(track, f"n_{prefix}")
+        if count == getattr(track, f"max_{prefix}"):
+            new_max = count * 2 + 1
+            array = (struct_type * new_max)()
+            self._buffers.append(array)
+            if count:
+                ctypes.memmove(
+                    array,
+                    getattr(track, f"{prefix}_arr"),
+                    ctypes.sizeof(struct_type) * count,
+                )
+            setattr(
+                track,
+                f"{prefix}_arr",
+                ctypes.cast(array, ctypes.POINTER(struct_type)),
+            )
+            setattr(track, f"max_{prefix}", new_max)
+        setattr(track, f"n_{prefix}", count + 1)
+        return track, count
+
+    def _ass_alloc_style(self, track_ref: T.Any) -> int:
+        return self._grow(track_ref._obj, self._module.AssStyle, "styles")[1]
+
+    def _ass_alloc_event(self, track_ref: T.Any) -> int:
+        return self._grow(track_ref._obj, self._module.AssEvent, "events")[1]
+
+    def _ass_render_frame(self, *_args: T.Any) -> None:
+        return None
+
+
+@pytest.fixture(name="libass")
+def fixture_libass() -> T.Iterator[types.ModuleType]:
+    """Load the libass module against a fake library.
+
+    :return: loaded module
+    """
+    spec = importlib.util.spec_from_file_location(
+        "_fake_libass",
+        Path(bubblesub.ass_renderer.__file__).parent / "libass.py",
+    )
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    with patch("ctypes.util.find_library", return_value="fake"), patch(
+        "ctypes.cdll.LoadLibrary", return_value=MagicMock()
+    ):
+        spec.loader.exec_module(module)  # type: ignore
+
+    fake = _FakeLibass(module)
+    for name in dir(fake):
+        if name.startswith("_ass_"):
+            setattr(module._libass, name[1:], getattr(fake, name))
+
+    with patch("bubblesub.ass_renderer.ass_renderer.libass", module), patch(
+        "bubblesub.ass_renderer.ass_renderer._SPARE_RENDERERS", []
+    ):
+        yield module
+
+
+def _describe_track(track: T.Any) -> T.Any:
+    styles = [
+        (
+            style.name,
+            style.fontname,
+            style.fontsize,
+            style.primary_color,
+            style.outline,
+            style.alignment,
+        )
+        for style in track.styles
+    ]
+    events = sorted(
+        (
+            event.read_order,
+            event.start_ms,
+            event.duration_ms,
+            event.layer,
+            event.style_id,
+            event.name,
+            event.margin_l,
+            event.effect,
+            event.text,
+        )
+        for event in track.events
+        if event.duration_ms
+    )
+    return styles, events
+
+
+def _render_track(style_list: AssStyleList, event_list: AssEventList) -> T.Any:
+    renderer = AssRenderer()
+    renderer.set_source(style_list, event_list, AssMeta(), (10, 10))
+    renderer.render_raw(0)
+    return renderer._track
+
+
+def test_incremental_track(libass: types.ModuleType) -> None:
+    """Test that updating the track matches populating it from scratch.
+
+    :param libass: libass module loaded against a fake library
+    """
+    style_list = AssStyleList()
+    style_list.append(AssStyle(name="a"), AssStyle(name="b"))
+    event_list = AssEventList()
+    event_list.append(
+        *[
+            AssEvent(
+                start=i * 100,
+                end=i * 100 + 500,
+                text=f"text {i}",
+                style="a" if i % 2 else "b",
+                layer=i % 3,
+            )
+            for i in range(10)
+        ]
+    )
+    renderer = AssRenderer()
+    renderer.set_source(style_list, event_list, AssMeta(), (10, 10))
+    renderer.render_raw(0)
+
+    event_list[2].text = "modified"
+    event_list.remove(3, 2)
+    event_list[5].is_comment = True
+    event_list.insert(1, AssEvent(start=50, end=150, text="new", style="b"))
+    event_list[7].actor = "actor"
+    event_list.move(0, 3, 4)
+    event_list.remove(2, 1)
+    event_list.insert(
+        6, *[AssEvent(start=0, end=10, text=str(i)) for i in range(5)]
+    )
+    style_list[0].font_size = 50
+    renderer.render_raw(0)
+
+    track = renderer._track
+    assert len(track.events) < 20
+    assert _describe_track(track) == _describe_track(
+        _render_track(style_list, event_list)
+    )
+
+    # moving styles changes their indexes, so the track is rebuilt
+    style_list.move(0, 1, 1)
+    renderer.render_raw(0)
+    assert renderer._track is not track
+    assert _describe_track(renderer._track) == _describe_track(
+        _render_track(style_list, event_list)
+    )
+
+
+def test_read_order_renumbered_once(libass: types.ModuleType) -> None:
+    """Test that bulk changes renumber the events once, before rendering.
+
+    :param libass: libass module loaded against a fake library
+    """
+    style_list = AssStyleList()
+    style_list.append(AssStyle(name="a"))
+    event_list = AssEventList()
+    event_list.append(*[AssEvent(start=0, end=10) for _i in range(5)])
+    renderer = AssRenderer()
+    renderer.set_source(style_list, event_list, AssMeta(), (10, 10))
+    renderer.render_raw(0)
+
+    track = renderer._track
+    with patch.object(
+        track, "update_read_order", wraps=track.update_read_order
+    ) as update_mock:
+        for i in range(10):
+            event_list.insert(0, AssEvent(start=0, end=10, text=str(i)))
+        event_list.remove(3, 2)
+        assert [event.read_order for event in track.events[:5]] == list(
+            range(5)
+        )
+        renderer.render_raw(0)
+        update_mock.assert_called_once_with()
+
+    assert renderer._track is track
+    assert _describe_track(track) == _describe_track(
+        _render_track(style_list, event_list)
+    )
+
+
+def _make_image_chain(
+    libass: types.ModuleType,
+    specs: T.List[T.Tuple[int, int, int, T.Optional[bytes], int, int, int]],
+) -> T.Tuple[T.Any, T.List[T.Any]]:
+    keep_alive: T.List[T.Any] = []
+    images = [libass.AssImage() for _spec in specs]
+    for image, next_image, spec in zip(images, images[1:] + [None], specs):
+        width, height, stride, data, color, dst_x, dst_y = spec
+        image.w = width
+        image.h = height
+        image.stride = stride
+        if data is not None:
+            buffer = ctypes.create_string_buffer(data, len(data))
+            keep_alive.append(buffer)
+            image.bitmap = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_char))
+        image.color = color
+        image.dst_x = dst_x
+        image.dst_y = dst_y
+        if next_image is not None:
+            image.next_ptr = ctypes.pointer(next_image)
+    keep_alive.append(images)
+    return ctypes.pointer(images[0]), keep_alive
+
+
+def test_image_views(libass: types.ModuleType) -> None:
+    """Test that image views expose the libass bitmaps as they are.
+
+    :param libass: libass module loaded against a fake library
+    """
+    rng = np.random.default_rng(0)
+    specs = [
+        (5, 3, 8, rng.integers(0, 256, 24, dtype=np.uint8).tobytes()),
+        (0, 4, 0, b"\xff"),
+        (4, 4, 4, None),
+        (7, 2, 7, rng.integers(0, 256, 14, dtype=np.uint8).tobytes()),
+        (3, 0, 16, b"\xff"),
+        (1, 1, 1, b"\x80"),
+    ]
+    head_ptr, _keep_alive = _make_image_chain(
+        libass,
+        [
+            (width, height, stride, data, 0x12345600 + i, i, 2 * i)
+            for i, (width, height, stride, data) in enumerate(specs)
+        ],
+    )
+    images = libass.AssImageSequence(Mock(), head_ptr, 2)
+
+    views = list(images.views())
+    assert len(views) == len(specs)
+    for view, image, (width, height, stride, data) in zip(
+        views, images, specs
+    ):
+        assert view.rgba == image.rgba
+        assert (view.dst_x, view.dst_y) == (image.dst_x, image.dst_y)
+        if not width or not height or data is None:
+            assert view.mask.size == 0
+            continue
+        assert view.mask.shape == (height, width)
+        assert view.mask.strides == (stride, 1)
+        assert view.mask.dtype == np.uint8
+        assert view.mask.tolist() == [
+            [image[x, y] for x in range(width)] for y in range(height)
+        ]
+
+    expected = PremultipliedCanvas(20, 20)
+    actual = PremultipliedCanvas(20, 20)
+    for view, image, (width, height, _stride, data) in zip(
+        views, images, specs
+    ):
+        actual.blend(view.mask, view.rgba, view.dst_x, view.dst_y)
+        if width and height and data is not None:
+            expected.blend(
+                np.array(
+                    [
+                        [image[x, y] for x in range(width)]
+                        for y in range(height)
+                    ],
+                    dtype=np.uint8,
+                ),
+                image.rgba,
+                image.dst_x,
+                image.dst_y,
+            )
+    assert actual.to_rgba().any()
+    np.testing.assert_array_equal(actual.to_rgba(), expected.to_rgba())
@@ -0,0 +1,34 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test log_progress function."""
+
+from unittest.mock import Mock
+
+from bubblesub.api.threading import TaskHandle
+from bubblesub.cmd.common import log_progress
+
+
+def test_log_progress() -> None:
+    """Test that the progress is logged once every 10%."""
+    api = Mock()
+    handle = TaskHandle()
+    log_progress(api, handle, "saving")
+    for done in range(1, 101):
+        handle.progressed.emit(done, 100)
+    assert [call[0][0] for call in api.log.info.call_args_list] == [
+        f"saving: {percent}%" for percent in range(10, 100, 10)
+    ]
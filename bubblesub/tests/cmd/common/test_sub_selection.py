@@ -18,12 +18,13 @@
 
 import asyncio
 import typing as T
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 
 from bubblesub.api.cmd import CommandError
 from bubblesub.cmd.common import SubtitlesSelection
+from bubblesub.fmt.ass.event import AssEvent, AssEventList
 
 
 @pytest.mark.parametrize(
@@ -114,3 +115,48 @@ def test_get_all_indexes(
         actual_indexes = type(ex)
 
     assert actual_indexes == expected_indexes
+
+
+@pytest.mark.parametrize(
+    "target_pts,expected_indexes",
+    [
+        (0, [1]),
+        (250, [1]),
+        (1900, [2]),
+        (5200, [3]),
+        (5000, [0]),
+        (100_000, [3]),
+        (-100_000, [1]),
+        (4500, [0]),
+    ],
+)
+def test_get_all_indexes_ask_time(
+    target_pts: int, expected_indexes: T.List[int]
+) -> None:
+    """Test picking the subtitle centered nearest to given time.
+
+    :param target_pts: time entered by the user
+    :param expected_indexes: expected selection indexes
+    """
+    api = Mock()
+    api.subs.events = AssEventList()
+    api.subs.events.append(
+        AssEvent(start=0, end=9000),
+        AssEvent(start=0, end=500),
+        AssEvent(start=1500, end=2500),
+        AssEvent(start=4000, end=7000),
+    )
+    api.subs.has_selection = False
+
+    api.gui.exec = lambda func: func(Mock())
+    sub_selection = SubtitlesSelection(api, "ask-time")
+    dialog_result: "asyncio.Future[T.Any]" = asyncio.Future()
+    dialog_result.set_result((target_pts, False))
+    with patch(
+        "bubblesub.cmd.common.sub_selection.time_jump_dialog",
+        Mock(return_value=dialog_result),
+    ):
+        actual_indexes = asyncio.get_event_loop().run_until_complete(
+            sub_selection.get_all_indexes()
+        )
+    assert actual_indexes == expected_indexes
@@ -0,0 +1,155 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.fmt.ass.event module."""
+
+import pickle
+import typing as T
+from copy import copy
+from unittest.mock import patch
+
+import pytest
+
+from bubblesub.fmt.ass.event import AssEvent, AssEventList
+
+
+def _make_event_list() -> AssEventList:
+    event_list = AssEventList()
+    event_list.append(
+        AssEvent(start=0, end=100, text="a"),
+        AssEvent(start=50, end=150, text="b"),
+        AssEvent(start=200, end=300, text="c"),
+        AssEvent(start=0, end=1000, text="d"),
+    )
+    return event_list
+
+
+@pytest.mark.parametrize(
+    "pts,expected",
+    [
+        (-1, []),
+        (0, ["a", "d"]),
+        (75, ["a", "d", "b"]),
+        (100, ["a", "d", "b"]),
+        (101, ["d", "b"]),
+        (250, ["d", "c"]),
+        (1000, ["d"]),
+        (1001, []),
+    ],
+)
+def test_events_at(pts: int, expected: T.List[str]) -> None:
+    """Test looking up events displayed at a given PTS.
+
+    :param pts: PTS to look up
+    :param expected: expected texts of found events
+    """
+    event_list = _make_event_list()
+    actual = [event.text for event in event_list.events_at(pts)]
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "start,end,expected",
+    [
+        (-10, -1, []),
+        (150, 200, ["d", "b", "c"]),
+        (151, 199, ["d"]),
+        (301, 2000, ["d"]),
+    ],
+)
+def test_events_in_range(start: int, end: int, expected: T.List[str]) -> None:
+    """Test looking up events overlapping a given time range.
+
+    :param start: range start
+    :param end: range end
+    :param expected: expected texts of found events
+    """
+    event_list = _make_event_list()
+    actual = [event.text for event in event_list.events_in_range(start, end)]
+    assert actual == expected
+
+
+def test_time_index_follows_changes() -> None:
+    """Test that the time index is kept in sync with the event list."""
+    event_list = _make_event_list()
+
+    event_list[3].end = 10
+    assert [event.text for event in event_list.events_at(500)] == []
+
+    event_list[2].start = 400
+    event_list[2].end = 600
+    assert [event.text for event in event_list.events_at(500)] == ["c"]
+
+    event_list.remove(2, 1)
+    assert [event.text for event in event_list.events_at(500)] == []
+
+    event_list.insert(0, AssEvent(start=500, end=500, text="e"))
+    assert [event.text for event in event_list.events_at(500)] == ["e"]
+
+    event_list.clear()
+    assert event_list.events_in_range(-1000, 1000) == []
+
+
+def test_modification_signals() -> None:
+    """Test that modifications report the index, looking it up once."""
+    event_list = _make_event_list()
+    indexes: T.List[T.Tuple[str, int]] = []
+    event_list.item_about_to_be_modified.connect(
+        lambda idx: indexes.append(("before", idx))
+    )
+    event_list.item_modified.connect(
+        lambda idx: indexes.append(("after", idx))
+    )
+
+    with patch.object(
+        event_list, "index", wraps=event_list.index
+    ) as index_mock:
+        event_list[2].text = "changed"
+        assert index_mock.call_count == 1
+    assert indexes == [("before", 2), ("after", 2)]
+
+    indexes.clear()
+    event = event_list[3]
+    event.begin_update()
+    event.text = "changed"
+    event_list.remove(0, 1)
+    event.end_update()
+    assert indexes == [("before", 3), ("after", 2)]
+
+
+def test_text_cache() -> None:
+    """Test that values derived from text follow text changes."""
+    event = AssEvent(text="{\\i1}abc{\\i0} def")
+    assert event.plaintext == "abc def"
+    assert event.character_count == 6
+
+    event.text = "ab"
+    assert event.plaintext == "ab"
+    assert event.character_count == 2
+
+
+def test_text_cache_detached_from_copies() -> None:
+    """Test that copies and pickles don't carry or share the cache."""
+    event = AssEvent(text="abc")
+    assert event.character_count == 3
+
+    event_copy = copy(event)
+    event_copy.text = "abcdef"
+    assert event.character_count == 3
+    assert event_copy.character_count == 6
+
+    assert pickle.dumps(event) == pickle.dumps(AssEvent(text="abc"))
+    assert pickle.loads(pickle.dumps(event)).character_count == 3
@@ -0,0 +1,129 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.fmt.ass.reader module."""
+
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bubblesub.fmt.ass.reader import read_ass
+
+SOURCE = """\N{BOM}[Script Info]
+; comment
+PlayResX: 1920
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, \
+OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, \
+ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, \
+MarginR, MarginV, Encoding
+Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00202020,&H7F202020,-1,0,0,\
+0,100,100,0,0,1,3,0,2,20,20,20,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, \
+Text
+Dialogue: 1,0:00:01.00,0:00:02.00,Default,Actor,0,0,0,,{TIME:1005,2000}a, b
+Comment: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,c{NOTE:d}
+"""
+
+
+def test_read_ass() -> None:
+    """Test reading styles, events and meta from a complete file."""
+    ass_file = read_ass(io.StringIO(SOURCE.replace("\n", "\r\n")))
+
+    assert ass_file.meta.get("PlayResX") == "1920"
+    assert len(ass_file.styles) == 1
+    assert ass_file.styles[0].name == "Default"
+    assert ass_file.styles[0].bold
+    assert ass_file.styles[0].back_color.alpha == 0x7F
+
+    assert len(ass_file.events) == 2
+    event1, event2 = ass_file.events
+    assert event1.start == 1005
+    assert event1.end == 2000
+    assert event1.layer == 1
+    assert event1.actor == "Actor"
+    assert event1.text == "a, b"
+    assert not event1.is_comment
+    assert event2.text == "c"
+    assert event2.note == "d"
+    assert event2.is_comment
+    assert event2.event_list is ass_file.events
+    assert ass_file.events.events_at(3500) == [event2]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "PlayResX: 1920",
+        "[Unknown]",
+        "[Events]\nFormat: Layer, Start\nDialogue: 0,0:00:00.00",
+        "[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, "
+        "MarginR, MarginV, Effect, Text\n"
+        "Unknown: 0,0:00:00.00,0:00:00.00,Default,,0,0,0,,",
+    ],
+)
+def test_read_ass_corrupt(source: str) -> None:
+    """Test that reading malformed files raises an error.
+
+    :param source: ASS source to read
+    """
+    with pytest.raises(ValueError):
+        read_ass(io.StringIO(source))
+
+
+@patch("bubblesub.fmt.ass.reader.PARALLEL_PARSE_CHUNK_SIZE", 1)
+def test_read_ass_parallel() -> None:
+    """Test that parsing events in a process pool gives the same result."""
+    expected = read_ass(io.StringIO(SOURCE))
+    with patch("bubblesub.fmt.ass.reader.PARALLEL_PARSE_THRESHOLD", 0):
+        ass_file = read_ass(io.StringIO(SOURCE))
+    assert [
+        (event.start, event.end, event.text, event.note)
+        for event in ass_file.events
+    ] == [
+        (event.start, event.end, event.text, event.note)
+        for event in expected.events
+    ]
+
+
+@patch("bubblesub.fmt.ass.reader.PARALLEL_PARSE_CHUNK_SIZE", 1)
+@patch("bubblesub.fmt.ass.reader.PARALLEL_PARSE_THRESHOLD", 0)
+@patch("bubblesub.fmt.ass.reader.os.cpu_count", return_value=1)
+@patch("bubblesub.fmt.ass.reader.ProcessPoolExecutor")
+def test_read_ass_single_core(
+    executor_mock: MagicMock, _cpu_count_mock: MagicMock
+) -> None:
+    """Test that events are parsed in place when there's only one core.
+
+    :param executor_mock: mocked process pool
+    :param _cpu_count_mock: mocked core count
+    """
+    ass_file = read_ass(io.StringIO(SOURCE))
+    assert ass_file.events
+    executor_mock.assert_not_called()
+
+
+@patch("bubblesub.fmt.ass.reader.PARALLEL_PARSE_CHUNK_SIZE", 1)
+@patch("bubblesub.fmt.ass.reader.PARALLEL_PARSE_THRESHOLD", 0)
+def test_read_ass_parallel_corrupt() -> None:
+    """Test that errors from the process pool point at the bad line."""
+    source = SOURCE.replace("Comment:", "Unknown:")
+    with pytest.raises(ValueError, match="line #12"):
+        read_ass(io.StringIO(source))
@@ -0,0 +1,51 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.fmt.ass.style module."""
+
+from bubblesub.fmt.ass.style import AssStyle, AssStyleList
+
+
+def test_get_by_name() -> None:
+    """Test looking up styles by their names as the list changes."""
+    style_list = AssStyleList()
+    style_list.append(AssStyle(name="a"), AssStyle(name="b"))
+    assert style_list.get_by_name("a") is style_list[0]
+    assert style_list.get_by_name("b") is style_list[1]
+    assert style_list.get_by_name("c") is None
+
+    style_list.move(1, 1, 0)
+    assert style_list.index_by_name("a") == 1
+    assert style_list.index_by_name("b") == 0
+
+    style_list[0].name = "c"
+    assert style_list.get_by_name("b") is None
+    assert style_list.index_by_name("c") == 0
+
+    style_list.insert(0, AssStyle(name="d"))
+    assert style_list.index_by_name("d") == 0
+    assert style_list.index_by_name("a") == 2
+
+    style_list.remove(0, 2)
+    assert style_list.index_by_name("c") is None
+    assert style_list.index_by_name("a") == 0
+
+
+def test_get_by_name_duplicates() -> None:
+    """Test that the first style wins when names are duplicated."""
+    style_list = AssStyleList()
+    style_list.append(AssStyle(name="a"), AssStyle(name="a"))
+    assert style_list.get_by_name("a") is style_list[0]
@@ -18,11 +18,19 @@
 
 import io
 import tempfile
+import typing as T
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+from bubblesub.fmt.ass.event import AssEvent
 from bubblesub.fmt.ass.file import AssFile
-from bubblesub.fmt.ass.writer import write_ass
+from bubblesub.fmt.ass.style import AssStyle
+from bubblesub.fmt.ass.writer import (
+    snapshot_ass,
+    write_ass,
+    write_ass_snapshot,
+    write_events,
+)
 
 
 @patch(
@@ -85,3 +93,74 @@ def test_write_ass_file(
         content = path.read_text()
 
     assert content == "META\nSTYLES\nEVENTS"
+
+
+def _write_event_texts(ass_file: AssFile) -> T.List[str]:
+    handle = io.StringIO()
+    write_events(ass_file, handle)
+    lines = handle.getvalue().splitlines()[2:]
+    return [line.split(",", 9)[-1] for line in lines]
+
+
+@patch("bubblesub.fmt.ass.writer.CHUNK_SIZE", 2)
+def test_write_events_follows_changes() -> None:
+    """Test that repeated writes reflect changes made in between."""
+    ass_file = AssFile()
+    ass_file.events.append(*[AssEvent(text=str(i)) for i in range(5)])
+    assert _write_event_texts(ass_file) == [
+        f"{{TIME:0,0}}{i}" for i in range(5)
+    ]
+
+    ass_file.events[3].text = "x"
+    ass_file.events.remove(0, 1)
+    ass_file.events.move(3, 1, 0)
+    ass_file.events.insert(1, AssEvent(text="y"))
+    assert _write_event_texts(ass_file) == [
+        "{TIME:0,0}4",
+        "{TIME:0,0}y",
+        "{TIME:0,0}1",
+        "{TIME:0,0}2",
+        "{TIME:0,0}x",
+    ]
+
+
+@patch("bubblesub.fmt.ass.writer.CHUNK_SIZE", 2)
+def test_write_ass_snapshot() -> None:
+    """Test that snapshots are written as they were when they were taken."""
+    ass_file = AssFile()
+    ass_file.meta.set("key", "value")
+    ass_file.styles.append(AssStyle(name="style"))
+    ass_file.events.append(*[AssEvent(text=str(i)) for i in range(5)])
+    write_ass(ass_file, io.StringIO())
+    ass_file.events[3].text = "x"
+    ass_file.events.append(AssEvent(text="y"))
+
+    expected = io.StringIO()
+    write_ass(ass_file, expected)
+    snapshot = snapshot_ass(ass_file)
+    ass_file.events[4].text = "z"
+    ass_file.meta.set("key", "changed")
+
+    handle = io.StringIO()
+    write_ass_snapshot(snapshot, handle)
+    assert handle.getvalue() == expected.getvalue()
+
+
+@patch("bubblesub.fmt.ass.writer.CHUNK_SIZE", 2)
+def test_snapshot_rows() -> None:
+    """Test that field values are captured once per unchanged chunk."""
+    ass_file = AssFile()
+    ass_file.styles.append(AssStyle(name="style"))
+    ass_file.events.append(*[AssEvent(text=str(i)) for i in range(5)])
+
+    first = snapshot_ass(ass_file)
+    ass_file.events[3].text = "x"
+    second = snapshot_ass(ass_file)
+
+    assert [style_row[0] for style_row in second.style_rows[0]] == ["style"]
+    assert [
+        [event_row[4] for event_row in chunk] for chunk in second.event_rows
+    ] == [["0", "1"], ["2", "x"], ["4"]]
+    assert second.event_rows[0] is first.event_rows[0]
+    assert second.event_rows[1] is not first.event_rows[1]
+    assert second.event_rows[2] is first.event_rows[2]
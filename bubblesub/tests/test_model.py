@@ -0,0 +1,129 @@
+# bubblesub - ASS subtitle editor
+# Copyright (C) 2018 Marcin Kurczewski
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Tests for bubblesub.model module."""
+
+import pickle
+import random
+import typing as T
+
+import pytest
+
+from bubblesub.model import IntervalIndex, RangeSet
+
+
+@pytest.mark.parametrize(
+    "items,expected_ranges",
+    [
+        ([], []),
+        ([1], [(1, 1)]),
+        ([3, 1, 2], [(1, 3)]),
+        ([1, 1, 2], [(1, 2)]),
+        ([1, 2, 3, 5, 6, 8], [(1, 3), (5, 2), (8, 1)]),
+    ],
+)
+def test_range_set_ranges(
+    items: T.List[int], expected_ranges: T.List[T.Tuple[int, int]]
+) -> None:
+    """Test compressing numbers into ranges.
+
+    :param items: input numbers
+    :param expected_ranges: expected list of (start, count) tuples
+    """
+    range_set = RangeSet(items)
+    assert range_set.ranges == expected_ranges
+    assert range_set.to_list() == sorted(set(items))
+    assert len(range_set) == len(set(items))
+    for item in range(-1, 10):
+        assert (item in range_set) == (item in items)
+
+
+def test_range_set_pickle() -> None:
+    """Test that pickled sets keep only the ranges."""
+    range_set = RangeSet(range(100_000))
+    range_set.to_list()
+    blob = pickle.dumps(range_set)
+    assert len(blob) < 100
+    assert blob == pickle.dumps(RangeSet(range(100_000)))
+    copy = pickle.loads(blob)
+    assert copy == range_set
+    assert copy.to_list() == list(range(100_000))
+
+
+@pytest.mark.parametrize(
+    "items,idx,count,expected",
+    [
+        ([], 0, 1, []),
+        ([0, 1, 2], 0, 1, [0, 1]),
+        ([0, 1, 2], 1, 1, [0, 1]),
+        ([0, 1, 2], 3, 1, [0, 1, 2]),
+        ([1, 2, 3, 7, 8, 10], 2, 5, [1, 2, 3, 5]),
+        ([1, 2, 3, 7, 8, 10], 4, 3, [1, 2, 3, 4, 5, 7]),
+        ([1, 2, 3, 7, 8, 10], 0, 11, []),
+        ([1, 5], 2, 2, [1, 3]),
+    ],
+)
+def test_range_set_remove_and_shift(
+    items: T.List[int], idx: int, count: int, expected: T.List[int]
+) -> None:
+    """Test removing a range and shifting the numbers that follow it.
+
+    :param items: input numbers
+    :param idx: where to start the removal
+    :param count: how many numbers to remove
+    :param expected: expected numbers after the removal
+    """
+    actual = RangeSet(items).remove_and_shift(idx, count)
+    assert actual.to_list() == expected
+    assert actual == RangeSet(expected)
+
+
+def test_interval_index_overlapping() -> None:
+    """Test looking up intervals against a brute force search."""
+    rng = random.Random(0)
+    items = [object() for _ in range(1000)]
+    intervals: T.Dict[int, T.Tuple[int, int]] = {0: (0, 1_000_000)}
+    for num in range(1, len(items)):
+        start = rng.randrange(10_000)
+        intervals[num] = (start, start + rng.choice([0, 1, 5, 100, 3000]))
+
+    index: IntervalIndex[object] = IntervalIndex()
+    index.update((items[num], *intervals[num]) for num in range(500))
+    for num in range(500, len(items)):
+        index.add(items[num], *intervals[num])
+    for num in range(1, len(items), 3):
+        index.discard(items[num])
+        del intervals[num]
+    for num in range(7, len(items), 7):
+        if num in intervals:
+            start = rng.randrange(10_000)
+            intervals[num] = (start, start + rng.randrange(50))
+            index.add(items[num], *intervals[num])
+    assert len(index) == len(intervals)
+
+    nums = {id(item): num for num, item in enumerate(items)}
+    for _ in range(200):
+        start = rng.randrange(-100, 11_000)
+        end = start + rng.choice([0, 10, 1000])
+        actual = [nums[id(item)] for item in index.overlapping(start, end)]
+        assert sorted(actual) == [
+            num
+            for num, (num_start, num_end) in sorted(intervals.items())
+            if num_start <= end and num_end >= start
+        ]
+        assert [intervals[num][0] for num in actual] == sorted(
+            intervals[num][0] for num in actual
+        )
@@ -16,11 +16,14 @@
 
 """Tests for bubblesub.util module."""
 
+import tempfile
 import typing as T
+from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
-from bubblesub.util import make_ranges
+from bubblesub.util import make_ranges, write_file_atomically
 
 
 @pytest.mark.parametrize(
@@ -57,3 +60,31 @@ def test_make_ranges(
     """
     actual_ranges = list(make_ranges(indexes, reverse=reverse))
     assert actual_ranges == expected_ranges
+
+
+def test_write_file_atomically() -> None:
+    """Test that the file is replaced and keeps its permissions."""
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.txt"
+        path.write_text("old")
+        path.chmod(0o640)
+
+        write_file_atomically(path, "new")
+
+        assert path.read_text() == "new"
+        assert path.stat().st_mode & 0o777 == 0o640
+        assert list(Path(dir_name).iterdir()) == [path]
+
+
+def test_write_file_atomically_failure() -> None:
+    """Test that a failed write leaves the original file intact."""
+    with tempfile.TemporaryDirectory() as dir_name:
+        path = Path(dir_name) / "test.txt"
+        path.write_text("old")
+
+        with patch("os.fsync", side_effect=OSError):
+            with pytest.raises(OSError):
+                write_file_atomically(path, "new")
+
+        assert path.read_text() == "old"
+        assert list(Path(dir_name).iterdir()) == [path]
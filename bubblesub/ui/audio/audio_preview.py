@@ -201,10 +201,7 @@ class AudioPreview(BaseLocalAudioWidget):
             return hash(
                 (
                     # subtitle rectangles
-                    tuple(
-                        (event.start, event.end)
-                        for event in self._api.subs.events
-                    ),
+                    self._api.subs.timing_version,
                     # frames, keyframes
                     (
                         self._api.video.current_stream.uid
@@ -423,7 +420,11 @@ class AudioPreview(BaseLocalAudioWidget):
 
         painter.setFont(QtGui.QFont(self.font().family(), 10))
 
-        for i, event in enumerate(self._api.subs.events):
+        selected_events = set(self._api.subs.selected_events)
+
+        for event in self._api.subs.events.events_in_range(
+            self.pts_from_x(-1), self.pts_from_x(self.width() + 1)
+        ):
             x1 = round(self.pts_to_x(event.start))
             x2 = round(self.pts_to_x(event.end))
             if x1 > x2:
@@ -431,7 +432,7 @@ class AudioPreview(BaseLocalAudioWidget):
             if x2 < 0 or x1 >= self.width():
                 continue
 
-            is_selected = i in self._api.subs.selected_indexes
+            is_selected = event in selected_events
             color_key = "selected" if is_selected else "unselected"
 
             label = SubtitleLabel(painter, x1, x2, event=event)
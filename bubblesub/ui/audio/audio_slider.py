@@ -49,10 +49,7 @@ class AudioSlider(BaseGlobalAudioWidget):
             return hash(
                 (
                     # subtitle rectangles
-                    tuple(
-                        (event.start, event.end)
-                        for event in self._api.subs.events
-                    ),
+                    self._api.subs.timing_version,
                     # audio view
                     self._api.audio.view.view_start,
                     self._api.audio.view.view_end,
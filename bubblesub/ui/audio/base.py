@@ -249,18 +249,17 @@ class SubtitleSplitDragModeExecutor(DragModeExecutor):
 
     def begin_drag(self, event: QtGui.QMouseEvent, pts: int) -> None:
         super().begin_drag(event, pts)
-        self.source_events[:] = [
-            source_event
-            for source_event in self._api.subs.events
-            if source_event.start <= pts <= source_event.end
-        ]
+        # each .index is a list lookup, so look the indexes up only once
+        hits = sorted(
+            (T.cast(int, source_event.index), source_event)
+            for source_event in self._api.subs.events.events_at(pts)
+        )
+        self.source_events[:] = [source_event for _idx, source_event in hits]
         self.copied_events[:] = []
-        if not self.source_events:
+        if not hits:
             return
         idx: int
-        for source_event in reversed(self.source_events):
-            assert source_event.index
-            idx = source_event.index
+        for idx, source_event in reversed(hits):
             new_event = copy(source_event)
             self._api.subs.events.insert(idx + 1, new_event)
             self.copied_events.append(new_event)
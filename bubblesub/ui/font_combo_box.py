@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import functools
 import typing as T
 
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -30,9 +31,18 @@ def refresh_font_db() -> None:
     font_db = QtGui.QFontDatabase()
     font_db.addApplicationFont(str(ASSETS_DIR / "AdobeBlank.ttf"))
     font_db.removeAllApplicationFonts()
+    get_font_families.cache_clear()
 
 
-def _get_font_families() -> T.List[str]:
+@functools.lru_cache(maxsize=None)
+def get_font_families() -> T.List[str]:
+    """Return names of the installed font families.
+
+    The list is built once and cached, since enumerating thousands of fonts
+    takes a while. Must be called from the GUI thread.
+
+    :return: sorted font family names
+    """
     return list(
         sorted(
             {
@@ -139,7 +149,7 @@ class FontComboBox(QtWidgets.QComboBox):
                 QtWidgets.QComboBox.AdjustToMinimumContentsLengthWithIcon
             ),
         )
-        self.addItems(_get_font_families())
+        self.addItems(get_font_families())
         if api.cfg.opt["gui"]["preview_fonts"]:
             self.setItemDelegate(_FontFamilyDelegate(self))
             self.setStyleSheet(
@@ -22,7 +22,6 @@ from PyQt5 import QtCore, QtGui
 
 from bubblesub.api import Api
 from bubblesub.fmt.ass.event import AssEvent
-from bubblesub.fmt.ass.util import character_count
 from bubblesub.ui.model.proxy import ObservableListTableAdapter
 from bubblesub.ui.themes import ThemeManager
 from bubblesub.ui.util import blend_colors
@@ -130,7 +129,7 @@ class _CpsColumn(_Column):
     def display(self, sub: AssEvent) -> T.Any:
         return (
             "{:.1f}".format(
-                character_count(sub.text) / max(1, sub.duration / 1000.0)
+                sub.character_count / max(1, sub.duration / 1000.0)
             )
             if sub.duration > 0
             else "-"
@@ -276,9 +275,7 @@ class AssEventsModel(ObservableListTableAdapter):
         if subtitle.duration == 0:
             return QtCore.QVariant()
 
-        ratio = character_count(subtitle.text) / (
-            abs(subtitle.duration) / 1000.0
-        )
+        ratio = subtitle.character_count / (abs(subtitle.duration) / 1000.0)
         character_limit = self._api.cfg.opt["subs"][
             "max_characters_per_second"
         ]
@@ -26,8 +26,10 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 
 from bubblesub.api import Api
 from bubblesub.api.log import LogLevel
+from bubblesub.ass_renderer import warm_up_fonts
 from bubblesub.cfg import ConfigError
 from bubblesub.ui.assets import ASSETS_DIR
+from bubblesub.ui.font_combo_box import get_font_families
 from bubblesub.ui.main_window import MainWindow
 
 
@@ -129,6 +131,11 @@ class Application:
             self._splash.showMessage("Loading commands...")
         api.cmd.reload_commands()
 
+        # scanning thousands of fonts takes a while, so do it ahead of time
+        api.threading.schedule_task(warm_up_fonts, lambda _result: None)
+        # QFontDatabase can be used only from the GUI thread
+        QtCore.QTimer.singleShot(0, get_font_families)
+
         if self._splash:
             self._splash.showMessage("Loading UI...")
         main_window = MainWindow(api)
@@ -144,6 +151,8 @@ class Application:
 
         api.cfg.opt.changed.connect(save_config)
 
+        asyncio.ensure_future(api.gui.offer_journal_recovery())
+
         if self._args.file:
             api.cmd.run_cmdline([["open", "--path", self._args.file]])
 
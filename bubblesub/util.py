@@ -20,7 +20,9 @@ import ast
 import fractions
 import itertools
 import operator
+import os
 import re
+import shutil
 import typing as T
 from pathlib import Path
 
@@ -149,6 +151,40 @@ def sanitize_file_name(file_name: T.Union[Path, str]) -> str:
     return file_name
 
 
+def write_file_atomically(path: Path, content: T.Union[str, bytes]) -> None:
+    """Replace file contents so that a crash never leaves it half-written.
+
+    The content is written to a temporary file next to the target, flushed
+    to the disk and then renamed over the target.
+
+    :param path: path to write to
+    :param content: new file contents, either text or binary
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_path.open(
+            "wb" if isinstance(content, bytes) else "w"
+        ) as handle:
+            handle.write(content)
+            handle.flush()
+            os.fsync(handle.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    # persist the rename itself; directories can't be opened on Windows
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
 def chunks(source: T.List[T.Any], size: int) -> T.Iterable[T.List[T.Any]]:
     """Yield successive chunks of given size from source.
 